@@ -0,0 +1,56 @@
+import argparse
+import time
+import plate
+import localization
+
+
+# the calls of rendering a match message and a matches page
+_CALLS = [
+    ('match_prefix', {}),
+    ('tier_1_tournament', {}),
+    ('tournament_in_match', {'name': 'The International 2024'}),
+    ('match_starts_in', {'minutes': 15, 'hours': 2}),
+    ('show_streams', {'count': 3}),
+    ('matches_page', {'page': 1, 'pages': 4}),
+]
+
+
+def _plate_get():
+    # localization.get before the catalog
+    plate_ = plate.Plate(root=localization._locales_dir, locale='en_US', fallback='en_US')
+
+    def get(string_key, locale=None, **parameters):
+        if locale is None or locale in plate_.locales:
+            return plate_(string_key, locale, **parameters)
+        if locale in localization._locale_convert:
+            return plate_(string_key, localization._locale_convert[locale], **parameters)
+        return get(string_key, None, **parameters)
+    return get
+
+
+def _plate_get_markdown(get):
+    def get_markdown(string_key, locale=None, **parameters):
+        return localization.escape_markdown(get(string_key, locale, **parameters))
+    return get_markdown
+
+
+def _measure(get, langs, iterations: int) -> float:
+    start = time.perf_counter()
+    for i in range(iterations):
+        lang = langs[i % len(langs)]
+        for key, parameters in _CALLS:
+            get(key, lang, **parameters)
+    return (time.perf_counter() - start) / (iterations * len(_CALLS)) * 1e6
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Microseconds per localized string, plate and compiled catalog')
+    parser.add_argument('--iterations', type=int, default=100000)
+    parser.add_argument('--langs', nargs='+', default=['en', 'ru', 'en_US', 'de'])
+    args = parser.parse_args()
+
+    old_get = _plate_get()
+    print(f'{len(_CALLS)} strings per iteration, langs {args.langs}')
+    for name, get in [('plate', old_get), ('catalog', localization.get),
+                      ('plate markdown', _plate_get_markdown(old_get)), ('catalog markdown', localization.get_markdown)]:
+        print(f'  {name}: {_measure(get, args.langs, args.iterations):.2f}us')
@@ -0,0 +1,67 @@
+import argparse
+import datetime
+import random
+import time
+import typing
+import matches_data_loader
+from matches_data_loader.twitch_streams_search import StreamInfo
+from telegram_bot import match_printing
+
+
+_TIERS = ['Tier 1', 'Tier 2', 'Tier 3', 'Tier 4', 'Qualifier', None]
+_FORMATS = ['Bo1', 'Bo2', 'Bo3', 'Bo5', None]
+
+
+def _name(rnd: random.Random, prefix: str) -> str:
+    # names with markdown special characters, like 'Team.Liquid' or 'PGL Wallachia - Season 2'
+    return prefix + ''.join(rnd.choice('abcdefgh ._-!()[]') for _ in range(rnd.randrange(3, 20)))
+
+
+def random_matches(count: int, seed: int = 0) -> typing.List[matches_data_loader.Dota2Match]:
+    rnd = random.Random(seed)
+    now = datetime.datetime.now(tz=datetime.timezone.utc)
+    matches = []
+    for match_id in range(count):
+        teams = [None if rnd.random() < 0.1 else
+                 matches_data_loader.Dota2Team(_name(rnd, 'Team '), None, f'/dota2/Team_{match_id}_{i}', 'icon')
+                 for i in range(2)]
+        tournament = matches_data_loader.TournamentInfo(_name(rnd, 'Tournament '), f'/dota2/T_{match_id}',
+                                                        rnd.choice(_TIERS), None, None, None, None)
+        live = rnd.random() < 0.3
+        streams = [StreamInfo(f'channel_{i}', _name(rnd, 'Channel_'), '', _name(rnd, 'Title '), 'en',
+                              rnd.randrange(10000)) for i in range(rnd.randrange(4) if live else 0)]
+        matches.append(matches_data_loader.Dota2Match(
+            teams[0], teams[1], tournament, streams,
+            (rnd.randrange(3), rnd.randrange(3)) if live else None,
+            rnd.choice(_FORMATS),
+            None if live else now + datetime.timedelta(minutes=rnd.randrange(1, 60 * 48)),
+            match_id))
+    return matches
+
+
+def _render_streams(lang: str, match: matches_data_loader.Dota2Match):
+    return match_printing._streams_str(match.streams, lang)
+
+
+def _measure(render, matches, langs, iterations: int) -> float:
+    start = time.perf_counter()
+    for i in range(iterations):
+        lang = langs[i % len(langs)]
+        for match in matches:
+            render(lang, match)
+    return iterations * len(matches) / (time.perf_counter() - start)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Rendered match messages per second')
+    parser.add_argument('--matches', type=int, default=1000)
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--langs', nargs='+', default=['en', 'ru'])
+    args = parser.parse_args()
+
+    matches = random_matches(args.matches)
+    live = [match for match in matches if len(match.streams) != 0]
+    print(f'{args.matches} matches, langs {args.langs}')
+    print(f'  match message: {_measure(match_printing._match_message, matches, args.langs, args.iterations):.0f}/s')
+    print(f'  with keyboard: {_measure(match_printing.render_match_message, matches, args.langs, args.iterations):.0f}/s')
+    print(f'  streams: {_measure(_render_streams, live, args.langs, args.iterations):.0f}/s')
@@ -0,0 +1,111 @@
+import argparse
+import os
+import random
+import tempfile
+import time
+import telegram_bot.reminders_storage as reminders_storage
+
+
+_TEAMS_COUNT = 2000
+_TOURNAMENTS_COUNT = 300
+_ALL_REMINDERS_SHARE = 0.001
+_INSERT_BATCH = 10000
+
+
+def _popular_index(rnd: random.Random, count: int) -> int:
+    # popularity is skewed towards the first teams and tournaments
+    return int(count * rnd.random() ** 3)
+
+
+def _fill_db(chats: int, reminders: int, seed: int):
+    rnd = random.Random(seed)
+    chat_ids = [str(1000000 + i) for i in range(chats)]
+    with reminders_storage._db.atomic():
+        for begin in range(0, chats, _INSERT_BATCH):
+            reminders_storage._Chat.insert_many(
+                [(chat_id,) for chat_id in chat_ids[begin:begin + _INSERT_BATCH]],
+                fields=[reminders_storage._Chat.id]).execute()
+
+        rows = []
+        for _ in range(reminders):
+            chat_id = rnd.choice(chat_ids)
+            kind = rnd.random()
+            if kind < _ALL_REMINDERS_SHARE:
+                rows.append((chat_id, 'all', None))
+            elif kind < 0.7:
+                rows.append((chat_id, 'team', f'/dota2/Team_{_popular_index(rnd, _TEAMS_COUNT)}'))
+            else:
+                rows.append((chat_id, 'tournament', f'/dota2/Tournament_{_popular_index(rnd, _TOURNAMENTS_COUNT)}'))
+            if len(rows) == _INSERT_BATCH:
+                reminders_storage._Reminder.insert_many(rows, fields=[
+                    reminders_storage._Reminder.chat, reminders_storage._Reminder.type,
+                    reminders_storage._Reminder.value]).execute()
+                rows = []
+        if len(rows) != 0:
+            reminders_storage._Reminder.insert_many(rows, fields=[
+                reminders_storage._Reminder.chat, reminders_storage._Reminder.type,
+                reminders_storage._Reminder.value]).execute()
+
+
+def _random_match(rnd: random.Random) -> reminders_storage.MatchDescriptor:
+    return reminders_storage.MatchDescriptor(
+        f'/dota2/Team_{_popular_index(rnd, _TEAMS_COUNT)}',
+        f'/dota2/Team_{rnd.randrange(_TEAMS_COUNT)}',
+        f'/dota2/Tournament_{_popular_index(rnd, _TOURNAMENTS_COUNT)}')
+
+
+def _percentile(sorted_values, q):
+    return sorted_values[min(int(len(sorted_values) * q), len(sorted_values) - 1)]
+
+
+def run(chats: int, reminders: int, lookups: int, follows: int, seed: int = 0):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        reminders_storage.initialize(os.path.join(tmp_dir, 'reminders.db'), os.path.join(tmp_dir, 'reminders.journal'))
+        rs = reminders_storage.storage()
+
+        fill_start = time.perf_counter()
+        _fill_db(chats, reminders, seed)
+        print(f'db with {chats} chats and {reminders} reminders filled in {time.perf_counter() - fill_start:.1f}s')
+
+        load_start = time.perf_counter()
+        rs.check_index_consistency()  # the db was filled directly, so this reloads the in-memory index
+        print(f'reminders index loaded in {time.perf_counter() - load_start:.1f}s')
+
+        rnd = random.Random(seed + 1)
+        latencies = []
+        found = 0
+        for _ in range(lookups):
+            match = _random_match(rnd)
+            start = time.perf_counter()
+            found += len(rs.get_reminded_chat_ids(match))
+            latencies.append(time.perf_counter() - start)
+
+        latencies.sort()
+        print(f'get_reminded_chat_ids: {lookups} lookups, {found / lookups:.0f} chats per match on average')
+        print(f'  p50 {_percentile(latencies, 0.5) * 1000:.2f}ms, p95 {_percentile(latencies, 0.95) * 1000:.2f}ms, '
+              f'max {latencies[-1] * 1000:.2f}ms')
+
+        # a burst of follow clicks: mutations are acknowledged after the journal append
+        latencies = []
+        for i in range(follows):
+            start = time.perf_counter()
+            rs.add_team_reminder(str(2000000 + i), f'team{_popular_index(rnd, _TEAMS_COUNT)}')
+            latencies.append(time.perf_counter() - start)
+        flush_start = time.perf_counter()
+        rs.flush()
+        flush_seconds = time.perf_counter() - flush_start
+        latencies.sort()
+        print(f'add_team_reminder: {follows} follows, p50 {_percentile(latencies, 0.5) * 1000:.3f}ms, '
+              f'p95 {_percentile(latencies, 0.95) * 1000:.3f}ms, last batch written in {flush_seconds * 1000:.1f}ms')
+        reminders_storage.close()
+        reminders_storage._db.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='RemindersStorage lookup and follow latency')
+    parser.add_argument('--chats', type=int, default=100000)
+    parser.add_argument('--reminders', type=int, default=1000000)
+    parser.add_argument('--lookups', type=int, default=200)
+    parser.add_argument('--follows', type=int, default=10000)
+    args = parser.parse_args()
+    run(args.chats, args.reminders, args.lookups, args.follows)
@@ -0,0 +1,59 @@
+import argparse
+import random
+import time
+from telegram_bot.search_index import SearchIndex
+
+
+_SYLLABLES = ['ka', 'to', 'ri', 'spi', 'rit', 'li', 'quid', 'na', 'vi', 'gam', 'ing', 'og', 'ev', 'il', 'ge', 'ni',
+              'us', 'sec', 'ret', 'ro', 'tun', 'der', 'bo', 'om', 'aur', 'ora', 'xt', 'ream', 'ton', 'bet']
+_PREFIXES = ['Team ', '', '', 'Gaming ', 'The ', '']
+
+
+def _names(count: int, rnd: random.Random):
+    def word():
+        return ''.join(rnd.choice(_SYLLABLES) for _ in range(rnd.randint(1, 3))).capitalize()
+    return [rnd.choice(_PREFIXES) + ' '.join(word() for _ in range(rnd.randint(1, 3))) for _ in range(count)]
+
+
+def _queries(names, count: int, rnd: random.Random):
+    # typed prefixes of names and words, substrings and names with a typo
+    queries = []
+    for _ in range(count):
+        name = rnd.choice(names).lower()
+        kind = rnd.random()
+        if kind < 0.5:
+            queries.append(name[:rnd.randint(1, len(name))])
+        elif kind < 0.75:
+            begin = rnd.randrange(len(name))
+            queries.append(name[begin:begin + rnd.randint(3, 8)])
+        else:
+            typo = rnd.randrange(len(name))
+            queries.append(name[:typo] + name[typo + 1:])
+    return queries
+
+
+def _percentile(sorted_values, q):
+    return sorted_values[min(int(len(sorted_values) * q), len(sorted_values) - 1)]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Inline search latency without the answers cache')
+    parser.add_argument('--entities', type=int, nargs='+', default=[1000, 5000, 20000])
+    parser.add_argument('--queries', type=int, default=5000)
+    parser.add_argument('--limit', type=int, default=20)
+    args = parser.parse_args()
+
+    for entities in args.entities:
+        rnd = random.Random(entities)
+        names = _names(entities, rnd)
+        start = time.perf_counter()
+        index = SearchIndex((name, i) for i, name in enumerate(names))
+        build_ms = (time.perf_counter() - start) * 1000
+        latencies = []
+        for query in _queries(names, args.queries, rnd):
+            start = time.perf_counter()
+            index.search(query, args.limit)
+            latencies.append((time.perf_counter() - start) * 1000)
+        latencies.sort()
+        print(f'{entities} entities: index built in {build_ms:.0f}ms, query p50 {_percentile(latencies, 0.5):.3f}ms, '
+              f'p99 {_percentile(latencies, 0.99):.3f}ms, max {latencies[-1]:.3f}ms')
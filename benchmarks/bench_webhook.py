@@ -0,0 +1,70 @@
+import argparse
+import asyncio
+import json
+import time
+import httpx
+import telegram
+from telegram_bot.webhook_server import WebhookServer
+
+
+_SECRET = 'benchmark'
+
+
+def _update_payload(update_id: int) -> bytes:
+    return json.dumps({
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'from': {'id': 42, 'is_bot': False, 'first_name': 'User', 'language_code': 'en'},
+            'chat': {'id': 42, 'first_name': 'User', 'type': 'private'},
+            'date': 1700000000,
+            'text': '/matches',
+            'entities': [{'offset': 0, 'length': 8, 'type': 'bot_command'}]
+        }
+    }).encode()
+
+
+class _Application:
+    # stands for the bot handlers: every update takes handler_ms of waiting for telegram API
+    def __init__(self, handler_ms: float):
+        self.bot = telegram.Bot('123:TOKEN')
+        self._handler_seconds = handler_ms / 1000
+
+    async def process_update(self, update: telegram.Update):
+        await asyncio.sleep(self._handler_seconds)
+
+
+async def _run(updates: int, connections: int, concurrency: int, handler_ms: float):
+    server = WebhookServer(_Application(handler_ms), _SECRET, listen='127.0.0.1', port=0,
+                           max_concurrent_updates=concurrency, queue_size=updates)
+    await server.start()
+    payloads = [_update_payload(update_id) for update_id in range(updates)]
+    limits = httpx.Limits(max_connections=connections, max_keepalive_connections=connections)
+
+    async with httpx.AsyncClient(base_url=f'http://127.0.0.1:{server.port}', limits=limits) as client:
+        async def post(indices):
+            for i in indices:
+                response = await client.post('/telegram', content=payloads[i],
+                                             headers={'X-Telegram-Bot-Api-Secret-Token': _SECRET})
+                assert response.status_code == 200
+
+        start = time.perf_counter()
+        await asyncio.gather(*[post(range(c, updates, connections)) for c in range(connections)])
+        received = time.perf_counter() - start
+        await server.stop()
+        processed = time.perf_counter() - start
+
+    stats = server.stats()
+    print(f'{updates} updates over {connections} connections, {concurrency} workers, {handler_ms}ms handlers')
+    print(f'  received: {updates / received:.0f} updates/s, processed: {stats.processed / processed:.0f} updates/s, '
+          f'failed {stats.failed}, rejected {stats.rejected}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='WebhookServer updates per second')
+    parser.add_argument('--updates', type=int, default=5000)
+    parser.add_argument('--connections', type=int, default=8)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--handler-ms', type=float, default=20)
+    args = parser.parse_args()
+    asyncio.run(_run(args.updates, args.connections, args.concurrency, args.handler_ms))
@@ -0,0 +1,75 @@
+import argparse
+import asyncio
+import functools
+import json
+import multiprocessing
+import time
+import telegram
+from telegram_bot import chat_partitioning
+
+
+_CHATS = 1000
+_handler = {'cpu_ms': 0.0, 'io_ms': 0.0}
+
+
+def _update_payload(update_id: int) -> str:
+    chat_id = 1000000 + update_id % _CHATS
+    return json.dumps({
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'from': {'id': chat_id, 'is_bot': False, 'first_name': 'User', 'language_code': 'en'},
+            'chat': {'id': chat_id, 'first_name': 'User', 'type': 'private'},
+            'date': 1700000000,
+            'text': '/matches',
+            'entities': [{'offset': 0, 'length': 8, 'type': 'bot_command'}]
+        }
+    })
+
+
+async def _serve(queue):
+    bot = telegram.Bot('123:TOKEN')
+
+    async def process_update(payload: str):
+        telegram.Update.de_json(json.loads(payload), bot)
+        # stands for rendering a reply (holds the GIL) and waiting for telegram API
+        end = time.perf_counter() + _handler['cpu_ms'] / 1000
+        while time.perf_counter() < end:
+            pass
+        await asyncio.sleep(_handler['io_ms'] / 1000)
+
+    await chat_partitioning.serve_queue(queue, process_update, _handler.update, max_pending=64)
+
+
+def _worker(started, index: int, queue):
+    started.wait()
+    asyncio.run(_serve(queue))
+
+
+def _run(workers: int, updates: int, cpu_ms: float, io_ms: float) -> float:
+    bot = telegram.Bot('123:TOKEN')
+    parsed = [telegram.Update.de_json(json.loads(_update_payload(update_id)), bot) for update_id in range(updates)]
+    started = multiprocessing.get_context('spawn').Barrier(workers + 1)  # process start up is not measured
+    pool = chat_partitioning.WorkerPool(workers, functools.partial(_worker, started))
+    pool.start()
+    pool.broadcast({'cpu_ms': cpu_ms, 'io_ms': io_ms})
+    started.wait()
+
+    start = time.perf_counter()
+    for update in parsed:
+        pool.route(chat_partitioning.update_chat_key(update), update.to_json())
+    pool.stop(timeout=600)
+    return updates / (time.perf_counter() - start)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Updates per second of chat partitioned worker processes')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--updates', type=int, default=5000)
+    parser.add_argument('--cpu-ms', type=float, default=1.0)
+    parser.add_argument('--io-ms', type=float, default=20)
+    args = parser.parse_args()
+
+    print(f'{args.updates} updates of {_CHATS} chats, handlers take {args.cpu_ms}ms cpu and {args.io_ms}ms io')
+    for workers_count in args.workers:
+        print(f'  {workers_count} workers: {_run(workers_count, args.updates, args.cpu_ms, args.io_ms):.0f} updates/s')
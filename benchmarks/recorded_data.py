@@ -0,0 +1,193 @@
+import datetime
+import json
+import os
+import random
+import time
+import typing
+import bs4
+import requests
+import twitch.helix
+import liquipedia_dota_api
+from liquipedia_dota_api.config import LIQUIPEDIA_URL
+from liquipedia_dota_api.dota2_api_base import Dota2ApiBase
+
+
+MATCHES_PAGE = 'Liquipedia:Upcoming_and_ongoing_matches'
+TEAMS_PAGE = 'Portal:Teams'
+TOURNAMENTS_PAGE = 'Portal:Tournaments'
+PAGES = [MATCHES_PAGE, TEAMS_PAGE, TOURNAMENTS_PAGE]
+HELIX_STREAMS_FILE = 'helix_streams.json'  # a GET /helix/streams response body
+
+_REGIONS = ['Europe', 'CIS', 'China', 'Southeast Asia', 'North America', 'South America']
+_TIERS = ['Tier 1', 'Tier 2', 'Tier 3', 'Qualifier']
+_FORMATS = ['Bo1', 'Bo2', 'Bo3', 'Bo5']
+_LANGUAGES = ['en', 'ru', 'ru', 'es', 'pt', 'zh', 'other']
+
+
+def page_file(page: str) -> str:
+    return page.replace(':', '_') + '.html'
+
+
+class RecordedPages(Dota2ApiBase):
+    def __init__(self, pages: typing.Dict[str, str]):
+        """
+        Liquipedia api base serving recorded pages, without rate limits and network access
+
+        :param pages: page name to its html, as returned by the parse api
+        """
+        super().__init__('recorded pages', 0.0, 0.0)
+        self._pages = pages
+
+    def _parse_impl(self, page):
+        return bs4.BeautifulSoup(self._pages[page], features='lxml'), None
+
+
+def recorded_dota2_api(pages: typing.Dict[str, str]) -> liquipedia_dota_api.Dota2Api:
+    api = liquipedia_dota_api.Dota2Api('recorded pages', 0.0, 0.0)
+    api._base = RecordedPages(pages)
+    return api
+
+
+def helix_streams(payload: typing.Dict[str, typing.Any]) -> typing.List[twitch.helix.Stream]:
+    return [twitch.helix.Stream(None, data) for data in payload['data']]
+
+
+def _team_name(rnd: random.Random, index: int) -> str:
+    return rnd.choice(['Team ', '', '', 'Gaming ']) + rnd.choice(['Spirit', 'Liquid', 'Falcons', 'Tundra', 'Aurora',
+                                                                  'BetBoom', 'Secret', 'Virtus']) + f' {index}'
+
+
+def _tournament_name(rnd: random.Random, index: int) -> str:
+    return rnd.choice(['DreamLeague', 'PGL Wallachia', 'ESL One', 'BLAST Slam', 'FISSURE Universe']) + \
+        f' Season {index}'
+
+
+def _team_in_match(name: typing.Optional[str], page: str) -> str:
+    if name is None:
+        return '<span data-highlightingclass="TBD"><span class="team-template-text"><abbr title="To Be Decided">' \
+               'TBD</abbr></span></span>'
+    return f'<span class="team-template-team-short" data-highlightingclass="{name}">' \
+           f'<span class="team-template-image-icon"><a href="{page}" title="{name}">' \
+           f'<img src="/commons/images/thumb{page}.png" width="50" height="50"></a></span> ' \
+           f'<span class="team-template-text"><a href="{page}" title="{name}">{name}</a></span></span>'
+
+
+def generate_pages(matches: int, teams: int, tournaments: int, seed: int = 0) -> typing.Dict[str, str]:
+    """
+    Pages with the markup of the liquipedia parse api responses, for benchmarks without recorded pages
+    """
+    rnd = random.Random(seed)
+    team_names = [_team_name(rnd, i) for i in range(teams)]
+    tournament_names = [_tournament_name(rnd, i) for i in range(tournaments)]
+    now = int(time.time())
+
+    match_tables = []
+    for i in range(matches):
+        names = [None if rnd.random() < 0.1 else rnd.choice(team_names) for _ in range(2)]
+        cells = [f'<td class="team-left">{_team_in_match(names[0], "/dota2/" + str(names[0]).replace(" ", "_"))}'
+                 f'</td>']
+        live = i < matches // 10
+        score = f'{rnd.randrange(3)}:{rnd.randrange(3)}' if live else 'vs'
+        cells.append(f'<td class="versus"><div style="line-height:1.1">{score}</div>'
+                     f'<div style="font-size:80%"><abbr title="Best of 3">{rnd.choice(_FORMATS)}</abbr></div></td>')
+        cells.append(f'<td class="team-right">{_team_in_match(names[1], "/dota2/" + str(names[1]).replace(" ", "_"))}'
+                     f'</td>')
+        tournament = rnd.choice(tournament_names)
+        tournament_page = '/dota2/' + tournament.replace(' ', '_') + ('/Group_Stage' if rnd.random() < 0.3 else '')
+        start_time = now + (0 if live else rnd.randrange(60, 7 * 24 * 3600))
+        match_tables.append(
+            f'<table class="wikitable wikitable-striped infobox_matches_content"><tbody><tr>{"".join(cells)}</tr>'
+            f'<tr><td colspan="3" class="match-filler"><div><span class="match-countdown">'
+            f'<span class="timer-object" data-timestamp="{start_time}">'
+            f'{datetime.datetime.fromtimestamp(start_time, tz=datetime.timezone.utc):%B %d, %Y - %H:%M} UTC</span>'
+            f'</span><div><div class="league-icon-small-image"><a href="{tournament_page}" title="{tournament}">'
+            f'<img src="/commons/images/{i}.png" width="50" height="50"></a></div> '
+            f'<a href="{tournament_page}" title="{tournament}">{tournament}</a></div></div></td></tr></tbody></table>')
+    matches_html = f'<div class="mw-parser-output"><div data-toggle-area-content="1">{"".join(match_tables)}</div>' \
+                   f'<div data-toggle-area-content="2">{"".join(match_tables[:matches // 4])}</div></div>'
+
+    regions = []
+    for region in _REGIONS:
+        rows = ''.join(f'<div class="team-row"><span class="team-template-team-standard">'
+                       f'<span class="team-template-image-icon"><img src="/commons/images/{name}.png"></span> '
+                       f'<span class="team-template-text"><a href="/dota2/{name.replace(" ", "_")}" title="{name}">'
+                       f'{name}</a></span></span></div>'
+                       for name in team_names[_REGIONS.index(region)::len(_REGIONS)])
+        regions.append(f'<div class="panel-box"><div class="panel-box-heading">{region}</div>'
+                       f'<div class="panel-box-body">{rows}</div></div>')
+    teams_html = f'<div class="mw-parser-output"><div class="lp-container-fluid">{"".join(regions)}</div></div>'
+
+    rows = []
+    for name in tournament_names:
+        prize = f'${rnd.randrange(1, 3000) * 1000:,}' if rnd.random() < 0.9 else ''
+        rows.append(f'<div class="gridRow"><div class="gridCell Tier"><a href="/dota2/Tier">{rnd.choice(_TIERS)}</a>'
+                    f'</div><div class="gridCell Tournament Header"><a href="/dota2/{name.replace(" ", "_")}">'
+                    f'<img src="/commons/images/{name}.png"></a> <a href="/dota2/{name.replace(" ", "_")}">{name}</a>'
+                    f'</div><div class="gridCell EventDetails Date Header">Oct 1 - 20, 2026</div>'
+                    f'<div class="gridCell EventDetails Prize Header">{prize}</div>'
+                    f'<div class="gridCell EventDetails Location Header">\xa0{rnd.choice(_REGIONS)}</div>'
+                    f'<div class="gridCell EventDetails PlayerNumber Header">{rnd.choice([8, 12, 16, 20])}'
+                    f'\xa0participants</div></div>')
+    # the first table lists upcoming tournaments, the second one ongoing tournaments
+    tournaments_html = f'<div class="mw-parser-output"><div class="gridTable"></div>' \
+                       f'<div class="gridTable"><div class="gridHeader"></div>{"".join(rows)}</div></div>'
+
+    return {MATCHES_PAGE: matches_html, TEAMS_PAGE: teams_html, TOURNAMENTS_PAGE: tournaments_html}
+
+
+def generate_helix_streams(streams: int, team_names: typing.List[str], tournament_names: typing.List[str],
+                           seed: int = 0) -> typing.Dict[str, typing.Any]:
+    """
+    A GET /helix/streams response body with titles of match streams, reruns and unrelated streams
+    """
+    rnd = random.Random(seed)
+    data = []
+    for i in range(streams):
+        kind = rnd.random()
+        if kind < 0.4 and len(team_names) >= 2:
+            team1, team2 = rnd.sample(team_names, 2)
+            title = f'{rnd.choice(tournament_names)} | {team1} vs {team2} bo3 {rnd.randrange(3)}:{rnd.randrange(3)}' \
+                    f' by caster_{i}'
+        elif kind < 0.5 and len(team_names) >= 1:
+            title = f'[RERUN] {rnd.choice(team_names)} - {rnd.choice(tournament_names)}'
+        else:
+            title = rnd.choice(['ranked grind to immortal', 'pubs with viewers !giveaway', 'road to 10k mmr',
+                                'turbo games chill stream', 'coaching session, come and ask'])
+        data.append({'id': str(40000000000 + i), 'user_id': str(100000 + i), 'user_login': f'channel_{i}',
+                     'user_name': f'Channel_{i}', 'game_id': '29595', 'game_name': 'Dota 2', 'type': 'live',
+                     'title': title, 'viewer_count': int(rnd.paretovariate(1.2) * 50),
+                     'started_at': '2026-10-19T12:00:00Z', 'language': rnd.choice(_LANGUAGES),
+                     'thumbnail_url': f'https://static-cdn.jtvnw.net/previews-ttv/live_user_channel_{i}-{{width}}x'
+                                      f'{{height}}.jpg', 'tag_ids': [], 'is_mature': False})
+    return {'data': data, 'pagination': {}}
+
+
+def load(directory: str) -> typing.Tuple[typing.Dict[str, str], typing.Optional[typing.Dict[str, typing.Any]]]:
+    """
+    Loads recorded pages and helix streams. Missing recordings are not returned
+    """
+    pages = dict()
+    for page in PAGES:
+        path = os.path.join(directory, page_file(page))
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                pages[page] = f.read()
+    helix_payload = None
+    path = os.path.join(directory, HELIX_STREAMS_FILE)
+    if os.path.exists(path):
+        with open(path, encoding='utf-8') as f:
+            helix_payload = json.load(f)
+    return pages, helix_payload
+
+
+def record_pages(directory: str, app_name: str, parse_period: float = liquipedia_dota_api.DEFAULT_PARSE_PERIOD):
+    # liquipedia api terms allow one parse request per parse_period
+    os.makedirs(directory, exist_ok=True)
+    for i, page in enumerate(PAGES):
+        if i != 0:
+            time.sleep(parse_period)
+        response = requests.get(f'{LIQUIPEDIA_URL}/dota2/api.php?action=parse&format=json&page={page}',
+                                headers={'User-Agent': app_name, 'Accept-Encoding': 'gzip'})
+        response.raise_for_status()
+        with open(os.path.join(directory, page_file(page)), 'w', encoding='utf-8') as f:
+            f.write(response.json()['parse']['text']['*'])
@@ -0,0 +1,266 @@
+import argparse
+import dataclasses
+import datetime
+import fnmatch
+import itertools
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import typing
+import matches_data_loader.config
+import matches_data_loader.data_loader as data_loader
+import matches_data_loader.twitch_streams_search as twitch_streams_search
+import telegram_bot.reminders_storage as reminders_storage
+from matches_data_loader.streams_history import StreamsViewersHistory
+from telegram_bot import match_printing
+from benchmarks import recorded_data
+from benchmarks.bench_match_printing import random_matches
+from benchmarks.bench_reminders_storage import _fill_db, _random_match
+
+
+_FORMAT_VERSION = 1  # results format, changed when results of different versions are not comparable
+
+
+def _repo_commit() -> typing.Optional[str]:
+    try:
+        result = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)))
+    except OSError:
+        return None
+    return result.stdout.strip() if result.returncode == 0 else None
+
+
+def _measure(operation: typing.Callable[[], typing.Any], repeat: int, min_seconds: float) -> typing.Dict[str, float]:
+    # an operation is repeated enough times for a run to take min_seconds, the median run is reported
+    start = time.perf_counter()
+    operation()
+    single = time.perf_counter() - start
+    number = max(1, int(min_seconds / max(single, 1e-9)))
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            operation()
+        runs.append((time.perf_counter() - start) / number)
+    return {'median_us': statistics.median(runs) * 1e6, 'min_us': min(runs) * 1e6, 'number': number,
+            'repeat': repeat}
+
+
+class _ParsedDota2Api:
+    def __init__(self, matches, teams, tournaments):
+        # the data loader join without parsing
+        self._matches = matches
+        self._teams = teams
+        self._tournaments = tournaments
+
+    def get_matches(self):
+        return self._matches
+
+    def get_teams(self):
+        return self._teams
+
+    def get_tournaments(self):
+        return self._tournaments
+
+
+class _NoStreams:
+    @staticmethod
+    def find_match_streams(team1_name: str, team2_name: str, tournament_name: str):
+        return []
+
+
+def _next_matches(matches: typing.List[data_loader.Dota2Match], seed: int) -> typing.List[data_loader.Dota2Match]:
+    # the next update: some matches are finished, some are rescheduled and some are new
+    rnd = random.Random(seed)
+    result = []
+    for match in matches:
+        kind = rnd.random()
+        if kind < 0.1:
+            continue
+        start_time = match.start_time
+        if kind < 0.2 and start_time is not None:
+            start_time += datetime.timedelta(hours=1)
+        result.append(dataclasses.replace(match, start_time=start_time, id=-1))
+    for match in random_matches(len(matches) // 10, seed):
+        tournament = dataclasses.replace(match.tournament, liquipedia_page=match.tournament.liquipedia_page + '_new')
+        result.append(dataclasses.replace(match, tournament=tournament, id=-1))
+    rnd.shuffle(result)
+    return result
+
+
+_Case = typing.Tuple[str, typing.Callable[[], typing.Tuple[typing.Callable[[], typing.Any], typing.Dict[str, int]]]]
+
+
+def _liquipedia_cases(pages: typing.Dict[str, str]) -> typing.List[_Case]:
+    api = recorded_data.recorded_dota2_api(pages)
+    return [('liquipedia.get_matches', lambda: (api.get_matches, {'matches': len(api.get_matches())})),
+            ('liquipedia.get_teams', lambda: (api.get_teams, {'teams': len(api.get_teams())})),
+            ('liquipedia.get_tournaments', lambda: (api.get_tournaments,
+                                                    {'tournaments': len(api.get_tournaments())}))]
+
+
+def _streams_case(pages: typing.Dict[str, str], helix_payload: typing.Dict[str, typing.Any]):
+    streams = recorded_data.helix_streams(helix_payload)
+    history = StreamsViewersHistory()
+    for sample in range(matches_data_loader.config.TWITCH_STREAMS_HISTORY_LENGTH):
+        history.add_samples(((stream.id, stream.viewer_count + sample * 10) for stream in streams), now=sample)
+    stats = [history.stats(stream.id) for stream in streams]
+    # the streams of every loaded match are searched on each update
+    matches = [match for match in recorded_data.recorded_dota2_api(pages).get_matches()
+               if match.team1 is not None and match.team2 is not None]
+    matches = matches[:matches_data_loader.config.MAXIMUM_MATCHES_TO_LOAD]
+
+    def score():
+        for match in matches:
+            for stream, stream_stats in zip(streams, stats):
+                twitch_streams_search._score_stream_is_a_match_stream(
+                    stream, match.team1.name, match.team2.name, match.tournament.name, stream_stats)
+
+    return score, {'matches': len(matches), 'streams': len(streams)}
+
+
+def _data_update_case(pages: typing.Dict[str, str]):
+    api = recorded_data.recorded_dota2_api(pages)
+    loader = data_loader.DataLoader(dota2_api=_ParsedDota2Api(api.get_matches(), api.get_teams(),
+                                                              api.get_tournaments()),
+                                    twitch_streams_searcher=_NoStreams())
+    loader._data_update()
+    assert len(loader.data().upcoming_matches) != 0  # update errors are only logged
+    return loader._data_update, {'matches': len(loader.data().upcoming_matches)}
+
+
+def _match_match_ids_case(id_matches: int):
+    old = data_loader._Data(random_matches(id_matches, seed=1), {}, {})
+    new = data_loader._Data(_next_matches(old.upcoming_matches, seed=2), {}, {})
+    return lambda: data_loader._match_match_ids(old, new), \
+        {'old_matches': len(old.upcoming_matches), 'new_matches': len(new.upcoming_matches)}
+
+
+def _reminders_case(tmp_dir: str, chats: int, reminders: int):
+    reminders_storage.initialize(os.path.join(tmp_dir, 'reminders.db'), os.path.join(tmp_dir, 'reminders.journal'))
+    _fill_db(chats, reminders, seed=0)
+    rs = reminders_storage.storage()
+    rs.check_index_consistency()  # the db was filled directly, so this reloads the in-memory index
+    rnd = random.Random(1)
+    descriptors = itertools.cycle([_random_match(rnd) for _ in range(1000)])
+    return lambda: rs.get_reminded_chat_ids(next(descriptors)), {'chats': chats, 'reminders': reminders}
+
+
+def _match_message_case(messages: int):
+    matches = random_matches(messages)
+    langs = itertools.cycle(['en', 'ru'])
+
+    def render():
+        lang = next(langs)
+        for match in matches:
+            match_printing._match_message(lang, match)
+
+    return render, {'matches': len(matches)}
+
+
+def run(args) -> typing.Dict[str, typing.Any]:
+    pages, helix_payload = recorded_data.load(args.recorded) if args.recorded is not None else ({}, None)
+    sources = {page: 'recorded' if page in pages else 'generated' for page in recorded_data.PAGES}
+    sources[recorded_data.HELIX_STREAMS_FILE] = 'recorded' if helix_payload is not None else 'generated'
+    pages = {**recorded_data.generate_pages(args.matches, args.teams, args.tournaments), **pages}
+    if helix_payload is None:
+        api = recorded_data.recorded_dota2_api(pages)
+        helix_payload = recorded_data.generate_helix_streams(
+            args.streams, [team.name for team in api.get_teams()],
+            [tournament.name for tournament in api.get_tournaments()])
+
+    results = dict()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # a case is set up only if it is run: filling the reminders db takes a while
+        cases: typing.List[_Case] = _liquipedia_cases(pages) + [
+            ('twitch.score_streams', lambda: _streams_case(pages, helix_payload)),
+            ('data_loader.data_update', lambda: _data_update_case(pages)),
+            ('data_loader.match_match_ids', lambda: _match_match_ids_case(args.id_matches)),
+            ('reminders.get_reminded_chat_ids', lambda: _reminders_case(tmp_dir, args.chats, args.reminders)),
+            ('match_printing.match_message', lambda: _match_message_case(args.messages))]
+        for name, setup in cases:
+            if args.only and not any(fnmatch.fnmatch(name, pattern) for pattern in args.only):
+                continue
+            operation, parameters = setup()
+            results[name] = {**_measure(operation, args.repeat, args.min_seconds), 'parameters': parameters}
+            print(f'{name}: {results[name]["median_us"]:.1f}us', file=sys.stderr)
+        if 'reminders.get_reminded_chat_ids' in results:
+            reminders_storage.close()
+            reminders_storage._db.close()
+
+    return {'format': _FORMAT_VERSION,
+            'created': datetime.datetime.now(tz=datetime.timezone.utc).isoformat(timespec='seconds'),
+            'commit': _repo_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'sources': sources,
+            'results': results}
+
+
+def compare(report: typing.Dict[str, typing.Any], baseline: typing.Dict[str, typing.Any],
+            tolerance: float) -> typing.List[str]:
+    """
+    :return: names of benchmarks which are slower than in the baseline by more than tolerance share
+    """
+    if baseline.get('format') != report['format']:
+        print(f'baseline format {baseline.get("format")} differs from {report["format"]}, not compared',
+              file=sys.stderr)
+        return []
+    regressions = []
+    for name, result in report['results'].items():
+        old = baseline['results'].get(name)
+        if old is None or old['parameters'] != result['parameters']:
+            continue
+        ratio = result['median_us'] / old['median_us']
+        print(f'{name}: {old["median_us"]:.1f}us -> {result["median_us"]:.1f}us ({ratio:.2f}x)', file=sys.stderr)
+        if ratio > 1 + tolerance:
+            regressions.append(name)
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Offline benchmarks of the bot hot paths, results are printed as json')
+    parser.add_argument('--recorded', help='directory with recorded liquipedia pages and helix streams, '
+                                           'missing ones are generated')
+    parser.add_argument('--record', help='record liquipedia pages to the directory and exit. Takes a few minutes '
+                                         'because of the liquipedia api rate limits')
+    parser.add_argument('--output', help='file to write results to instead of stdout')
+    parser.add_argument('--compare', help='baseline results file. Exit code is 1 if any benchmark is slower')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='allowed slowdown share when comparing')
+    parser.add_argument('--only', nargs='+', help='benchmark name patterns, e.g. "liquipedia.*"')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--min-seconds', type=float, default=0.2, help='minimum duration of a single repeat')
+    parser.add_argument('--matches', type=int, default=150, help='matches in generated pages')
+    parser.add_argument('--teams', type=int, default=600, help='teams in generated pages')
+    parser.add_argument('--tournaments', type=int, default=60, help='tournaments in generated pages')
+    parser.add_argument('--streams', type=int, default=100, help='streams in generated helix payload')
+    parser.add_argument('--id-matches', type=int, default=200, help='matches paired by match_match_ids')
+    parser.add_argument('--chats', type=int, default=20000)
+    parser.add_argument('--reminders', type=int, default=200000)
+    parser.add_argument('--messages', type=int, default=200, help='match messages rendered per operation')
+    args = parser.parse_args()
+
+    if args.record is not None:
+        recorded_data.record_pages(args.record, matches_data_loader.config.APP_NAME)
+        sys.exit(0)
+
+    report = run(args)
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    if args.compare is not None:
+        with open(args.compare) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        if len(regressions) != 0:
+            print(f'slower than the baseline: {", ".join(regressions)}', file=sys.stderr)
+            sys.exit(1)
@@ -1,19 +1,167 @@
-import plate
 import os
+import re
+import json
+import string
+import threading
+import typing
+from plate import emojipedia
 
 _locales_dir = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'locales')
-_plate = plate.Plate(root=_locales_dir, locale='en_US', fallback='en_US')
 
 _locale_convert = {'ru': 'ru_RU', 'en': 'en_US'}
 
+_FALLBACK_LOCALE = 'en_US'
+_PLURAL_SEPARATOR = '|'
+_MARKDOWN_ESCAPE = str.maketrans({c: '\\' + c for c in '_*[]()~`>#+-=|{}.!'})
+
+
+def escape_markdown(s: str) -> str:
+    # MarkdownV2 escaping
+    return s.translate(_MARKDOWN_ESCAPE)
+
+
+def _plural_index(count: int) -> int:
+    # forms are 'zero | one | many' for all the locales
+    return count if count < 3 else 2
+
+
+def _escape_literals(phrase: str) -> typing.Optional[str]:
+    # the phrase with markdown escaped text and the same placeholders, so only parameters are escaped per call.
+    # None if a placeholder has a format spec or a conversion, those are applied before escaping
+    result = []
+    for literal, field, spec, conversion in string.Formatter().parse(phrase):
+        result.append(escape_markdown(literal).replace('{', '{{').replace('}', '}}'))
+        if field is not None:
+            if spec or conversion:
+                return None
+            result.append('{' + field + '}')
+    return ''.join(result)
+
+
+class _Template:
+    __slots__ = ('text', 'static', 'markdown', 'options', 'markdown_options')
+
+    def __init__(self, phrase: str):
+        """
+        A phrase compiled once: plural options are split, phrases without placeholders are returned as is
+        and markdown escaped variants are precomputed
+        """
+        self.text = phrase
+        self.static = '{' not in phrase and '}' not in phrase
+        self.markdown = escape_markdown(phrase) if self.static else _escape_literals(phrase)
+        self.options = tuple(option.strip() for option in phrase.split(_PLURAL_SEPARATOR))
+        self.markdown_options = tuple(_escape_literals(option) for option in self.options)
+
+
+def _load_phrases(file: str) -> typing.Dict[str, str]:
+    with open(file, encoding='utf-8') as f:
+        phrases = json.load(f)
+    result = dict()
+    for key, phrase in phrases.items():
+        if isinstance(phrase, list):
+            phrase = ''.join(phrase)
+        if phrase is not None:
+            for name in re.findall(r':(\w+):', phrase):
+                phrase = phrase.replace(f':{name}:', getattr(emojipedia, name.upper()))
+        result[key] = phrase
+    return result
+
+
+class Catalog:
+    def __init__(self, root: str = _locales_dir, fallback: str = _FALLBACK_LOCALE,
+                 aliases: typing.Optional[typing.Dict[str, str]] = None,
+                 preload: typing.Optional[typing.Iterable[str]] = None):
+        """
+        Phrases of root/<locale>.json files compiled to per locale tables. A missing or empty phrase of a locale
+        is taken from the fallback one
+
+        :param aliases: short locale names, e.g. 'en' for 'en_US'
+        :param preload: locales compiled at once, the rest are compiled on first use. None means all of them
+        """
+        self._files = {name[:-len('.json')]: os.path.join(root, name)
+                       for name in os.listdir(root) if name.endswith('.json')}
+        self._fallback = fallback
+        self._aliases = dict(aliases or {})
+        self._lock = threading.Lock()
+        # tables by every requested locale name, so aliases and unknown locales resolve with a single lookup
+        self._tables: typing.Dict[typing.Optional[str], typing.Dict[str, _Template]] = dict()
+        self._fallback_phrases = _load_phrases(self._files[fallback])
+        for locale in (self._files.keys() if preload is None else preload):
+            self._table(locale)
+
+    def locales(self) -> typing.List[str]:
+        return sorted(self._files.keys())
+
+    def resolve(self, locale: typing.Optional[str]) -> str:
+        # the locale which phrases are used for the requested one
+        name = self._aliases.get(locale, locale)
+        return name if name in self._files else self._fallback
+
+    def loaded_locales(self) -> typing.List[str]:
+        return sorted(locale for locale in self._tables.keys() if locale in self._files)
+
+    def get(self, key: str, locale: typing.Optional[str] = None, **parameters) -> str:
+        table = self._tables.get(locale)
+        if table is None:
+            table = self._table(locale)
+        template = table[key]
+        count = parameters.get('count')
+        if count is not None:
+            return template.options[_plural_index(count)].format(**parameters)
+        if template.static:
+            return template.text
+        return template.text.format(**parameters)
+
+    def get_markdown(self, key: str, locale: typing.Optional[str] = None, **parameters) -> str:
+        # the same as escape_markdown(get(...)), escaping is per character
+        table = self._tables.get(locale)
+        if table is None:
+            table = self._table(locale)
+        template = table[key]
+        count = parameters.get('count')
+        if count is None:
+            if template.static:
+                return template.markdown
+            markdown = template.markdown
+        else:
+            markdown = template.markdown_options[_plural_index(count)]
+        if markdown is None:
+            return escape_markdown(self.get(key, locale, **parameters))
+        return markdown.format(**{name: escape_markdown(str(value)) for name, value in parameters.items()})
+
+    def _table(self, locale: typing.Optional[str]) -> typing.Dict[str, _Template]:
+        with self._lock:
+            table = self._tables.get(locale)
+            if table is not None:
+                return table
+            name = self.resolve(locale)
+            table = self._tables.get(name)
+            if table is None:
+                table = self._compile(name)
+                self._tables[name] = table
+            self._tables[locale] = table
+            return table
+
+    def _compile(self, locale: str) -> typing.Dict[str, _Template]:
+        phrases = self._fallback_phrases if locale == self._fallback else _load_phrases(self._files[locale])
+        return {key: _Template(phrases.get(key) or fallback_phrase)
+                for key, fallback_phrase in self._fallback_phrases.items()}
+
+
+_catalog = Catalog(aliases=_locale_convert, preload=_locale_convert.values())
+
 
 def all_locales():
     return _locale_convert.keys()
 
 
+def resolve_locale(locale) -> str:
+    return _catalog.resolve(locale)
+
+
 def get(string_key, locale=None, **parameters):
-    if locale is None or locale in _plate.locales:
-        return _plate(string_key, locale, **parameters)
-    if locale in _locale_convert:
-        return _plate(string_key, _locale_convert[locale], **parameters)
-    return get(string_key, None, **parameters)
+    return _catalog.get(string_key, locale, **parameters)
+
+
+def get_markdown(string_key, locale=None, **parameters):
+    return _catalog.get_markdown(string_key, locale, **parameters)
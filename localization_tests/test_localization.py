@@ -19,3 +19,28 @@ def test_shorter_locale():
 def test_non_existing_key():
     with pytest.raises(KeyError):
         localization.get(_TEST_BAD_KEY)
+
+
+def test_catalog_matches_plate():
+    import plate
+    old = plate.Plate(root=localization._locales_dir, locale='en_US', fallback='en_US')
+    for locale in old.locales.keys():
+        for key in old.locales['en_US'][1].keys():
+            parameters = {'minutes': 5, 'hours': 2, 'name': 'The International', 'page': 1, 'pages': 3,
+                          'team_vs_team': 'A vs B', 'tournament': 'TI', 'team': 'A'}
+            for count in [None, 0, 1, 2, 5]:
+                if count is not None:
+                    parameters['count'] = count
+                try:
+                    expected = old(key, locale, **parameters)
+                except (KeyError, IndexError):
+                    continue
+                assert localization.get(key, locale, **parameters) == expected
+                assert localization.get_markdown(key, locale, **parameters) == localization.escape_markdown(expected)
+
+
+def test_catalog_is_compiled_lazily():
+    catalog = localization.Catalog(aliases={'ru': 'ru_RU'}, preload=[])
+    assert catalog.loaded_locales() == []
+    assert catalog.get('tbd_team', 'ru') == localization.get('tbd_team', 'ru')
+    assert catalog.loaded_locales() == ['ru_RU']
@@ -1,15 +1,47 @@
+import concurrent.futures
+import threading
 import typing
+import liquipedia_dota_api
+import matches_data_loader.config
 import matches_data_loader.data_loader
 from matches_data_loader.data_loader import Dota2Match, TournamentInfo, Dota2Team
 
 
-_data_loader: typing.Optional[data_loader.DataLoader] = None
+_data_loader: typing.Optional[typing.Union[data_loader.DataLoader, data_loader.DataReplica]] = None
+_icons_api: typing.Optional[liquipedia_dota_api.Dota2Api] = None
+_icons_api_lock = threading.Lock()
 
 
-def initialize():
+def initialize(start_thread: bool = True):
+    """
+    :param start_thread: update data on a separate thread. Otherwise run_updates should be awaited
+    """
     global _data_loader
     assert(_data_loader is None)
     _data_loader = data_loader.DataLoader()
+    if start_thread:
+        _data_loader.start()
+
+
+def initialize_replica():
+    """
+    Data is not loaded by this process, but received with set_snapshot
+    """
+    global _data_loader
+    assert(_data_loader is None)
+    _data_loader = data_loader.DataReplica()
+
+
+async def run_updates(executor: concurrent.futures.Executor):
+    global _data_loader
+    assert(_data_loader is not None)
+    await _data_loader.run_updates(executor)
+
+
+def stop():
+    global _data_loader
+    assert(_data_loader is not None)
+    _data_loader.stop_data_update()
 
 
 def get_matches() -> typing.List[data_loader.Dota2Match]:
@@ -34,3 +66,27 @@ def get_data_version() -> int:
     global _data_loader
     assert(_data_loader is not None)
     return _data_loader.data_version()
+
+
+def get_snapshot() -> typing.Tuple[int, typing.Any]:
+    # (data version, data) pair to pass to set_snapshot of a replica
+    global _data_loader
+    assert(_data_loader is not None)
+    return _data_loader.snapshot()
+
+
+def set_snapshot(data_version: int, data):
+    global _data_loader
+    assert(isinstance(_data_loader, data_loader.DataReplica))
+    _data_loader.set_snapshot(data_version, data)
+
+
+def get_icon(icon_path: str) -> bytes:
+    """
+    Blocking, requests are rate limited by liquipedia get period. Works in replica processes too
+    """
+    global _icons_api
+    with _icons_api_lock:
+        if _icons_api is None:
+            _icons_api = liquipedia_dota_api.Dota2Api(app_name=config.APP_NAME)
+        return _icons_api.get_icon(icon_path)
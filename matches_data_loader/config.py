@@ -14,3 +14,6 @@ TWITCH_THUMBNAIL_EXPIRE = 3600  # seconds. After this time THUMBNAIL will be rem
 TWITCH_CLIENT_ID = os.environ['TWITCH_ID']
 TWITCH_CLIENT_SECRET = os.environ['TWITCH_SECRET']
 TWITCH_THUMBNAIL_WH = (16 * 24, 9 * 24)  # usually it is 16:9 aspect ratio
+TWITCH_STREAMS_HISTORY_CAPACITY = 4096  # maximum number of streams with tracked viewers history
+TWITCH_STREAMS_HISTORY_LENGTH = 12  # viewers samples per stream (one per TWITCH_STREAMS_UPDATE_TIMEOUT)
+TWITCH_STREAMS_HISTORY_EXPIRE = 3600  # seconds. Streams not seen for this time are removed from history
@@ -1,3 +1,5 @@
+import asyncio
+import concurrent.futures
 import datetime
 import threading
 import time
@@ -29,6 +31,7 @@ class TournamentInfo:
     prize_pool_dollars: typing.Optional[int]
     teams_count: typing.Optional[int]
     location: typing.Optional[str]
+    icon: typing.Optional[str] = None
 
 
 @dataclass(eq=False)
@@ -72,10 +75,10 @@ def _name_to_id_map(liquipedia_items: typing.Union[typing.List[liquipedia_dota_a
     return result
 
 
-def _match_same(old: Dota2Match, new: Dota2Match):
+def _match_same(old: Dota2Match, new: Dota2Match, check_start_time=True):
     if old.format != new.format:
         return False
-    if old.start_time != new.start_time:
+    if check_start_time and old.start_time != new.start_time:
         return False
     if old.tournament.liquipedia_page != new.tournament.liquipedia_page:
         return False
@@ -100,10 +103,17 @@ def _match_same(old: Dota2Match, new: Dota2Match):
 
 
 def _match_match_ids(data, new_data):
-    for m in data.upcoming_matches:
-        for new_m in new_data.upcoming_matches:
-            if _match_same(m, new_m):
-                new_m.id = m.id
+    old_matches = list(data.upcoming_matches)
+    new_matches = list(new_data.upcoming_matches)
+    # exactly same matches are paired first, then the rescheduled ones keep their ids
+    for check_start_time in (True, False):
+        for new_m in list(new_matches):
+            m = next((m for m in old_matches if _match_same(m, new_m, check_start_time)), None)
+            if m is None:
+                continue
+            new_m.id = m.id
+            old_matches.remove(m)
+            new_matches.remove(new_m)
 
 
 def _region_info(team_page_to_region, source: liquipedia_dota_api.Dota2TeamInMatch):
@@ -142,7 +152,7 @@ def _get_tournament_info(tournament_page_tournament: typing.Dict[str, liquipedia
         teams_count = None
 
     return TournamentInfo(source.name, liquipedia_page,
-                          tier, date, prize_pool_dollars, teams_count, location)
+                          tier, date, prize_pool_dollars, teams_count, location, source.icon)
 
 
 def _get_tournament_page_tournament(tournaments):
@@ -153,20 +163,34 @@ def _get_tournament_page_tournament(tournaments):
 
 
 class DataLoader:
-    def __init__(self, data_update_period=config.DATA_UPDATE_TIMEOUT):
-        self._dota2_api = liquipedia_dota_api.Dota2Api(app_name=config.APP_NAME)
-        self._twitch_streams_searcher = twitch_streams_search.TwitchDota2Api()
+    def __init__(self, data_update_period=config.DATA_UPDATE_TIMEOUT,
+                 dota2_api: typing.Optional[liquipedia_dota_api.Dota2Api] = None,
+                 twitch_streams_searcher: typing.Optional[twitch_streams_search.TwitchDota2Api] = None):
+        """
+        :param data_update_period: seconds between data updates
+        :param dota2_api: liquipedia api, a default one is created if None
+        :param twitch_streams_searcher: match streams searcher, a default one is created if None
+        """
+        self._dota2_api = dota2_api if dota2_api is not None else liquipedia_dota_api.Dota2Api(app_name=config.APP_NAME)
+        self._twitch_streams_searcher = twitch_streams_searcher if twitch_streams_searcher is not None \
+            else twitch_streams_search.TwitchDota2Api()
         self._data: _Data = _Data([], {}, {})
         self._match_id = 0
         self._data_version = 0
         self._data_lock = threading.Lock()
         self._data_update_stop_event = threading.Event()
         self._data_update_period = data_update_period
-        self._data_update_thread = threading.Thread(target=self._data_update_loop, daemon=True)
-        self._data_update_thread.start()
+        self._data_update_thread: typing.Optional[threading.Thread] = None
+        self._async_stop_event: typing.Optional[asyncio.Event] = None
 
     def __del__(self):
-        self.stop_data_update()
+        if self._data_update_thread is not None:
+            self.stop_data_update()
+
+    def start(self):
+        # updates data on a separate thread. run_updates is used instead by applications with an event loop
+        self._data_update_thread = threading.Thread(target=self._data_update_loop, daemon=True)
+        self._data_update_thread.start()
 
     def data(self) -> _Data:
         with self._data_lock:
@@ -176,12 +200,34 @@ class DataLoader:
         with self._data_lock:
             return self._data_version
 
+    def snapshot(self) -> typing.Tuple[int, _Data]:
+        with self._data_lock:
+            return self._data_version, self._data
+
     def stop_data_update(self):
         if self._data_update_stop_event.is_set():
             return
         _logger.info('Stopping data updating')
         self._data_update_stop_event.set()
-        self._data_update_thread.join()
+        if self._async_stop_event is not None:
+            self._async_stop_event.set()  # should be called from the run_updates event loop
+        if self._data_update_thread is not None:
+            self._data_update_thread.join()
+
+    async def run_updates(self, executor: concurrent.futures.Executor):
+        """
+        Updates data periodically until stop_data_update is called. Blocking requests are run on the executor
+
+        :param executor: executor to load the data on. A single worker is enough, updates are sequential
+        """
+        self._async_stop_event = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        while not self._data_update_stop_event.is_set():
+            await loop.run_in_executor(executor, self._data_update)
+            try:
+                await asyncio.wait_for(self._async_stop_event.wait(), self._data_update_period)
+            except asyncio.TimeoutError:
+                pass
 
     def _get_teams(self):
         if self.data_version() % config.TEAMS_UPD_PERIOD_MUL == 0:
@@ -264,9 +310,42 @@ class DataLoader:
                           self._data_version))
 
 
+class DataReplica:
+    def __init__(self):
+        """
+        Data loaded by a DataLoader of another process. Snapshots are installed with set_snapshot, so match ids
+        and data versions are the same as in the loading process
+        """
+        self._data: _Data = _Data([], {}, {})
+        self._data_version = 0
+        self._data_lock = threading.Lock()
+
+    def data(self) -> _Data:
+        with self._data_lock:
+            return self._data
+
+    def data_version(self):
+        with self._data_lock:
+            return self._data_version
+
+    def snapshot(self) -> typing.Tuple[int, _Data]:
+        with self._data_lock:
+            return self._data_version, self._data
+
+    def set_snapshot(self, data_version: int, data: _Data):
+        with self._data_lock:
+            if data_version > self._data_version:
+                self._data_version = data_version
+                self._data = data
+
+    def stop_data_update(self):
+        pass
+
+
 def _run_data_loader():
     logging.basicConfig(level=logging.INFO)
     data_provider = DataLoader(data_update_period=config.DATA_UPDATE_TIMEOUT)
+    data_provider.start()
     try:
         while True:
             _logger.info('Data loader is running. Data version %d' % data_provider.data_version())
@@ -0,0 +1,119 @@
+import array
+import time
+import typing
+import logging
+import matches_data_loader.config as config
+from dataclasses import dataclass
+
+
+_logger = logging.getLogger('streams_history')
+
+
+@dataclass(eq=False)
+class ViewersStats:
+    current: int
+    mean: float
+    trend: float  # average viewers change per sample, positive for growing streams
+    stability: float  # in [0, 1]. 1 means viewers count did not change over the history
+    samples: int
+
+
+class StreamsViewersHistory:
+    def __init__(self, capacity: int = config.TWITCH_STREAMS_HISTORY_CAPACITY,
+                 history_length: int = config.TWITCH_STREAMS_HISTORY_LENGTH,
+                 expire: float = config.TWITCH_STREAMS_HISTORY_EXPIRE):
+        """
+        Viewers count history for a bounded number of streams. All the samples are kept in preallocated ring
+        buffers, so memory usage does not depend on how many streams were seen during the bot lifetime
+
+        :param capacity: maximum number of tracked streams. The least recently seen stream is evicted when a new
+                         stream does not fit
+        :param history_length: number of viewers count samples kept per stream
+        :param expire: streams not seen for this amount of seconds are evicted
+        """
+        assert capacity > 0 and history_length > 0
+        self._capacity = capacity
+        self._history_length = history_length
+        self._expire = expire
+
+        self._samples = array.array('l', bytes(array.array('l').itemsize * capacity * history_length))
+        self._heads = array.array('l', bytes(array.array('l').itemsize * capacity))  # next sample position
+        self._counts = array.array('l', bytes(array.array('l').itemsize * capacity))  # filled samples
+        self._last_seen = array.array('d', bytes(array.array('d').itemsize * capacity))
+
+        self._slots: typing.Dict[str, int] = dict()  # stream id to slot
+        self._slot_ids: typing.List[typing.Optional[str]] = [None] * capacity
+        self._free_slots: typing.List[int] = list(reversed(range(capacity)))
+
+    def __len__(self):
+        return len(self._slots)
+
+    def __contains__(self, stream_id: str):
+        return stream_id in self._slots
+
+    def add_samples(self, viewers: typing.Iterable[typing.Tuple[str, int]], now: typing.Optional[float] = None):
+        now = time.time() if now is None else now
+        self._evict_expired(now)
+        for stream_id, viewer_count in viewers:
+            slot = self._slots.get(stream_id)
+            if slot is None:
+                slot = self._allocate(stream_id)
+            head = self._heads[slot]
+            self._samples[slot * self._history_length + head] = viewer_count
+            self._heads[slot] = (head + 1) % self._history_length
+            self._counts[slot] = min(self._counts[slot] + 1, self._history_length)
+            self._last_seen[slot] = now
+
+    def stats(self, stream_id: str) -> typing.Optional[ViewersStats]:
+        slot = self._slots.get(stream_id)
+        if slot is None:
+            return None
+        samples = self._ordered_samples(slot)
+
+        count = len(samples)
+        mean = sum(samples) / count
+        if count == 1 or mean == 0:
+            return ViewersStats(samples[-1], mean, 0.0, 1.0, count)
+
+        # least squares slope over sample indices
+        x_mean = (count - 1) / 2
+        covariance = sum((x - x_mean) * (v - mean) for x, v in enumerate(samples))
+        x_variance = sum((x - x_mean) ** 2 for x in range(count))
+        trend = covariance / x_variance
+
+        deviation = (sum((v - mean) ** 2 for v in samples) / count) ** 0.5
+        stability = max(0.0, 1.0 - deviation / mean)
+
+        return ViewersStats(samples[-1], mean, trend, stability, count)
+
+    def _ordered_samples(self, slot: int) -> typing.List[int]:
+        begin = slot * self._history_length
+        count = self._counts[slot]
+        head = self._heads[slot]
+        if count < self._history_length:
+            return self._samples[begin:begin + count].tolist()
+        return self._samples[begin + head:begin + self._history_length].tolist() + \
+            self._samples[begin:begin + head].tolist()
+
+    def _allocate(self, stream_id: str) -> int:
+        if len(self._free_slots) == 0:
+            oldest = min(range(self._capacity), key=self._last_seen.__getitem__)
+            self._free(oldest)
+        slot = self._free_slots.pop()
+        self._slots[stream_id] = slot
+        self._slot_ids[slot] = stream_id
+        self._heads[slot] = 0
+        self._counts[slot] = 0
+        return slot
+
+    def _free(self, slot: int):
+        del self._slots[self._slot_ids[slot]]
+        self._slot_ids[slot] = None
+        self._free_slots.append(slot)
+
+    def _evict_expired(self, now: float):
+        expired = [slot for slot in self._slots.values() if self._last_seen[slot] + self._expire < now]
+        for slot in expired:
+            self._free(slot)
+        if len(expired) != 0:
+            _logger.info(f'{len(expired)} streams evicted from viewers history')
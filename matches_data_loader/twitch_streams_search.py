@@ -6,6 +6,7 @@ import re
 import requests
 import langcodes
 import matches_data_loader.config as config
+from matches_data_loader.streams_history import StreamsViewersHistory, ViewersStats
 from dataclasses import dataclass
 
 
@@ -40,8 +41,30 @@ def _by_words_substring_score(string, substring):
     return count / len(substring_words) * 0.7
 
 
+def _popularity_score(viewer_count: int, viewers_stats: typing.Optional[ViewersStats]) -> float:
+    if viewers_stats is None or viewers_stats.samples < 2:
+        sustained_viewers = viewer_count
+    else:
+        # a short spike makes viewers count unstable, so it does not outweigh a steadily popular stream
+        sustained_viewers = viewers_stats.mean * (0.5 + 0.5 * viewers_stats.stability)
+
+    score = 0.0
+    if sustained_viewers > 5400:
+        score += 0.3
+    elif sustained_viewers > 1000:
+        score += 0.1
+    elif sustained_viewers > 100:
+        score += 0.05
+
+    if viewers_stats is not None and viewers_stats.trend > 0 and sustained_viewers > 100:
+        score += 0.02
+
+    return score
+
+
 def _score_stream_is_a_match_stream(
-        stream: twitch.helix.Stream, team1_name: str, team2_name: str, tournament_name: str) -> float:
+        stream: twitch.helix.Stream, team1_name: str, team2_name: str, tournament_name: str,
+        viewers_stats: typing.Optional[ViewersStats] = None) -> float:
     if team1_name is None or team2_name is None or tournament_name is None:
         return 0.0
 
@@ -81,12 +104,7 @@ def _score_stream_is_a_match_stream(
     elif stream.language == 'en':
         score += 0.05
 
-    if stream.viewer_count > 5400:
-        score += 0.3
-    elif stream.viewer_count > 1000:
-        score += 0.1
-    elif stream.viewer_count > 100:
-        score += 0.05
+    score += _popularity_score(stream.viewer_count, viewers_stats)
 
     return score
 
@@ -96,6 +114,7 @@ class TwitchDota2Api:
         self._helix = twitch.Helix(client_id, client_secret)
         self._dota2_id = self._helix.game(name='Dota 2').id
         self._next_update = None
+        self._viewers_history = StreamsViewersHistory()
         self._reload_dota2_streams_if_needed()
 
     def find_match_streams(self,
@@ -104,7 +123,8 @@ class TwitchDota2Api:
                            tournament_name: str) -> typing.List[StreamInfo]:
         self._reload_dota2_streams_if_needed()
 
-        scores = [_score_stream_is_a_match_stream(stream, team1_name, team2_name, tournament_name)
+        scores = [_score_stream_is_a_match_stream(stream, team1_name, team2_name, tournament_name,
+                                                  self._viewers_history.stats(stream.id))
                   for stream in self._streams]
 
         best_stream_idx_by_score = _argsort_scores(scores)
@@ -151,7 +171,10 @@ class TwitchDota2Api:
             else:
                 stream.language = langcodes.Language.get(stream.language).display_name('ru')
 
-        _logger.info('dota2 %d streams loaded' % len(self._streams))
+        self._viewers_history.add_samples((stream.id, stream.viewer_count) for stream in self._streams)
+
+        _logger.info('dota2 %d streams loaded, %d streams in viewers history' %
+                     (len(self._streams), len(self._viewers_history)))
 
     @staticmethod
     def get_thumbnail(uri: str):
@@ -0,0 +1,54 @@
+import datetime
+import liquipedia_dota_api
+from matches_data_loader.data_loader import DataLoader
+
+
+_START_TIME = datetime.datetime(2026, 10, 20, 18, tzinfo=datetime.timezone.utc)
+
+
+class _Api:
+    def __init__(self):
+        self.matches = []
+
+    def get_matches(self):
+        return self.matches
+
+    @staticmethod
+    def get_teams():
+        return [liquipedia_dota_api.Dota2Team('Team Spirit', 'CIS', '/dota2/Team_Spirit', 'spirit.png')]
+
+    @staticmethod
+    def get_tournaments():
+        return [liquipedia_dota_api.Dota2Tournament('The International', '/dota2/TI', 'Tier 1', 'Sep 2026', 1000000,
+                                                    16, 'Europe')]
+
+
+class _Streams:
+    @staticmethod
+    def find_match_streams(team1_name, team2_name, tournament_name):
+        return []
+
+
+def _match(start_time: datetime.datetime, tournament_page: str = '/dota2/TI/Group_Stage'):
+    return liquipedia_dota_api.Dota2Match(
+        liquipedia_dota_api.Dota2TeamInMatch('Team Spirit', '/dota2/Team_Spirit', 'spirit.png'),
+        liquipedia_dota_api.Dota2TeamInMatch('Team Liquid', '/dota2/Team_Liquid', 'liquid.png'),
+        liquipedia_dota_api.TournamentInfoInMatch('The International', tournament_page, 'ti.png'),
+        None, 'Bo3', start_time)
+
+
+def test_data_update_joins_and_keeps_match_ids():
+    api = _Api()
+    loader = DataLoader(dota2_api=api, twitch_streams_searcher=_Streams())
+    api.matches = [_match(_START_TIME)]
+    loader._data_update()
+    match = loader.data().upcoming_matches[0]
+    assert match.team1.region == 'CIS'
+    assert match.team2.region is None  # not a notable team
+    assert match.tournament.liquipedia_page == '/dota2/TI'
+    assert match.tournament.prize_pool_dollars == 1000000
+
+    # the rescheduled match keeps its id, the new one gets a new id
+    api.matches = [_match(_START_TIME + datetime.timedelta(hours=1)), _match(_START_TIME, '/dota2/Other')]
+    loader._data_update()
+    assert [m.id for m in loader.data().upcoming_matches] == [match.id, match.id + 2]
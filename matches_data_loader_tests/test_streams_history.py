@@ -0,0 +1,45 @@
+import pytest
+from matches_data_loader.streams_history import StreamsViewersHistory
+from matches_data_loader.twitch_streams_search import _popularity_score
+
+
+def test_stats_ring_buffer():
+    history = StreamsViewersHistory(capacity=4, history_length=3, expire=100)
+    assert history.stats('stream') is None
+
+    history.add_samples([('stream', 10)], now=0)
+    stats = history.stats('stream')
+    assert stats.current == 10
+    assert stats.samples == 1
+    assert stats.stability == 1.0
+
+    for now, viewers in enumerate([20, 30, 40, 50], start=1):
+        history.add_samples([('stream', viewers)], now=now)
+    stats = history.stats('stream')
+    assert stats.samples == 3
+    assert stats.current == 50
+    assert stats.mean == pytest.approx(40)
+    assert stats.trend == pytest.approx(10)
+
+
+def test_eviction():
+    history = StreamsViewersHistory(capacity=2, history_length=3, expire=100)
+    history.add_samples([('stream1', 1)], now=0)
+    history.add_samples([('stream2', 2)], now=1)
+    history.add_samples([('stream3', 3)], now=2)
+    assert 'stream1' not in history
+    assert 'stream2' in history and 'stream3' in history
+    assert len(history) == 2
+    assert history.stats('stream3').samples == 1
+
+    history.add_samples([('stream3', 3)], now=102)
+    assert 'stream2' not in history
+    assert len(history) == 1
+
+
+def test_spike_is_less_popular_than_steady_stream():
+    history = StreamsViewersHistory(capacity=4, history_length=6, expire=100)
+    for now, (official, co_stream) in enumerate([(6000, 200), (6500, 200), (7000, 300), (7500, 8000)]):
+        history.add_samples([('official', official), ('co_stream', co_stream)], now=now)
+    assert _popularity_score(7500, history.stats('official')) > \
+        _popularity_score(8000, history.stats('co_stream'))
@@ -0,0 +1,73 @@
+import asyncio
+import concurrent.futures
+import typing
+import telegram_bot.config as config
+
+
+T = typing.TypeVar('T')
+
+
+class DbExecutor(concurrent.futures.ThreadPoolExecutor):
+    def __init__(self, workers: int = config.DB_EXECUTOR_WORKERS):
+        """
+        Threads for blocking db queries. Peewee keeps a connection per thread, so every worker uses its own
+        sqlite connection, and WAL mode lets readers proceed while a writer holds the write lock
+        """
+        super().__init__(max_workers=workers, thread_name_prefix='db')
+
+    async def run(self, function: typing.Callable[..., T], *args) -> T:
+        return await asyncio.get_running_loop().run_in_executor(self, function, *args)
+
+
+class AsyncRemindersStorage:
+    def __init__(self, storage: typing.Callable[[], typing.Any], executor: DbExecutor):
+        """
+        Awaitable RemindersStorage methods run on the db executor, so event loop is not blocked by db writes
+        or by waiting for the storage lock held by a write
+
+        :param storage: returns the RemindersStorage. Called on every request, so the facade may be created
+            before the storage is initialized
+        """
+        self._storage = storage
+        self._executor = executor
+
+    async def _run(self, method: str, *args):
+        return await self._executor.run(getattr(self._storage(), method), *args)
+
+    async def add_team_reminder(self, chat_id: str, team_id: str):
+        await self._run('add_team_reminder', chat_id, team_id)
+
+    async def remove_team_reminder(self, chat_id: str, team_id: str):
+        await self._run('remove_team_reminder', chat_id, team_id)
+
+    async def add_tournament_reminder(self, chat_id: str, tournament_id: str):
+        await self._run('add_tournament_reminder', chat_id, tournament_id)
+
+    async def remove_tournament_reminder(self, chat_id: str, tournament_id: str):
+        await self._run('remove_tournament_reminder', chat_id, tournament_id)
+
+    async def add_all_reminder(self, chat_id: str):
+        await self._run('add_all_reminder', chat_id)
+
+    async def remove_all_reminder(self, chat_id: str):
+        await self._run('remove_all_reminder', chat_id)
+
+    async def remove_all_reminders(self, chat_id: str):
+        await self._run('remove_all_reminders', chat_id)
+
+    async def get_reminded_chat_ids(self, match_descriptor, lead_time: typing.Optional[int] = None) \
+            -> typing.Set[str]:
+        return await self._run('get_reminded_chat_ids', match_descriptor, lead_time)
+
+    async def get_reminders(self, chat_id: str) -> typing.Set:
+        return await self._run('get_reminders', chat_id)
+
+    async def get_lead_times(self, chat_id: str) -> typing.FrozenSet[int]:
+        return await self._run('get_lead_times', chat_id)
+
+    async def set_lead_times(self, chat_id: str, lead_times: typing.Iterable[int]):
+        await self._run('set_lead_times', chat_id, frozenset(lead_times))
+
+    async def get_stats(self):
+        return await self._run('get_stats')
+
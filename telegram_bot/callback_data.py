@@ -0,0 +1,146 @@
+import collections
+import hashlib
+import logging
+import secrets
+import string
+import typing
+import matches_data_loader
+import telegram_bot.config as config
+
+
+_logger = logging.getLogger('callback_data')
+
+
+# callback data is '<command> <token>', where token is '<codec version><epoch><data version>.<short id>'.
+# Short ids are only valid within the data version registry they were issued by. Data versions restart with the
+# process, so the epoch tells apart tokens issued before a restart
+_CODEC_VERSION = '2'
+_ALPHABET = string.digits + string.ascii_lowercase
+_EPOCH_LENGTH = 4
+# stable tokens are '<stable codec version><hash of the name>'. They are used by messages, which stay in chats
+# indefinitely (inline query results), and are decoded while the name is in the data
+_STABLE_CODEC_VERSION = 's'
+_NAME_HASH_BYTES = 6
+
+Kind = typing.Literal['team', 'tournament']
+
+
+def _new_epoch() -> str:
+    return ''.join(secrets.choice(_ALPHABET) for _ in range(_EPOCH_LENGTH))
+
+
+def _to_base36(value: int) -> str:
+    result = ''
+    while True:
+        value, digit = divmod(value, len(_ALPHABET))
+        result = _ALPHABET[digit] + result
+        if value == 0:
+            return result
+
+
+def _name_hash(kind: Kind, name: str) -> str:
+    digest = hashlib.blake2b(f'{kind}:{name}'.encode(), digest_size=_NAME_HASH_BYTES).digest()
+    return _to_base36(int.from_bytes(digest, 'big'))
+
+
+class ShortIdRegistry:
+    def __init__(self, data_version: int, teams: typing.Iterable[str], tournaments: typing.Iterable[str]):
+        """
+        Short ids of team and tournament names for a data version. Names, which are not in the data
+        (e.g. reminders about teams without upcoming matches), get ids on demand
+        """
+        self.data_version = data_version
+        self._ids: typing.Dict[typing.Tuple[Kind, str], str] = dict()
+        self._names: typing.Dict[typing.Tuple[Kind, str], str] = dict()
+        for name in sorted(teams):
+            self.id('team', name)
+        for name in sorted(tournaments):
+            self.id('tournament', name)
+        self._data_names = list(self._ids.keys())
+        self._hashed_names: typing.Optional[typing.Dict[typing.Tuple[Kind, str], str]] = None
+
+    def __len__(self):
+        return len(self._ids)
+
+    def id(self, kind: Kind, name: str) -> str:
+        short_id = self._ids.get((kind, name))
+        if short_id is None:
+            short_id = _to_base36(len(self._ids))
+            self._ids[(kind, name)] = short_id
+            self._names[(kind, short_id)] = name
+        return short_id
+
+    def name(self, kind: Kind, short_id: str) -> typing.Optional[str]:
+        return self._names.get((kind, short_id))
+
+    def hashed_name(self, kind: Kind, name_hash: str) -> typing.Optional[str]:
+        # only names of the data are hashed: a name is not decoded after it has left the data
+        if self._hashed_names is None:
+            self._hashed_names = {(k, _name_hash(k, name)): name for k, name in self._data_names}
+        return self._hashed_names.get((kind, name_hash))
+
+
+class CallbackCodec:
+    def __init__(self, keep_versions: int = config.CALLBACK_REGISTRY_VERSIONS):
+        """
+        Encodes team and tournament names into compact callback data. Registries of the last keep_versions data
+        versions are kept, so buttons of recently sent keyboards are decoded after the data update
+
+        :param keep_versions: number of data versions, which callback data is decoded for
+        """
+        self._registries: typing.OrderedDict[int, ShortIdRegistry] = collections.OrderedDict()
+        self._keep_versions = keep_versions
+        self._epoch = _new_epoch()
+
+    def registry(self) -> ShortIdRegistry:
+        data_version = matches_data_loader.get_data_version()
+        registry = self._registries.get(data_version)
+        if registry is None:
+            registry = ShortIdRegistry(data_version, matches_data_loader.get_teams().keys(),
+                                       matches_data_loader.get_tournaments().keys())
+            self._registries[data_version] = registry
+            while len(self._registries) > self._keep_versions:
+                self._registries.popitem(last=False)
+            _logger.info(f'short ids registry for data version {data_version} is built, {len(registry)} names')
+        return registry
+
+    def token(self, kind: Kind, name: str) -> str:
+        registry = self.registry()
+        return f'{_CODEC_VERSION}{self._epoch}{_to_base36(registry.data_version)}.{registry.id(kind, name)}'
+
+    @staticmethod
+    def stable_token(kind: Kind, name: str) -> str:
+        return _STABLE_CODEC_VERSION + _name_hash(kind, name)
+
+    def encode(self, command: str, kind: Kind, name: str, stable: bool = False) -> str:
+        """
+        :param stable: encode with a stable token, which is decoded after restarts and any number of data updates
+        """
+        token = self.stable_token(kind, name) if stable else self.token(kind, name)
+        data = f'{config.CALLBACK_COMMANDS[command]} {token}'
+        assert len(data.encode()) <= config.CALLBACK_DATA_MAX_BYTES
+        return data
+
+    def decode(self, token: str, kind: Kind) -> typing.Optional[str]:
+        """
+        :param token: callback data after the command prefix
+        :return: encoded name or None if the token is malformed, was issued before a restart or its data version
+                 registry has expired. A stable token is decoded while its name is in the data
+        """
+        if token.startswith(_STABLE_CODEC_VERSION):
+            return self.registry().hashed_name(kind, token[len(_STABLE_CODEC_VERSION):])
+        if not token.startswith(_CODEC_VERSION + self._epoch) or '.' not in token:
+            return None
+        data_version, short_id = token[len(_CODEC_VERSION) + _EPOCH_LENGTH:].split('.', 1)
+        try:
+            registry = self._registries.get(int(data_version, len(_ALPHABET)))
+        except ValueError:
+            return None
+        return registry.name(kind, short_id) if registry is not None else None
+
+
+_codec = CallbackCodec()
+
+
+def codec() -> CallbackCodec:
+    return _codec
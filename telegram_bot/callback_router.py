@@ -0,0 +1,116 @@
+import logging
+import time
+import typing
+import telegram
+import telegram.ext
+from dataclasses import dataclass
+
+
+_logger = logging.getLogger('callback_router')
+
+
+class CallbackContext:
+    def __init__(self, update: telegram.Update, context: telegram.ext.ContextTypes.DEFAULT_TYPE, arguments: str,
+                 get_lang: typing.Callable[[telegram.Update], typing.Awaitable[str]]):
+        """
+        Per update state passed to callback handlers
+
+        :param arguments: callback data after the command prefix, empty if there are no arguments
+        :param get_lang: resolves the chat language. Called at most once per update
+        """
+        self.update = update
+        self.context = context
+        self.arguments = arguments
+        self._get_lang = get_lang
+        self._lang: typing.Optional[str] = None
+
+    @property
+    def bot(self) -> telegram.Bot:
+        return self.context.bot
+
+    @property
+    def chat_id(self) -> str:
+        # buttons of messages sent via inline mode have no chat, the private chat with the user is used then
+        if self.update.effective_chat is None:
+            return str(self.update.effective_user.id)
+        return str(self.update.effective_chat.id)
+
+    @property
+    def message(self) -> telegram.Message:
+        return self.update.callback_query.message
+
+    async def lang(self) -> str:
+        if self._lang is None:
+            self._lang = await self._get_lang(self.update)
+        return self._lang
+
+    async def answer(self, text: typing.Optional[str] = None):
+        await self.bot.answer_callback_query(callback_query_id=self.update.callback_query.id, text=text)
+
+
+CallbackHandler = typing.Callable[[CallbackContext], typing.Awaitable[typing.Any]]
+
+
+@dataclass()
+class RouteStats:
+    calls: int = 0
+    errors: int = 0
+    total_seconds: float = 0.0
+    max_seconds: float = 0.0
+
+
+class CallbackRouter:
+    def __init__(self, get_lang: typing.Callable[[telegram.Update], typing.Awaitable[str]]):
+        """
+        Dispatches callback queries by their command prefix. A prefix is one or two space separated words
+        (e.g. 'fte' or 's tl'), so dispatch is at most two dict lookups regardless of the number of routes
+
+        :param get_lang: resolves the chat language of an update
+        """
+        self._get_lang = get_lang
+        self._routes: typing.Dict[str, CallbackHandler] = dict()
+        self._stats: typing.Dict[str, RouteStats] = dict()
+
+    def add(self, prefix: str, handler: CallbackHandler):
+        assert prefix not in self._routes and 1 <= len(prefix.split(' ')) <= 2
+        self._routes[prefix] = handler
+        self._stats[prefix] = RouteStats()
+
+    def route(self, prefix: str):
+        def wrapper(handler: CallbackHandler):
+            self.add(prefix, handler)
+            return handler
+        return wrapper
+
+    def resolve(self, data: str) -> typing.Optional[typing.Tuple[str, str]]:
+        # longer prefix wins: settings commands share the first word
+        words = data.split(' ', 2)
+        if len(words) >= 2:
+            prefix = f'{words[0]} {words[1]}'
+            if prefix in self._routes:
+                return prefix, words[2] if len(words) == 3 else ''
+        if words[0] in self._routes:
+            return words[0], data[len(words[0]) + 1:]
+        return None
+
+    async def dispatch(self, update: telegram.Update, context: telegram.ext.ContextTypes.DEFAULT_TYPE) -> bool:
+        resolved = self.resolve(update.callback_query.data)
+        if resolved is None:
+            return False
+        prefix, arguments = resolved
+        stats = self._stats[prefix]
+        begin = time.perf_counter()
+        try:
+            await self._routes[prefix](CallbackContext(update, context, arguments, self._get_lang))
+        except Exception:
+            stats.errors += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - begin
+            stats.calls += 1
+            stats.total_seconds += elapsed
+            stats.max_seconds = max(stats.max_seconds, elapsed)
+        return True
+
+    def stats(self) -> typing.Dict[str, RouteStats]:
+        return dict(self._stats)
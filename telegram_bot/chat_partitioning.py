@@ -0,0 +1,138 @@
+import asyncio
+import concurrent.futures
+import functools
+import logging
+import multiprocessing
+import typing
+import telegram
+
+
+_logger = logging.getLogger('chat_partitioning')
+
+
+_STOP = None
+
+
+def update_chat_key(update: telegram.Update) -> int:
+    # updates without a chat (e.g. inline queries) are partitioned by the user
+    if update.effective_chat is not None:
+        return update.effective_chat.id
+    if update.effective_user is not None:
+        return update.effective_user.id
+    return 0
+
+
+def worker_index(chat_key: int, workers: int) -> int:
+    return chat_key % workers
+
+
+class ChatOrderedProcessor:
+    def __init__(self, max_pending: int):
+        """
+        Processes updates of different chats concurrently and updates of a chat one by one in submission order
+
+        :param max_pending: submit waits while this number of updates are not processed
+        """
+        self._slots = asyncio.Semaphore(max_pending)
+        self._tails: typing.Dict[int, asyncio.Task] = dict()  # the last submitted update of a chat
+        self._tasks: typing.Set[asyncio.Task] = set()
+
+    async def submit(self, chat_key: int, process: typing.Callable[[], typing.Awaitable]):
+        await self._slots.acquire()
+        task = asyncio.create_task(self._process(self._tails.get(chat_key), process))
+        self._tails[chat_key] = task
+        self._tasks.add(task)
+        task.add_done_callback(functools.partial(self._done, chat_key))
+
+    async def join(self):
+        while len(self._tasks) != 0:
+            await asyncio.wait(list(self._tasks))
+
+    @staticmethod
+    async def _process(previous: typing.Optional[asyncio.Task], process: typing.Callable[[], typing.Awaitable]):
+        if previous is not None:
+            await asyncio.wait([previous])
+        try:
+            await process()
+        except Exception as e:
+            _logger.error('failed to process update', exc_info=e)
+
+    def _done(self, chat_key: int, task: asyncio.Task):
+        self._slots.release()
+        self._tasks.discard(task)
+        if self._tails.get(chat_key) is task:
+            del self._tails[chat_key]
+
+
+class WorkerPool:
+    def __init__(self, workers: int, target: typing.Callable[[int, multiprocessing.Queue], None]):
+        """
+        Processes handling updates of their chats. Every chat is handled by the same worker, so updates of a chat
+        are processed in order and per chat state stays in one process
+
+        :param target: called as target(worker index, queue) in a spawned process, should call serve_queue.
+            The target should be importable by the worker process
+        """
+        self._context = multiprocessing.get_context('spawn')
+        self._target = target
+        self._queues = [self._context.Queue() for _ in range(workers)]
+        self._processes: typing.List[multiprocessing.Process] = []
+        self._routed = [0] * workers
+
+    def __len__(self):
+        return len(self._queues)
+
+    def start(self):
+        self._processes = [self._context.Process(target=self._target, args=(index, queue), name=f'worker-{index}')
+                           for index, queue in enumerate(self._queues)]
+        for process in self._processes:
+            process.start()
+        _logger.info(f'{len(self._processes)} workers started')
+
+    def route(self, chat_key: int, payload: str):
+        index = worker_index(chat_key, len(self._queues))
+        self._queues[index].put((chat_key, payload))
+        self._routed[index] += 1
+
+    def broadcast(self, message):
+        # messages are passed to on_message of every worker, in order with the routed updates
+        for queue in self._queues:
+            queue.put((None, message))
+
+    def routed(self) -> typing.List[int]:
+        return list(self._routed)
+
+    def stop(self, timeout: float):
+        # blocks until routed updates are processed and workers exit
+        for queue in self._queues:
+            queue.put(_STOP)
+        for process in self._processes:
+            process.join(timeout)
+            if process.is_alive():
+                _logger.warning(f'{process.name} did not stop in {timeout}s, terminating')
+                process.terminate()
+                process.join()
+        self._processes = []
+
+
+async def serve_queue(queue: multiprocessing.Queue, process_update: typing.Callable[[str], typing.Awaitable],
+                      on_message: typing.Callable[[typing.Any], None], max_pending: int):
+    """
+    Worker process loop, returns when the pool is stopped and received updates are processed
+
+    :param process_update: called with payloads passed to WorkerPool.route
+    :param on_message: called with messages passed to WorkerPool.broadcast
+    """
+    processor = ChatOrderedProcessor(max_pending)
+    loop = asyncio.get_running_loop()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix='worker_queue') as reader:
+        while True:
+            item = await loop.run_in_executor(reader, queue.get)
+            if item is _STOP:
+                break
+            chat_key, payload = item
+            if chat_key is None:
+                on_message(payload)
+            else:
+                await processor.submit(chat_key, functools.partial(process_update, payload))
+    await processor.join()
@@ -1,8 +1,11 @@
+import typing
+import collections
 import threading
 import telegram
 import logging
 import peewee
 import telegram_bot.config as config
+from telegram_bot.db_migrations import apply_migrations
 
 
 _logger = logging.getLogger('settings_storage')
@@ -18,6 +21,9 @@ _db = peewee.SqliteDatabase(
         'synchronous': 0})
 
 
+_MAX_QUERY_PARAMETERS = 900  # sqlite may be compiled with 999 max variables in a query
+
+
 class _BaseModel(peewee.Model):
     class Meta:
         database = _db
@@ -29,28 +35,91 @@ class _ChatSetting(_BaseModel):
     setting_value = peewee.CharField(unique=False)
 
 
+def _add_unique_chat_setting_index(migrator):
+    # an old version of set() could create duplicated settings. The latest one is kept
+    latest = _ChatSetting.select(peewee.fn.Max(_ChatSetting.id)) \
+        .group_by(_ChatSetting.chat_id, _ChatSetting.setting_key)
+    removed = _ChatSetting.delete().where(_ChatSetting.id.not_in(latest)).execute()
+    _logger.info(f'{removed} duplicated chat settings removed')
+    migrator.add_index(_ChatSetting._meta.table_name, ('chat_id', 'setting_key'), unique=True).run()
+
+
+_MIGRATIONS = [
+    _add_unique_chat_setting_index,
+]
+
+
+_NOT_SET = object()
+
+
 class SettingsStorage:
-    def __init__(self):
+    def __init__(self, cache_size: int = config.SETTINGS_CACHE_SIZE):
         self._lock = threading.Lock()
+        self._cache: typing.OrderedDict[typing.Tuple[str, str], typing.Any] = collections.OrderedDict()
+        self._cache_size = cache_size
         _logger.info('connecting db')
         _db.connect()
         _logger.info('creating tables')
         _db.create_tables([_ChatSetting])
+        apply_migrations(_db, _MIGRATIONS)
+
+    def _cache_put(self, chat_id: str, key: str, value):
+        self._cache[(chat_id, key)] = value
+        self._cache.move_to_end((chat_id, key))
+        if len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+
+    def _cache_get(self, chat_id: str, key: str):
+        value = self._cache.get((chat_id, key), _NOT_SET)
+        if value is not _NOT_SET:
+            self._cache.move_to_end((chat_id, key))
+        return value
+
+    def clear_cache(self):
+        # settings may be modified by other processes
+        with self._lock:
+            self._cache.clear()
 
     def get(self, chat_id: str, key: str, default=None):
+        chat_id = str(chat_id)
+        with self._lock:
+            value = self._cache_get(chat_id, key)
+            if value is _NOT_SET:
+                row = _ChatSetting.select(_ChatSetting.setting_value).where(
+                    (_ChatSetting.chat_id == chat_id) & (_ChatSetting.setting_key == key)).tuples().first()
+                value = None if row is None else row[0]
+                self._cache_put(chat_id, key, value)
+        return default if value is None else value
+
+    def get_many(self, chat_ids: typing.Iterable[str], key: str) -> typing.Dict[str, str]:
+        # chats without the setting are not present in the result
+        result = dict()
         with self._lock:
-            q = _ChatSetting.select().where((_ChatSetting.chat_id == chat_id) & (_ChatSetting.setting_key == key))
-            if q.count() == 0:
-                return default
-            return q[0].setting_value
+            not_cached = []
+            for chat_id in map(str, chat_ids):
+                value = self._cache_get(chat_id, key)
+                if value is _NOT_SET:
+                    not_cached.append(chat_id)
+                elif value is not None:
+                    result[chat_id] = value
+
+            for begin in range(0, len(not_cached), _MAX_QUERY_PARAMETERS):
+                chunk = not_cached[begin:begin + _MAX_QUERY_PARAMETERS]
+                q = _ChatSetting.select(_ChatSetting.chat_id, _ChatSetting.setting_value).where(
+                    (_ChatSetting.chat_id.in_(chunk)) & (_ChatSetting.setting_key == key))
+                loaded = dict(q.tuples())
+                for chat_id in chunk:
+                    self._cache_put(chat_id, key, loaded.get(chat_id))
+                result.update(loaded)
+        return result
 
     def set(self, chat_id: str, key, value):
+        chat_id = str(chat_id)
         with self._lock:
-            chat_setting, created = \
-                _ChatSetting.get_or_create(chat_id=chat_id, setting_key=key, defaults={'setting_value': value})
-            if created:
-                return
-            chat_setting.update(setting_value=value).execute()
+            _ChatSetting.insert(chat_id=chat_id, setting_key=key, setting_value=value).on_conflict(
+                conflict_target=[_ChatSetting.chat_id, _ChatSetting.setting_key],
+                update={_ChatSetting.setting_value: value}).execute()
+            self._cache_put(chat_id, key, value)
 
 
 _def_storage = SettingsStorage()
@@ -70,14 +139,26 @@ def get_lang_for_known_chat(chat_id):
     return lang
 
 
+def get_langs_for_known_chats(chat_ids: typing.Iterable[str]) -> typing.Dict[str, typing.Optional[str]]:
+    chat_ids = list(chat_ids)
+    langs = storage().get_many(chat_ids, _LANG_KEY)
+    unknown = [chat_id for chat_id in chat_ids if chat_id not in langs]
+    if len(unknown) != 0:
+        _logger.warning(f'there is no lang setting for {len(unknown)} chats, e.g. {unknown[0]}, '
+                        f'get lang with update should be called first')
+    return {chat_id: langs.get(chat_id) for chat_id in chat_ids}
+
+
 def set_chat_lang(chat_id, lang: str):
     storage().set(chat_id, _LANG_KEY, lang)
 
 
 def get_lang(update: telegram.Update):
-    lang = storage().get(str(update.effective_chat.id), _LANG_KEY)
+    # inline queries have no chat, the private chat with the user is used then
+    chat_id = str(update.effective_chat.id if update.effective_chat is not None else update.effective_user.id)
+    lang = storage().get(chat_id, _LANG_KEY)
     if lang is not None:
         return lang
 
-    storage().set(str(update.effective_chat.id), _LANG_KEY, update.effective_user.language_code)
+    storage().set(chat_id, _LANG_KEY, update.effective_user.language_code)
     return get_lang(update)
@@ -5,31 +5,104 @@ def bot_token():
     return os.environ['TELEGRAM_BOT_TOKEN']
 
 
+def webhook_secret_token():
+    return os.environ['TELEGRAM_WEBHOOK_SECRET_TOKEN']
+
+
 ROOT_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..')
 
 LOG_FILE = os.path.join(ROOT_DIR, 'log.txt')
 
-REMINDERS_CHECK_PERIOD_SECONDS = 60  # This should be less than REMINDERS_WINDOW_SECONDS not to skip reminders
-REMINDERS_WINDOW_SECONDS = 600  # remind [10, 0] minutes before match
+REMINDER_LEAD_TIMES_SECONDS = (3600, 900, 600, 0)  # chats may select when to be reminded before match start
+REMINDER_DEFAULT_LEAD_TIME_SECONDS = 600
+REMINDERS_DATA_CHECK_PERIOD_SECONDS = 5  # how often reminders sender checks for new matches data
 
 REMINDERS_STORAGE_FILE = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'reminders.db')
+REMINDERS_JOURNAL_FILE = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'reminders.journal')
+REMINDERS_JOURNAL_FLUSH_SECONDS = 1.0  # reminder mutations are written to the db in batches with this period
+REMINDERS_JOURNAL_FLUSH_BATCH = 1000  # or when this number of mutations is pending
+STATS_TOP_SIZE = 10  # top followed teams and tournaments shown by /stats
+
+REMINDERS_OUTBOX_FILE = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'reminders_outbox.db')
+REMINDERS_OUTBOX_ACK_BATCH = 500  # delivered reminders are committed in batches of this size (or on sender wake up)
+REMINDERS_OUTBOX_KEEP_SECONDS = 24 * 3600  # sent reminders are kept in the outbox for this time
 
 SETTINGS_STORAGE_FILE = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'settings.db')
+SETTINGS_CACHE_SIZE = 100000  # (chat, setting) pairs cached in memory
+
+DB_EXECUTOR_WORKERS = 4  # threads running storage queries of async handlers, each with its own sqlite connection
 
 ADMIN_USER_ID = int(os.environ['ADMIN_USER_ID'])
 
+SHUTDOWN_TIMEOUT_SECONDS = 30  # time to wait for a running data update on shutdown
+
 LINE_WIDTH = 45
 
+DELIVERY_CONCURRENCY = 8  # maximum number of concurrent send requests
+DELIVERY_GLOBAL_RATE = 30  # messages per second. See https://core.telegram.org/bots/faq#broadcasting-to-users
+DELIVERY_CHAT_INTERVAL_SECONDS = 1.0  # minimal interval between messages to a private chat
+DELIVERY_GROUP_INTERVAL_SECONDS = 3.0  # minimal interval between messages to a group (20 messages per minute)
+DELIVERY_MAX_ATTEMPTS = 5
+DELIVERY_TRACKED_CHATS = 10000  # per chat send times are cleaned up after this number of chats
+DELIVERY_STATS_SAMPLES = 10000  # deliveries kept to compute throughput and latency
+DELIVERY_STATS_WINDOW_SECONDS = 60
+
+WEBHOOK_URL = os.environ.get('TELEGRAM_WEBHOOK_URL')  # the bot uses webhook if it is set, polling otherwise
+WEBHOOK_LISTEN = '0.0.0.0'
+WEBHOOK_PORT = int(os.environ.get('TELEGRAM_WEBHOOK_PORT', 8443))
+WEBHOOK_URL_PATH = '/telegram'
+WEBHOOK_MAX_CONCURRENT_UPDATES = 32  # updates processed concurrently
+WEBHOOK_QUEUE_SIZE = 1000  # received updates waiting for processing. Telegram resends updates rejected when it is full
+WEBHOOK_MAX_BODY_BYTES = 1024 * 1024
+WEBHOOK_READ_TIMEOUT_SECONDS = 10  # a request (headers and body) should be received within this time
+WEBHOOK_KEEP_ALIVE_TIMEOUT_SECONDS = 60  # idle keep-alive connections are closed after this time
+
+MATCHES_PAGE_SIZE = 5  # matches per /matches message page
+MATCHES_PAGES_CACHE_SIZE = 1000  # rendered /matches pages kept in memory
+FOLLOWING_PAGE_SIZE = 8  # reminders per /following message page
+
+CALLBACK_DATA_MAX_BYTES = 64  # telegram limit for inline buttons callback data
+CALLBACK_REGISTRY_VERSIONS = 24  # data versions, which buttons with team and tournament short ids are accepted for
+FOLLOW_TEAMS_PAGE_SIZE = 30
+FOLLOW_TOURNAMENTS_PAGE_SIZE = 10
+
+INLINE_QUERY_RESULTS = 20  # teams, tournaments and matches per inline query answer, telegram accepts up to 50
+INLINE_QUERY_CACHE_SIZE = 10000  # answers cached per (query, lang, data version)
+INLINE_QUERY_CACHE_TIME_SECONDS = 60  # answers are also cached by telegram for this time
+
+LIVE_UPDATES_MAX_MESSAGES_PER_MATCH = 20000  # sent messages per match kept for live score edits
+
+MATCH_CARDS_ENABLED = os.environ.get('TELEGRAM_BOT_MATCH_CARDS', '1') == '1'  # reminders are sent with a match image
+MATCH_CARDS_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'match_cards')
+MATCH_CARDS_RENDER_PROCESSES = 1
+MATCH_CARDS_KEEP_SECONDS = 7 * 24 * 3600  # cards and icons not used for this time are removed from the disk cache
+MATCH_CARDS_FONT = 'DejaVuSans.ttf'  # a truetype font file or a font name found in the system fonts directories
+
 
 CALLBACK_COMMANDS = {
     'follow_all': 'fa',
     'follow_team': 'fte',
     'follow_tournament': 'fto',
+    'follow_team_alphabet': 'fta',
+    'follow_team_bucket': 'ftb',
+    'follow_tournament_page': 'ftp',
     'show_streams': 'ss',
+    'matches_page': 'mp',
     'settings_to_begin': 's tb',
     'settings_close': 's close',
     'settings_to_language': 's tl',
     'settings_change_lang': 's cl',
+    'settings_to_lead_times': 's tlt',
+    'settings_toggle_lead_time': 's lt',
     'remove_team_reminder': 'rter',
-    'remove_tournament_reminder': 'rtor'
+    'remove_tournament_reminder': 'rtor',
+    'following_page': 'fp',
+    'following_remove_team': 'frte',
+    'following_remove_tournament': 'frto',
+    'following_remove_all': 'fral',
+    'following_remove_all_reminders': 'frar'
 }
+
+WORKERS = int(os.environ.get('TELEGRAM_BOT_WORKERS', 1))  # processes handling updates, partitioned by chat
+WORKER_MAX_PENDING_UPDATES = 64  # updates processed concurrently by a worker
+WORKER_SNAPSHOT_CHECK_PERIOD_SECONDS = 1  # how often new matches data is sent to the workers
@@ -0,0 +1,24 @@
+import typing
+import logging
+import peewee
+from playhouse.migrate import SqliteMigrator
+
+
+_logger = logging.getLogger('db_migrations')
+
+
+Migration = typing.Callable[[SqliteMigrator], None]
+
+
+def apply_migrations(db: peewee.SqliteDatabase, migrations: typing.List[Migration]):
+    # db schema version is stored in sqlite user_version pragma. Migration N moves schema from version N to N + 1
+    version = db.pragma('user_version')
+    if version > len(migrations):
+        raise RuntimeError(f'db {db.database} schema version {version} is newer than supported {len(migrations)}')
+
+    migrator = SqliteMigrator(db)
+    for new_version in range(version + 1, len(migrations) + 1):
+        _logger.info(f'migrating db {db.database} to schema version {new_version}')
+        with db.atomic():
+            migrations[new_version - 1](migrator)
+            db.pragma('user_version', new_version)
@@ -0,0 +1,238 @@
+import asyncio
+import collections
+import datetime
+import itertools
+import logging
+import time
+import typing
+import telegram
+import telegram_bot.config as config
+from dataclasses import dataclass, field
+
+
+_logger = logging.getLogger('delivery_queue')
+
+
+SendCallback = typing.Callable[[], typing.Awaitable[typing.Any]]
+FailureCallback = typing.Callable[[], typing.Any]
+
+
+@dataclass()
+class DeliveryStats:
+    sent: int
+    failed: int
+    retried: int
+    queue_depth: int
+    throughput: float  # messages per second over the last DELIVERY_STATS_WINDOW_SECONDS
+    latency_p50: typing.Optional[float]  # seconds from enqueue to delivery
+    latency_p95: typing.Optional[float]
+
+
+@dataclass(eq=False)
+class _Job:
+    chat_id: int
+    send: SendCallback
+    enqueued_at: float
+    on_failure: typing.Optional[FailureCallback]
+    attempts: int = field(default=0)
+
+
+def _seconds(retry_after: typing.Union[int, float, datetime.timedelta]) -> float:
+    if isinstance(retry_after, datetime.timedelta):
+        return retry_after.total_seconds()
+    return float(retry_after)
+
+
+def _is_group(chat_id: int) -> bool:
+    return chat_id < 0  # telegram group and channel ids are negative
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self._rate = rate
+        self._capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self._capacity, self._tokens + (now - self._updated) * self._rate)
+        self._updated = now
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                self._refill(time.monotonic())
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self._rate)
+
+    def drain(self, seconds: float):
+        # no tokens will be available for the given amount of seconds
+        self._refill(time.monotonic())
+        self._tokens = -seconds * self._rate
+
+
+class DeliveryQueue:
+    def __init__(self, concurrency: int = config.DELIVERY_CONCURRENCY,
+                 global_rate: float = config.DELIVERY_GLOBAL_RATE,
+                 chat_interval: float = config.DELIVERY_CHAT_INTERVAL_SECONDS,
+                 group_interval: float = config.DELIVERY_GROUP_INTERVAL_SECONDS,
+                 max_attempts: int = config.DELIVERY_MAX_ATTEMPTS):
+        """
+        Sends telegram messages concurrently while keeping within telegram bot rate limits
+
+        :param concurrency: maximum number of send requests in flight
+        :param global_rate: maximum messages per second for the whole bot
+        :param chat_interval: minimal interval between messages to the same private chat
+        :param group_interval: minimal interval between messages to the same group chat
+        :param max_attempts: a message is dropped after this number of failed attempts
+        """
+        self._concurrency = concurrency
+        self._global_bucket = TokenBucket(global_rate, global_rate)
+        self._chat_interval = chat_interval
+        self._group_interval = group_interval
+        self._max_attempts = max_attempts
+
+        self._queue = asyncio.PriorityQueue()  # jobs enqueued before start are sent once the workers are started
+        self._workers: typing.List[asyncio.Task] = []
+        self._sequence = itertools.count()  # keeps FIFO order for jobs with the same priority
+        self._chat_next_send: typing.Dict[int, float] = dict()
+        self._delayed = 0
+
+        self._sent = 0
+        self._failed = 0
+        self._retried = 0
+        self._delivery_times: typing.Deque[float] = collections.deque(maxlen=config.DELIVERY_STATS_SAMPLES)
+        self._latencies: typing.Deque[float] = collections.deque(maxlen=config.DELIVERY_STATS_SAMPLES)
+
+    def start(self):
+        # should be called from the event loop the messages will be sent from
+        assert len(self._workers) == 0
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self._concurrency)]
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def join(self):
+        while True:
+            await self._queue.join()
+            if self._delayed == 0:
+                return
+            await asyncio.sleep(0.1)
+
+    def enqueue(self, chat_id: int, send: SendCallback, priority: float = 0.0,
+                on_failure: typing.Optional[FailureCallback] = None):
+        """
+        :param chat_id: target chat. Used to keep per chat rate limits
+        :param send: creates a send request coroutine. Called again if the message should be resent
+        :param priority: jobs with lower priority are sent first. Match start timestamp for reminders
+        :param on_failure: called if the message is dropped without being sent
+        """
+        self._put(priority, _Job(chat_id, send, time.monotonic(), on_failure))
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize() + self._delayed
+
+    def stats(self) -> DeliveryStats:
+        now = time.monotonic()
+        window = config.DELIVERY_STATS_WINDOW_SECONDS
+        delivered_recently = sum(1 for t in list(self._delivery_times) if now - t <= window)
+        latencies = sorted(self._latencies)
+
+        def percentile(q):
+            if len(latencies) == 0:
+                return None
+            return latencies[min(int(len(latencies) * q), len(latencies) - 1)]
+
+        return DeliveryStats(
+            sent=self._sent,
+            failed=self._failed,
+            retried=self._retried,
+            queue_depth=self.queue_depth(),
+            throughput=delivered_recently / window,
+            latency_p50=percentile(0.5),
+            latency_p95=percentile(0.95))
+
+    def _put(self, priority: float, job: _Job):
+        self._queue.put_nowait((priority, next(self._sequence), job))
+
+    def _put_later(self, delay: float, priority: float, job: _Job):
+        def put():
+            self._delayed -= 1
+            self._put(priority, job)
+
+        self._delayed += 1
+        asyncio.get_running_loop().call_later(delay, put)
+
+    def _chat_wait(self, chat_id: int, now: float) -> float:
+        next_send = self._chat_next_send.get(chat_id)
+        if next_send is None or next_send <= now:
+            interval = self._group_interval if _is_group(chat_id) else self._chat_interval
+            self._chat_next_send[chat_id] = now + interval
+            if len(self._chat_next_send) > config.DELIVERY_TRACKED_CHATS:
+                self._chat_next_send = {c: t for c, t in self._chat_next_send.items() if t > now}
+            return 0.0
+        return next_send - now
+
+    async def _worker(self):
+        while True:
+            priority, _, job = await self._queue.get()
+            try:
+                await self._process(priority, job)
+            except Exception as e:
+                _logger.error(f'unexpected error while sending message to chat {job.chat_id}', exc_info=e)
+            finally:
+                self._queue.task_done()
+
+    async def _process(self, priority: float, job: _Job):
+        chat_wait = self._chat_wait(job.chat_id, time.monotonic())
+        if chat_wait > 0:
+            self._put_later(chat_wait, priority, job)  # other chats messages are not blocked
+            return
+
+        await self._global_bucket.acquire()
+        job.attempts += 1
+        try:
+            await job.send()
+        except telegram.error.RetryAfter as e:
+            retry_after = _seconds(e.retry_after)
+            _logger.warning(f'flood control exceeded while sending to chat {job.chat_id}, '
+                            f'retrying in {retry_after} seconds')
+            self._global_bucket.drain(retry_after)
+            self._retry(priority, job, retry_after)
+            return
+        except telegram.error.BadRequest as e:
+            _logger.warning(f'bad request while sending message to chat {job.chat_id}', exc_info=e)
+            self._fail(job)
+            return
+        except telegram.error.NetworkError as e:  # BadRequest is a NetworkError too, so it is handled above
+            _logger.warning(f'network error while sending to chat {job.chat_id}', exc_info=e)
+            self._retry(priority, job, 2 ** job.attempts)
+            return
+        except telegram.error.TelegramError as e:
+            _logger.warning(f'failed to send message to chat {job.chat_id}', exc_info=e)
+            self._fail(job)
+            return
+
+        now = time.monotonic()
+        self._sent += 1
+        self._delivery_times.append(now)
+        self._latencies.append(now - job.enqueued_at)
+
+    def _retry(self, priority: float, job: _Job, delay: float):
+        if job.attempts >= self._max_attempts:
+            _logger.warning(f'giving up sending message to chat {job.chat_id} after {job.attempts} attempts')
+            self._fail(job)
+            return
+        self._retried += 1
+        self._put_later(delay, priority, job)
+
+    def _fail(self, job: _Job):
+        self._failed += 1
+        if job.on_failure is not None:
+            job.on_failure()
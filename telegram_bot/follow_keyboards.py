@@ -0,0 +1,140 @@
+import string
+import typing
+import telegram
+import localization
+import matches_data_loader
+import callback_data
+import config
+
+
+_OTHER_BUCKET = '*'
+_DIGITS_BUCKET = '#'
+
+_KeyboardKey = typing.Tuple[int, str, str, int]  # (data version, lang, bucket or tournaments, page)
+
+
+def _bucket(name: str) -> str:
+    first = name[:1].upper()
+    if first in string.ascii_uppercase:
+        return first
+    if first in string.digits:
+        return _DIGITS_BUCKET
+    return _OTHER_BUCKET
+
+
+def _rows(buttons: typing.List[telegram.InlineKeyboardButton], columns: int):
+    return [buttons[begin:begin + columns] for begin in range(0, len(buttons), columns)]
+
+
+class FollowKeyboards:
+    def __init__(self, teams_page_size: int = config.FOLLOW_TEAMS_PAGE_SIZE,
+                 tournaments_page_size: int = config.FOLLOW_TOURNAMENTS_PAGE_SIZE):
+        """
+        Keyboards to select a team or a tournament to follow. Teams are split into alphabet buckets and pages.
+        Keyboards do not depend on the chat, so they are rendered once per (data version, lang, page)
+
+        :param teams_page_size: team buttons per page
+        :param tournaments_page_size: tournament buttons per page
+        """
+        self._teams_page_size = teams_page_size
+        self._tournaments_page_size = tournaments_page_size
+        self._data_version: typing.Optional[int] = None
+        self._buckets: typing.Dict[str, typing.List[str]] = dict()
+        self._tournaments: typing.List[str] = []
+        self._keyboards: typing.Dict[_KeyboardKey, telegram.InlineKeyboardMarkup] = dict()
+
+    def teams_alphabet(self, lang: str) -> telegram.InlineKeyboardMarkup:
+        return self._keyboard(lang, '', 0, self._render_alphabet)
+
+    def teams_page(self, lang: str, bucket: str, page: int) -> telegram.InlineKeyboardMarkup:
+        # bucket and page come from callback data, they are clamped to existing ones so the cache stays bounded
+        self._sync()
+        if bucket not in self._buckets:
+            return self.teams_alphabet(lang)
+        page = self._clamp_page(page, len(self._buckets[bucket]), self._teams_page_size)
+        return self._keyboard(lang, bucket, page, self._render_teams_page)
+
+    def tournaments_page(self, lang: str, page: int) -> telegram.InlineKeyboardMarkup:
+        self._sync()
+        page = self._clamp_page(page, len(self._tournaments), self._tournaments_page_size)
+        return self._keyboard(lang, 'tournaments', page, self._render_tournaments_page)
+
+    def _keyboard(self, lang: str, bucket: str, page: int, render) -> telegram.InlineKeyboardMarkup:
+        self._sync()
+        lang = localization.resolve_locale(lang)
+        key = (self._data_version, lang, bucket, page)
+        keyboard = self._keyboards.get(key)
+        if keyboard is None:
+            keyboard = render(lang, bucket, page)
+            self._keyboards[key] = keyboard
+        return keyboard
+
+    def _sync(self):
+        data_version = callback_data.codec().registry().data_version
+        if data_version != self._data_version:
+            self._reset(data_version)
+
+    def _reset(self, data_version: int):
+        self._data_version = data_version
+        self._keyboards = dict()
+        self._buckets = dict()
+        for name in sorted(matches_data_loader.get_teams().keys(), key=str.lower):
+            self._buckets.setdefault(_bucket(name), []).append(name)
+        self._tournaments = sorted(matches_data_loader.get_tournaments().keys())
+
+    def _render_alphabet(self, lang: str, bucket: str, page: int) -> telegram.InlineKeyboardMarkup:
+        buttons = [telegram.InlineKeyboardButton(
+            bucket, callback_data=f'{config.CALLBACK_COMMANDS["follow_team_bucket"]} 0 {bucket}')
+            for bucket in sorted(self._buckets.keys(), key=lambda b: (b in (_DIGITS_BUCKET, _OTHER_BUCKET), b))]
+        return telegram.InlineKeyboardMarkup(_rows(buttons, 6))
+
+    def _render_teams_page(self, lang: str, bucket: str, page: int) -> telegram.InlineKeyboardMarkup:
+        teams = self._buckets.get(bucket, [])
+        codec = callback_data.codec()
+        buttons = [telegram.InlineKeyboardButton(name, callback_data=codec.encode('follow_team', 'team', name))
+                   for name in self._page(teams, page, self._teams_page_size)]
+
+        def page_data(p):
+            return f'{config.CALLBACK_COMMANDS["follow_team_bucket"]} {p} {bucket}'
+
+        navigation = self._navigation(len(teams), page, self._teams_page_size, page_data)
+        navigation.insert(min(1, len(navigation)), telegram.InlineKeyboardButton(
+            localization.get('settings_back_button', lang),
+            callback_data=config.CALLBACK_COMMANDS['follow_team_alphabet']))
+        return telegram.InlineKeyboardMarkup(_rows(buttons, 3) + [navigation])
+
+    def _render_tournaments_page(self, lang: str, bucket: str, page: int) -> telegram.InlineKeyboardMarkup:
+        codec = callback_data.codec()
+        buttons = [telegram.InlineKeyboardButton(
+            name, callback_data=codec.encode('follow_tournament', 'tournament', name))
+            for name in self._page(self._tournaments, page, self._tournaments_page_size)]
+
+        def page_data(p):
+            return f'{config.CALLBACK_COMMANDS["follow_tournament_page"]} {p}'
+
+        navigation = self._navigation(len(self._tournaments), page, self._tournaments_page_size, page_data)
+        return telegram.InlineKeyboardMarkup(_rows(buttons, 1) + ([navigation] if len(navigation) != 0 else []))
+
+    @staticmethod
+    def _clamp_page(page: int, count: int, page_size: int) -> int:
+        return min(max(page, 0), max(count - 1, 0) // page_size)
+
+    @staticmethod
+    def _page(names: typing.List[str], page: int, page_size: int) -> typing.List[str]:
+        return names[page * page_size:(page + 1) * page_size]
+
+    @staticmethod
+    def _navigation(count: int, page: int, page_size: int, page_data) -> typing.List[telegram.InlineKeyboardButton]:
+        navigation = []
+        if page > 0:
+            navigation.append(telegram.InlineKeyboardButton('◀', callback_data=page_data(page - 1)))
+        if (page + 1) * page_size < count:
+            navigation.append(telegram.InlineKeyboardButton('▶', callback_data=page_data(page + 1)))
+        return navigation
+
+
+_follow_keyboards = FollowKeyboards()
+
+
+def follow_keyboards() -> FollowKeyboards:
+    return _follow_keyboards
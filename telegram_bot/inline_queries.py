@@ -0,0 +1,129 @@
+import collections
+import logging
+import typing
+import telegram
+import localization
+import matches_data_loader
+import match_printing
+import callback_data
+import search_index
+import config
+from dataclasses import dataclass
+
+
+_logger = logging.getLogger('inline_queries')
+
+
+_QueryKey = typing.Tuple[str, str, int]  # (normalized query, lang, data version)
+
+
+@dataclass(eq=False)
+class _Entity:
+    kind: str  # 'team', 'tournament' or 'match'
+    name: str
+    matches: typing.List[matches_data_loader.Dota2Match]  # upcoming matches of the entity
+
+
+def _team_name(team: typing.Optional[matches_data_loader.Dota2Team], lang: str) -> str:
+    return team.name if team is not None else localization.get('tbd_team', lang)
+
+
+def _entities() -> typing.List[_Entity]:
+    matches = matches_data_loader.get_matches()
+    team_matches = collections.defaultdict(list)
+    tournament_matches = collections.defaultdict(list)
+    for match in matches:
+        for team in (match.team1, match.team2):
+            if team is not None:
+                team_matches[team.name].append(match)
+        tournament_matches[match.tournament.name].append(match)
+
+    # teams and tournaments with upcoming matches are shown first
+    teams = sorted(matches_data_loader.get_teams().keys(), key=lambda name: name not in team_matches)
+    tournaments = sorted(matches_data_loader.get_tournaments().keys(), key=lambda name: name not in tournament_matches)
+    return [_Entity('team', name, team_matches.get(name, [])) for name in teams] + \
+        [_Entity('tournament', name, tournament_matches.get(name, [])) for name in tournaments] + \
+        [_Entity('match', ' '.join([team.name for team in (match.team1, match.team2) if team is not None] +
+                                   [match.tournament.name]), [match]) for match in matches]
+
+
+class InlineQueries:
+    def __init__(self, results_limit: int = config.INLINE_QUERY_RESULTS,
+                 cache_size: int = config.INLINE_QUERY_CACHE_SIZE):
+        """
+        Answers inline queries (@bot spirit) with teams, tournaments and upcoming matches. The search index is
+        built once per data version, answers are cached per (query, lang, data version)
+
+        :param results_limit: results per answer, telegram accepts up to 50
+        :param cache_size: maximum number of cached answers
+        """
+        self._results_limit = results_limit
+        self._cache_size = cache_size
+        self._data_version: typing.Optional[int] = None
+        self._index: search_index.SearchIndex[int] = search_index.SearchIndex([])
+        self._entities: typing.List[_Entity] = []
+        self._answers: typing.OrderedDict[_QueryKey, typing.List[telegram.InlineQueryResult]] = \
+            collections.OrderedDict()
+
+    def answer(self, lang: str, query: str) -> typing.List[telegram.InlineQueryResult]:
+        data_version = matches_data_loader.get_data_version()
+        if data_version != self._data_version:
+            self._rebuild(data_version)
+
+        key = (search_index.normalize(query), lang, data_version)
+        results = self._answers.get(key)
+        if results is not None:
+            self._answers.move_to_end(key)
+            return results
+
+        if key[0] == '':
+            # all upcoming matches are shown for an empty query
+            found = [index for index, entity in enumerate(self._entities) if entity.kind == 'match']
+            found = found[:self._results_limit]
+        else:
+            found = self._index.search(key[0], self._results_limit)
+        results = [self._render(index, lang) for index in found]
+        self._answers[key] = results
+        if len(self._answers) > self._cache_size:
+            self._answers.popitem(last=False)
+        return results
+
+    def _rebuild(self, data_version: int):
+        self._data_version = data_version
+        self._answers.clear()
+        self._entities = _entities()
+        self._index = search_index.SearchIndex((entity.name, index) for index, entity in enumerate(self._entities))
+        _logger.info(f'inline search index for data version {data_version} is built, {len(self._index)} entities')
+
+    def _render(self, index: int, lang: str) -> telegram.InlineQueryResult:
+        entity = self._entities[index]
+        if entity.kind == 'match':
+            match = entity.matches[0]
+            return telegram.InlineQueryResultArticle(
+                id=f'{self._data_version}.{index}',
+                title=f'{_team_name(match.team1, lang)} - {_team_name(match.team2, lang)}',
+                description=match.tournament.name,
+                input_message_content=telegram.InputTextMessageContent(
+                    match_printing.render_match_message(lang, match).text, parse_mode='MarkdownV2'))
+
+        # following is added to the private chat with the bot of the user pressing the button. The message stays in
+        # the chat indefinitely, so the button is encoded with a stable token
+        follow_data = callback_data.codec().encode('follow_' + entity.kind, entity.kind, entity.name, stable=True)
+        text = '\n\n'.join([f'*{match_printing.escape(entity.name)}*'] +
+                           [match_printing.render_match_message(lang, match).text
+                            for match in entity.matches[:config.MATCHES_PAGE_SIZE]])
+        return telegram.InlineQueryResultArticle(
+            id=f'{self._data_version}.{index}',
+            title=entity.name,
+            description=f'{localization.get("inline_" + entity.kind, lang)}, '
+                        f'{localization.get("inline_upcoming_matches", lang, count=len(entity.matches))}',
+            input_message_content=telegram.InputTextMessageContent(text, parse_mode='MarkdownV2'),
+            reply_markup=telegram.InlineKeyboardMarkup([[telegram.InlineKeyboardButton(
+                localization.get('inline_follow_button', lang), callback_data=follow_data)]]))
+
+
+_inline_queries = InlineQueries()
+
+
+def inline_queries() -> InlineQueries:
+    return _inline_queries
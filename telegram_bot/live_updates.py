@@ -0,0 +1,141 @@
+import typing
+import logging
+import threading
+import functools
+import telegram
+import matches_data_loader
+import match_printing
+import delivery_queue
+import config
+
+
+_logger = logging.getLogger('live_updates')
+
+
+_EDIT_PRIORITY = float('inf')  # reminders are sent before messages edits
+
+MessageKey = typing.Tuple[int, int]  # (chat id, message id)
+
+
+class SentMatchMessages:
+    def __init__(self, max_messages_per_match: int = config.LIVE_UPDATES_MAX_MESSAGES_PER_MATCH):
+        # sent messages are registered from the bot handlers and the reminders sender threads
+        self._lock = threading.Lock()
+        self._max_messages_per_match = max_messages_per_match
+        self._messages: typing.Dict[int, typing.Dict[MessageKey, str]] = dict()  # match id to message langs
+        self._captioned: typing.Set[MessageKey] = set()  # messages with a match card, the text is their caption
+
+    def register(self, match_id: int, message: telegram.Message, lang: str):
+        with self._lock:
+            match_messages = self._messages.setdefault(match_id, dict())
+            if len(match_messages) >= self._max_messages_per_match:
+                return
+            match_messages[(message.chat_id, message.message_id)] = lang
+            if message.photo:
+                self._captioned.add((message.chat_id, message.message_id))
+
+    def forget(self, match_id: int, key: MessageKey):
+        with self._lock:
+            self._messages.get(match_id, dict()).pop(key, None)
+            self._captioned.discard(key)
+
+    def is_captioned(self, key: MessageKey) -> bool:
+        with self._lock:
+            return key in self._captioned
+
+    def lang(self, match_id: int, key: MessageKey) -> typing.Optional[str]:
+        with self._lock:
+            return self._messages.get(match_id, dict()).get(key)
+
+    def messages(self, match_id: int) -> typing.List[typing.Tuple[MessageKey, str]]:
+        with self._lock:
+            return list(self._messages.get(match_id, dict()).items())
+
+    def retain(self, match_ids: typing.Iterable[int]):
+        # messages about matches, which are not in the data anymore, will not be updated
+        match_ids = set(match_ids)
+        with self._lock:
+            self._messages = {match_id: messages for match_id, messages in self._messages.items()
+                              if match_id in match_ids}
+            self._captioned = {key for messages in self._messages.values() for key in messages.keys()
+                               if key in self._captioned}
+
+
+_sent_messages = SentMatchMessages()
+
+
+def sent_messages() -> SentMatchMessages:
+    return _sent_messages
+
+
+def _live_state(match: matches_data_loader.Dota2Match):
+    return match.score, match.start_time is None, len(match.streams)
+
+
+class LiveUpdater:
+    def __init__(self, bot: telegram.Bot, queue: delivery_queue.DeliveryQueue,
+                 messages: SentMatchMessages = _sent_messages):
+        """
+        Edits sent match messages (reminders) when match score or live status changes. Edits are sent through the
+        delivery queue and coalesced: a message waiting for an edit is edited once with the latest match state
+        """
+        self._bot = bot
+        self._queue = queue
+        self._messages = messages
+        self._matches: typing.Dict[int, matches_data_loader.Dota2Match] = dict()
+        self._states: typing.Dict[int, typing.Any] = dict()
+        self._rendered: typing.Dict[typing.Tuple[int, str], match_printing.RenderedMessage] = dict()
+        self._pending: typing.Dict[MessageKey, int] = dict()  # messages waiting for an edit to match id
+
+    def on_new_data(self, matches: typing.Dict[int, matches_data_loader.Dota2Match]):
+        self._messages.retain(matches.keys())
+        self._matches = matches
+        self._rendered = dict()
+
+        edits = 0
+        for match_id, match in matches.items():
+            state = _live_state(match)
+            old_state = self._states.get(match_id)
+            if old_state is None or old_state == state:
+                continue
+            for key, _ in self._messages.messages(match_id):
+                if key in self._pending:
+                    continue  # the edit is already queued, it will use the latest match state
+                self._pending[key] = match_id
+                self._queue.enqueue(key[0], functools.partial(self._edit, key), priority=_EDIT_PRIORITY,
+                                    on_failure=functools.partial(self._pending.pop, key, None))
+                edits += 1
+        self._states = {match_id: _live_state(match) for match_id, match in matches.items()}
+        if edits != 0:
+            _logger.info(f'{edits} match messages are queued for editing')
+
+    def _render(self, match: matches_data_loader.Dota2Match, lang: str) -> match_printing.RenderedMessage:
+        rendered = self._rendered.get((match.id, lang))
+        if rendered is None:
+            rendered = match_printing.render_match_message(lang, match)
+            self._rendered[(match.id, lang)] = rendered
+        return rendered
+
+    async def _edit(self, key: MessageKey):
+        match_id = self._pending.get(key)
+        match = self._matches.get(match_id)
+        lang = self._messages.lang(match_id, key)
+        if match is None or lang is None:
+            self._pending.pop(key, None)
+            return
+        try:
+            await match_printing.edit_match_message(self._bot, key[0], key[1], self._render(match, lang),
+                                                    caption=self._messages.is_captioned(key))
+        except telegram.error.BadRequest as e:
+            if 'not modified' in e.message:
+                pass
+            elif 'not found' in e.message:
+                self._messages.forget(match_id, key)  # the message was deleted
+            else:
+                raise
+        except telegram.error.TelegramError:
+            raise  # the delivery queue retries the edit or drops it calling on_failure
+        except Exception:
+            self._pending.pop(key, None)
+            raise
+        self._pending.pop(key, None)
@@ -3,8 +3,12 @@ import config
 import sys
 sys.path.append(config.ROOT_DIR)  # tmp solution. TODO change project structure
 
+import asyncio
+import concurrent.futures
 import functools
+import json
 import logging
+import signal
 import typing
 import telegram
 import telegram.ext
@@ -14,6 +18,14 @@ import matches_data_loader
 import reminders_sender
 import match_printing
 import chat_settings
+import matches_pages
+import inline_queries
+import callback_data
+import follow_keyboards
+import callback_router
+import webhook_server
+import async_storage
+import chat_partitioning
 from chat_settings import get_lang
 from config import CALLBACK_COMMANDS
 
@@ -50,6 +62,15 @@ def admin_only_command():
     return wrapper
 
 
+# handlers never query the storages on the event loop thread
+_db_executor = async_storage.DbExecutor()
+_reminders = async_storage.AsyncRemindersStorage(reminders_storage.storage, _db_executor)
+
+
+async def _get_lang(update: telegram.Update) -> str:
+    return await _db_executor.run(get_lang, update)
+
+
 async def start(update: telegram.Update, context: telegram.ext.ContextTypes.DEFAULT_TYPE):
     logging.info(f'start called by {update.effective_user.id}')
     for lang in localization.all_locales():
@@ -58,35 +79,37 @@ async def start(update: telegram.Update, context: telegram.ext.ContextTypes.DEFA
              for command in _ALL_COMMANDS_NO_UTILITY],
             language_code=lang)
     await context.bot.send_message(chat_id=update.effective_chat.id,
-                                   text=localization.get('start_message', get_lang(update)),
+                                   text=localization.get('start_message', await _get_lang(update)),
                                    parse_mode='MarkdownV2')
 
 
-async def _process_remove_reminders_callbacks(
-        update: telegram.Update, context: telegram.ext.ContextTypes.DEFAULT_TYPE) -> bool:
-    rs = reminders_storage.storage()
-    removed = False
-    if update.callback_query.data == 'remove_all_reminders':
-        rs.remove_all_reminders(str(update.effective_chat.id))
-        removed = True
-    elif update.callback_query.data == 'remove_all_reminder':
-        rs.remove_all_reminder(str(update.effective_chat.id))
-        removed = True
-    elif update.callback_query.data.startswith(f'{CALLBACK_COMMANDS["remove_tournament_reminder"]} '):
-        tournament = update.callback_query.data[len(f'{CALLBACK_COMMANDS["remove_tournament_reminder"]} '):]
-        rs.remove_tournament_reminder(str(update.effective_chat.id), tournament)
-        removed = True
-    elif update.callback_query.data.startswith(f'{CALLBACK_COMMANDS["remove_team_reminder"]} '):
-        team = update.callback_query.data[len(f'{CALLBACK_COMMANDS["remove_team_reminder"]} '):]
-        rs.remove_team_reminder(str(update.effective_chat.id), team)
-        removed = True
-
-    if removed:
-        await context.bot.answer_callback_query(
-            callback_query_id=update.callback_query.id,
-            text=localization.get('removed_reminder', get_lang(update)))
-
-    return removed
+_callback_router = callback_router.CallbackRouter(_get_lang)
+
+
+async def _reminders_removed(chat_id: str, type_: str, value: typing.Optional[str]):
+    if type_ == 'all_reminders':
+        await _reminders.remove_all_reminders(chat_id)
+    elif type_ == 'all':
+        await _reminders.remove_all_reminder(chat_id)
+    elif type_ == 'team':
+        await _reminders.remove_team_reminder(chat_id, value)
+    elif type_ == 'tournament':
+        await _reminders.remove_tournament_reminder(chat_id, value)
+
+
+def _add_legacy_remove_route(prefix: str, type_: str):
+    # buttons of per reminder /following messages sent by older versions of the bot
+    async def remove(ctx: callback_router.CallbackContext):
+        await _reminders_removed(ctx.chat_id, type_, ctx.arguments)
+        await ctx.answer(localization.get('removed_reminder', await ctx.lang()))
+
+    _callback_router.add(prefix, remove)
+
+
+_add_legacy_remove_route('remove_all_reminders', 'all_reminders')
+_add_legacy_remove_route('remove_all_reminder', 'all')
+_add_legacy_remove_route(CALLBACK_COMMANDS['remove_team_reminder'], 'team')
+_add_legacy_remove_route(CALLBACK_COMMANDS['remove_tournament_reminder'], 'tournament')
 
 
 def _generate_command_with_options_keyboard(buttons_per_line: int, command: str, options: typing.Dict[str, str]):
@@ -104,187 +127,344 @@ def _generate_command_with_options_keyboard(buttons_per_line: int, command: str,
     return buttons
 
 
-async def _process_follow_callbacks(update: telegram.Update, context: telegram.ext.ContextTypes.DEFAULT_TYPE):
-    rs = reminders_storage.storage()
-    followed = False
-    if update.callback_query.data == CALLBACK_COMMANDS['follow_all']:
-        rs.add_all_reminder(str(update.effective_chat.id))
-        followed = True
-    elif update.callback_query.data == CALLBACK_COMMANDS['follow_team']:
-        await context.bot.answer_callback_query(callback_query_id=update.callback_query.id)
-        await context.bot.send_message(
-            chat_id=update.effective_chat.id,
-            text=localization.get('follow_team_select', get_lang(update)),
-            reply_markup=_inline_keyboard(_generate_command_with_options_keyboard(
-                3, CALLBACK_COMMANDS['follow_team'], matches_data_loader.get_teams())))
-        return True
-    elif update.callback_query.data == CALLBACK_COMMANDS['follow_tournament']:
-        await context.bot.answer_callback_query(callback_query_id=update.callback_query.id)
-        await context.bot.send_message(
-            chat_id=update.effective_chat.id,
-            text=localization.get('follow_tournament_select', get_lang(update)),
-            reply_markup=_inline_keyboard(_generate_command_with_options_keyboard(
-                1, CALLBACK_COMMANDS["follow_tournament"], matches_data_loader.get_tournaments())))
-        return True
-    elif update.callback_query.data.startswith(f'{CALLBACK_COMMANDS["follow_tournament"]} '):
-        tournament = update.callback_query.data[len(f'{CALLBACK_COMMANDS["follow_tournament"]} '):]
-        # TODO check validity?
-        rs.add_tournament_reminder(str(update.effective_chat.id), tournament)
-        followed = True
-    elif update.callback_query.data.startswith(f'{CALLBACK_COMMANDS["follow_team"]} '):
-        team = update.callback_query.data[len(f'{CALLBACK_COMMANDS["follow_team"]} '):]
-        # TODO check validity?
-        rs.add_team_reminder(str(update.effective_chat.id), team)
-        followed = True
-
-    if followed:
-        await context.bot.answer_callback_query(
-            callback_query_id=update.callback_query.id,
-            text=localization.get('added_reminder', get_lang(update)))
-
-    return followed
-
-
-async def _send_settings_begin(update, context, message=None):
-    lang = get_lang(update)
+async def _answer_callback_expired(ctx: callback_router.CallbackContext):
+    # the keyboard was sent before the short ids registry of its data version expired
+    await ctx.answer(localization.get('callback_expired', await ctx.lang()))
+
+
+@_callback_router.route(CALLBACK_COMMANDS['follow_all'])
+async def _follow_all(ctx: callback_router.CallbackContext):
+    await _reminders.add_all_reminder(ctx.chat_id)
+    await ctx.answer(localization.get('added_reminder', await ctx.lang()))
+
+
+@_callback_router.route(CALLBACK_COMMANDS['follow_team'])
+async def _follow_team(ctx: callback_router.CallbackContext):
+    if ctx.arguments == '':
+        await ctx.answer()
+        await ctx.bot.send_message(
+            chat_id=ctx.update.effective_chat.id,
+            text=localization.get('follow_team_select', await ctx.lang()),
+            reply_markup=follow_keyboards.follow_keyboards().teams_alphabet(await ctx.lang()))
+        return
+    team = callback_data.codec().decode(ctx.arguments, 'team')
+    if team is None:
+        return await _answer_callback_expired(ctx)
+    await _reminders.add_team_reminder(ctx.chat_id, team)
+    await ctx.answer(localization.get('added_reminder', await ctx.lang()))
+
+
+@_callback_router.route(CALLBACK_COMMANDS['follow_tournament'])
+async def _follow_tournament(ctx: callback_router.CallbackContext):
+    if ctx.arguments == '':
+        await ctx.answer()
+        await ctx.bot.send_message(
+            chat_id=ctx.update.effective_chat.id,
+            text=localization.get('follow_tournament_select', await ctx.lang()),
+            reply_markup=follow_keyboards.follow_keyboards().tournaments_page(await ctx.lang(), 0))
+        return
+    tournament = callback_data.codec().decode(ctx.arguments, 'tournament')
+    if tournament is None:
+        return await _answer_callback_expired(ctx)
+    await _reminders.add_tournament_reminder(ctx.chat_id, tournament)
+    await ctx.answer(localization.get('added_reminder', await ctx.lang()))
+
+
+@_callback_router.route(CALLBACK_COMMANDS['follow_team_alphabet'])
+async def _follow_team_alphabet(ctx: callback_router.CallbackContext):
+    await ctx.message.edit_reply_markup(follow_keyboards.follow_keyboards().teams_alphabet(await ctx.lang()))
+    await ctx.answer()
+
+
+@_callback_router.route(CALLBACK_COMMANDS['follow_team_bucket'])
+async def _follow_team_bucket(ctx: callback_router.CallbackContext):
+    page, bucket = ctx.arguments.split(' ', 1)
+    await ctx.message.edit_reply_markup(
+        follow_keyboards.follow_keyboards().teams_page(await ctx.lang(), bucket, int(page)))
+    await ctx.answer()
+
+
+@_callback_router.route(CALLBACK_COMMANDS['follow_tournament_page'])
+async def _follow_tournament_page(ctx: callback_router.CallbackContext):
+    await ctx.message.edit_reply_markup(
+        follow_keyboards.follow_keyboards().tournaments_page(await ctx.lang(), int(ctx.arguments)))
+    await ctx.answer()
+
+
+def _settings_begin(lang: str) -> typing.Tuple[str, telegram.InlineKeyboardMarkup]:
     text = localization.get('settings_begin_message', lang)
     markup = _inline_keyboard([[
         (localization.get('settings_close_button', lang), CALLBACK_COMMANDS['settings_close']),
-        (localization.get('settings_language_button', lang), CALLBACK_COMMANDS['settings_to_language'])]])
-    if message is None:
-        await context.bot.send_message(
-            chat_id=update.effective_chat.id,
-            text=text,
-            reply_markup=markup)
-    else:
-        await message.edit_text(text=text, reply_markup=markup)
-
-
-async def _process_settings_callbacks(update: telegram.Update, context: telegram.ext.ContextTypes.DEFAULT_TYPE):
-    if update.callback_query.data == CALLBACK_COMMANDS['settings_to_begin']:
-        await _send_settings_begin(update, context, update.callback_query.message)
-        await context.bot.answer_callback_query(callback_query_id=update.callback_query.id)
-        return True
-    if update.callback_query.data == CALLBACK_COMMANDS['settings_close']:
-        await update.callback_query.message.delete()
-        await context.bot.answer_callback_query(callback_query_id=update.callback_query.id)
-        return True
-    if update.callback_query.data == CALLBACK_COMMANDS['settings_to_language']:
-        markup = _generate_command_with_options_keyboard(
-            5, CALLBACK_COMMANDS['settings_change_lang'], {locale: locale for locale in localization.all_locales()})
-        markup.append([(localization.get('settings_back_button', get_lang(update)),
-                        CALLBACK_COMMANDS['settings_to_begin'])])
-        await update.callback_query.message.edit_text(
-            text=localization.get('settings_language_button', get_lang(update)),
-            reply_markup=_inline_keyboard(markup))
-        await context.bot.answer_callback_query(callback_query_id=update.callback_query.id)
-        return True
-    settings_change_lang_prefix = f'{CALLBACK_COMMANDS["settings_change_lang"]} '
-    if update.callback_query.data.startswith(settings_change_lang_prefix):
-        lang = update.callback_query.data[len(settings_change_lang_prefix):]
-        if lang not in localization.all_locales():
-            logging.warning(f'bad lang value {lang} in change_language')
-            await context.bot.answer_callback_query(callback_query_id=update.callback_query.id)
-            return True
-
-        chat_settings.set_chat_lang(update.effective_chat.id, lang)
-        await _send_settings_begin(update, context, update.callback_query.message)
-        await context.bot.answer_callback_query(
-                callback_query_id=update.callback_query.id,
-                text=localization.get('settings_language_changed', get_lang(update)))
-        return True
-
-    return False
+        (localization.get('settings_language_button', lang), CALLBACK_COMMANDS['settings_to_language']),
+        (localization.get('settings_lead_times_button', lang), CALLBACK_COMMANDS['settings_to_lead_times'])]])
+    return text, markup
+
+
+def _lead_time_text(lead_time: int, lang: str):
+    if lead_time == 0:
+        return localization.get('lead_time_at_start', lang)
+    if lead_time % 3600 == 0:
+        return localization.get('lead_time_hours', lang, count=lead_time // 3600)
+    return localization.get('lead_time_minutes', lang, minutes=lead_time // 60)
+
+
+async def _send_settings_lead_times(ctx: callback_router.CallbackContext):
+    chat_lead_times = await _reminders.get_lead_times(ctx.chat_id)
+    lang = await ctx.lang()
+    markup = [[(('✅ ' if lead_time in chat_lead_times else '') + _lead_time_text(lead_time, lang),
+                f'{CALLBACK_COMMANDS["settings_toggle_lead_time"]} {lead_time}')]
+              for lead_time in config.REMINDER_LEAD_TIMES_SECONDS]
+    markup.append([(localization.get('settings_back_button', lang), CALLBACK_COMMANDS['settings_to_begin'])])
+    await ctx.message.edit_text(
+        text=localization.get('settings_lead_times_message', lang),
+        reply_markup=_inline_keyboard(markup))
+
+
+@_callback_router.route(CALLBACK_COMMANDS['settings_to_begin'])
+async def _settings_to_begin(ctx: callback_router.CallbackContext):
+    text, markup = _settings_begin(await ctx.lang())
+    await ctx.message.edit_text(text=text, reply_markup=markup)
+    await ctx.answer()
+
+
+@_callback_router.route(CALLBACK_COMMANDS['settings_close'])
+async def _settings_close(ctx: callback_router.CallbackContext):
+    await ctx.message.delete()
+    await ctx.answer()
+
+
+@_callback_router.route(CALLBACK_COMMANDS['settings_to_language'])
+async def _settings_to_language(ctx: callback_router.CallbackContext):
+    markup = _generate_command_with_options_keyboard(
+        5, CALLBACK_COMMANDS['settings_change_lang'], {locale: locale for locale in localization.all_locales()})
+    lang = await ctx.lang()
+    markup.append([(localization.get('settings_back_button', lang), CALLBACK_COMMANDS['settings_to_begin'])])
+    await ctx.message.edit_text(
+        text=localization.get('settings_language_button', lang),
+        reply_markup=_inline_keyboard(markup))
+    await ctx.answer()
+
+
+@_callback_router.route(CALLBACK_COMMANDS['settings_to_lead_times'])
+async def _settings_to_lead_times(ctx: callback_router.CallbackContext):
+    await _send_settings_lead_times(ctx)
+    await ctx.answer()
+
+
+@_callback_router.route(CALLBACK_COMMANDS['settings_toggle_lead_time'])
+async def _settings_toggle_lead_time(ctx: callback_router.CallbackContext):
+    lead_time = int(ctx.arguments)
+    if lead_time not in config.REMINDER_LEAD_TIMES_SECONDS:
+        logging.warning(f'bad lead time value {lead_time} in toggle_lead_time')
+        await ctx.answer()
+        return
 
+    lead_times = set(await _reminders.get_lead_times(ctx.chat_id)) ^ {lead_time}
+    if len(lead_times) == 0:
+        await ctx.answer(localization.get('settings_lead_times_empty', await ctx.lang()))
+        return
+    await _reminders.set_lead_times(ctx.chat_id, lead_times)
+    await _send_settings_lead_times(ctx)
+    await ctx.answer()
 
-async def callback_query_handle(update: telegram.Update, context: telegram.ext.ContextTypes.DEFAULT_TYPE) -> None:
-    logging.info(f'callback query {update.callback_query.data} from {update.effective_user.name}')
 
-    if await _process_remove_reminders_callbacks(update, context):
+@_callback_router.route(CALLBACK_COMMANDS['settings_change_lang'])
+async def _settings_change_lang(ctx: callback_router.CallbackContext):
+    lang = ctx.arguments
+    if lang not in localization.all_locales():
+        logging.warning(f'bad lang value {lang} in change_language')
+        await ctx.answer()
         return
-    if await _process_follow_callbacks(update, context):
-        return
-    if await _process_settings_callbacks(update, context):
-        return
-    if update.callback_query.data.startswith(f'{CALLBACK_COMMANDS["show_streams"]} '):
-        match_id = int(update.callback_query.data[len(f'{CALLBACK_COMMANDS["show_streams"]} '):])
-        match = next((m for m in matches_data_loader.get_matches() if m.id == match_id), None)
-        if match is None:
-            await context.bot.answer_callback_query(
-                callback_query_id=update.callback_query.id,
-                text=localization.get('match_not_found', get_lang(update)))
-            return
-        await match_printing.print_match_streams(context.bot, update.effective_chat.id, get_lang(update), match)
+
+    await _db_executor.run(chat_settings.set_chat_lang, ctx.update.effective_chat.id, lang)
+    text, markup = _settings_begin(lang)
+    await ctx.message.edit_text(text=text, reply_markup=markup)
+    await ctx.answer(localization.get('settings_language_changed', lang))
+
+
+@_callback_router.route(CALLBACK_COMMANDS['matches_page'])
+async def _matches_page(ctx: callback_router.CallbackContext):
+    page, filter_ = matches_pages.parse_page_callback_data(ctx.update.callback_query.data)
+    message = matches_pages.matches_pages().get(await ctx.lang(), page, filter_)
+    try:
+        await match_printing.edit_match_message(ctx.bot, ctx.update.effective_chat.id, ctx.message.message_id, message)
+    except telegram.error.BadRequest as e:
+        if 'not modified' not in e.message:
+            raise  # the same page is shown when the button is pressed twice
+    await ctx.answer()
+
+
+@_callback_router.route(CALLBACK_COMMANDS['show_streams'])
+async def _show_streams(ctx: callback_router.CallbackContext):
+    match_id = int(ctx.arguments)
+    match = next((m for m in matches_data_loader.get_matches() if m.id == match_id), None)
+    if match is None:
+        await ctx.answer(localization.get('match_not_found', await ctx.lang()))
         return
+    await match_printing.print_match_streams(ctx.bot, ctx.update.effective_chat.id, await ctx.lang(), match)
 
-    logging.warning(f'unknown callback query {update.callback_query.data}')
+
+async def callback_query_handle(update: telegram.Update, context: telegram.ext.ContextTypes.DEFAULT_TYPE) -> None:
+    logging.info(f'callback query {update.callback_query.data} from {update.effective_user.name}')
+    if not await _callback_router.dispatch(update, context):
+        logging.warning(f'unknown callback query {update.callback_query.data}')
 
 
 async def help_handler(update: telegram.Update, context: telegram.ext.ContextTypes.DEFAULT_TYPE):
     await start(update, context)  # TODO actual help?
 
 
-async def following(update: telegram.Update, context: telegram.ext.ContextTypes.DEFAULT_TYPE):
-    rs = reminders_storage.storage()
-    reminders = rs.get_reminders(str(update.effective_chat.id))
-    if len(reminders) != 0:
-        reply_markup = _inline_keyboard(
-            [[(localization.get('remove_all_reminders', get_lang(update)), 'remove_all_reminders')]])
-    else:
-        reply_markup = None
-    await context.bot.send_message(
-        chat_id=update.effective_chat.id,
-        text=localization.get('reminders_count', get_lang(update), count=len(reminders)),
-        reply_markup=reply_markup)
+_REMINDER_TYPES_ORDER = {'all': 0, 'team': 1, 'tournament': 2}
+
+
+def _following_callback_data(command: str, page: int, value: typing.Optional[str] = None) -> str:
+    return f'{CALLBACK_COMMANDS[command]} {page}' + (f' {value}' if value is not None else '')
 
-    for reminder in reminders:
+
+async def _render_following(chat_id: str, lang: str, page: int) \
+        -> typing.Tuple[str, typing.Optional[telegram.InlineKeyboardMarkup]]:
+    reminders = sorted(await _reminders.get_reminders(chat_id),
+                       key=lambda r: (_REMINDER_TYPES_ORDER[r.type_], r.value or ''))
+    text = localization.get('reminders_count', lang, count=len(reminders))
+    if len(reminders) == 0:
+        return text, None
+
+    page_size = config.FOLLOWING_PAGE_SIZE
+    page_count = (len(reminders) + page_size - 1) // page_size
+    page = min(max(page, 0), page_count - 1)  # the last page may become empty after a removal
+    unfollow = localization.get('remove_reminder', lang)
+    lines = []
+    buttons = []
+    for reminder in reminders[page * page_size:(page + 1) * page_size]:
         if reminder.type_ == 'team':
-            await context.bot.send_message(
-                chat_id=update.effective_chat.id,
-                text=localization.get('following_team', get_lang(update),
-                                      team=reminder.value),
-                reply_markup=_inline_keyboard(
-                    [[(localization.get('remove_reminder', get_lang(update)),
-                       f'{CALLBACK_COMMANDS["remove_team_reminder"]} ' + reminder.value)]]))
+            lines.append(localization.get('following_team', lang, team=reminder.value))
+            buttons.append([(f'{unfollow}: {reminder.value}', _following_callback_data(
+                'following_remove_team', page, callback_data.codec().token('team', reminder.value)))])
         elif reminder.type_ == 'tournament':
-            await context.bot.send_message(
-                chat_id=update.effective_chat.id,
-                text=localization.get('following_tournament', get_lang(update),
-                                      tournament=reminder.value),
-                reply_markup=_inline_keyboard(
-                    [[(localization.get('remove_reminder', get_lang(update)),
-                       f'{CALLBACK_COMMANDS["remove_tournament_reminder"]} ' + reminder.value)]]))
+            lines.append(localization.get('following_tournament', lang, tournament=reminder.value))
+            buttons.append([(f'{unfollow}: {reminder.value}', _following_callback_data(
+                'following_remove_tournament', page,
+                callback_data.codec().token('tournament', reminder.value)))])
         elif reminder.type_ == 'all':
-            await context.bot.send_message(
-                chat_id=update.effective_chat.id,
-                text=localization.get('following_all', get_lang(update)),
-                reply_markup=_inline_keyboard(
-                    [[(localization.get('remove_reminder', get_lang(update)),
-                       'remove_all_reminder')]]))
+            lines.append(localization.get('following_all', lang))
+            buttons.append([(unfollow, _following_callback_data('following_remove_all', page))])
+
+    navigation = []
+    if page > 0:
+        navigation.append(('◀', _following_callback_data('following_page', page - 1)))
+    if page_count > 1:
+        navigation.append((f'{page + 1}/{page_count}', _following_callback_data('following_page', page)))
+    if page + 1 < page_count:
+        navigation.append(('▶', _following_callback_data('following_page', page + 1)))
+    if len(navigation) != 0:
+        buttons.append(navigation)
+    buttons.append([(localization.get('remove_all_reminders', lang),
+                     CALLBACK_COMMANDS['following_remove_all_reminders'])])
+
+    return text + '\n\n' + '\n'.join(lines), _inline_keyboard(buttons)
+
+
+async def _following_remove(ctx: callback_router.CallbackContext, type_: str):
+    page, *value = ctx.arguments.split(' ', 1) if ctx.arguments != '' else ['0']
+    if type_ in ('team', 'tournament'):
+        value = callback_data.codec().decode(value[0], type_)
+        if value is None:
+            return await _answer_callback_expired(ctx)
+        await _reminders_removed(ctx.chat_id, type_, value)
+    else:
+        await _reminders_removed(ctx.chat_id, type_, None)
+    await _edit_following(ctx, int(page))
+    await ctx.answer(localization.get('removed_reminder', await ctx.lang()))
+
+
+async def _edit_following(ctx: callback_router.CallbackContext, page: int):
+    text, reply_markup = await _render_following(ctx.chat_id, await ctx.lang(), page)
+    try:
+        await ctx.message.edit_text(text=text, reply_markup=reply_markup)
+    except telegram.error.BadRequest as e:
+        if 'not modified' not in e.message:
+            raise  # the current page button is pressed
+
+
+@_callback_router.route(CALLBACK_COMMANDS['following_page'])
+async def _following_page(ctx: callback_router.CallbackContext):
+    await _edit_following(ctx, int(ctx.arguments))
+    await ctx.answer()
+
+
+_callback_router.add(CALLBACK_COMMANDS['following_remove_team'], functools.partial(_following_remove, type_='team'))
+_callback_router.add(CALLBACK_COMMANDS['following_remove_tournament'],
+                     functools.partial(_following_remove, type_='tournament'))
+_callback_router.add(CALLBACK_COMMANDS['following_remove_all'], functools.partial(_following_remove, type_='all'))
+_callback_router.add(CALLBACK_COMMANDS['following_remove_all_reminders'],
+                     functools.partial(_following_remove, type_='all_reminders'))
+
+
+async def following(update: telegram.Update, context: telegram.ext.ContextTypes.DEFAULT_TYPE):
+    text, reply_markup = await _render_following(str(update.effective_chat.id), await _get_lang(update), 0)
+    await context.bot.send_message(
+        chat_id=update.effective_chat.id,
+        text=text,
+        reply_markup=reply_markup)
 
 
 async def follow(update: telegram.Update, context: telegram.ext.ContextTypes.DEFAULT_TYPE):
+    lang = await _get_lang(update)
     await context.bot.send_message(
         chat_id=update.effective_chat.id,
-        text=localization.get('follow_message', get_lang(update)),
+        text=localization.get('follow_message', lang),
         reply_markup=_inline_keyboard(
-            [[(localization.get('follow_all', get_lang(update)), CALLBACK_COMMANDS['follow_all']),
-              (localization.get('follow_team', get_lang(update)), CALLBACK_COMMANDS['follow_team']),
-              (localization.get('follow_tournament', get_lang(update)), CALLBACK_COMMANDS['follow_tournament'])]]))
+            [[(localization.get('follow_all', lang), CALLBACK_COMMANDS['follow_all']),
+              (localization.get('follow_team', lang), CALLBACK_COMMANDS['follow_team']),
+              (localization.get('follow_tournament', lang), CALLBACK_COMMANDS['follow_tournament'])]]))
 
 
 async def settings(update: telegram.Update, context: telegram.ext.ContextTypes.DEFAULT_TYPE):
-    await _send_settings_begin(update, context)
+    text, markup = _settings_begin(await _get_lang(update))
+    await context.bot.send_message(
+        chat_id=update.effective_chat.id,
+        text=text,
+        reply_markup=markup)
 
 
 async def matches(update: telegram.Update, context: telegram.ext.ContextTypes.DEFAULT_TYPE):
-    for match in matches_data_loader.get_matches():
-        await match_printing.print_match_message(context.bot, update.effective_chat.id, get_lang(update), match)
+    filter_ = matches_pages.normalize_filter(' '.join(context.args or []))
+    message = matches_pages.matches_pages().get(await _get_lang(update), 0, filter_)
+    # a page lists several matches, so it is not registered for live edits, which render a single match.
+    # Pages are rendered from the latest data when they are switched
+    await match_printing.send_match_message(context.bot, update.effective_chat.id, message)
+
+
+async def inline_query(update: telegram.Update, context: telegram.ext.ContextTypes.DEFAULT_TYPE):
+    results = inline_queries.inline_queries().answer(await _get_lang(update), update.inline_query.query)
+    await update.inline_query.answer(results, cache_time=config.INLINE_QUERY_CACHE_TIME_SECONDS, is_personal=True)
+
+
+def _delivery_stats_message(sender: typing.Optional[reminders_sender.RemindersSender]):
+    def latency_str(latency):
+        return 'n/a' if latency is None else f'{latency:.1f}s'
+
+    if sender is None:
+        return 'Reminders delivery: reminders are sent by another worker'
+    delivery_stats = sender.delivery_stats()
+    return f'Reminders delivery: {delivery_stats.sent} sent, {delivery_stats.failed} failed, ' \
+           f'{delivery_stats.retried} retried, {delivery_stats.queue_depth} queued. ' \
+           f'Throughput {delivery_stats.throughput:.1f} msg/s, ' \
+           f'latency p50 {latency_str(delivery_stats.latency_p50)}, p95 {latency_str(delivery_stats.latency_p95)}'
+
+
+def _callback_stats_message(routes_stats: typing.Dict[str, callback_router.RouteStats]):
+    lines = [f'{prefix}: {route_stats.calls} calls, {route_stats.errors} errors, '
+             f'avg {route_stats.total_seconds / route_stats.calls * 1000:.1f}ms, '
+             f'max {route_stats.max_seconds * 1000:.1f}ms'
+             for prefix, route_stats in sorted(routes_stats.items(), key=lambda item: -item[1].total_seconds)
+             if route_stats.calls != 0]
+    return 'Callback queries:\n' + ('\n'.join(lines) if len(lines) != 0 else 'none')
 
 
 @admin_only_command()
 async def stats(update: telegram.Update, context: telegram.ext.ContextTypes.DEFAULT_TYPE):
-    rs_stats = reminders_storage.storage().get_stats()
+    rs_stats = await _reminders.get_stats()
     top_teams = '\n'.join([f'{idx + 1}) {name_count[1]}\t- {name_count[0]}'
                            for idx, name_count in enumerate(rs_stats.top_followed_teams)])
     top_tournaments = '\n'.join([f'{idx + 1}) {name_count[1]}\t- {name_count[0]}'
@@ -294,32 +474,74 @@ async def stats(update: telegram.Update, context: telegram.ext.ContextTypes.DEFA
               f'There are {rs_stats.unique_chats} unique chats, where reminders were set, ' \
               f'with {rs_stats.active_all_reminders} active all reminders, {rs_stats.active_team_reminders} active ' \
               f'team reminders and {rs_stats.active_tournament_reminders} active tournament reminders.\n\n' \
-              f'Top followed teams:\n{top_teams}\n\nTop followed tournaments:\n{top_tournaments}'
+              f'Top followed teams:\n{top_teams}\n\nTop followed tournaments:\n{top_tournaments}\n\n' \
+              f'{_delivery_stats_message(context.bot_data.get("reminders_sender"))}\n\n' \
+              f'{_callback_stats_message(_callback_router.stats())}'
     await context.bot.send_message(
         chat_id=update.effective_chat.id,
         text=message)
 
 
-def main():
-    logging.basicConfig(
-        filename=config.LOG_FILE,
-        format='%(asctime)s - %(levelname)s - %(name)s - %(message)s',
-        level=logging.INFO
-    )
-
-    logging.info('initializing data loader')
-    matches_data_loader.initialize()
-
-    logging.info('initializing reminders storage')
-    reminders_storage.initialize()
-
+def _start_reminders_sender(application: telegram.ext.Application, shared_storages: bool = False):
     logging.info('initializing RemindersSender')
-    reminders_sender_ = reminders_sender.RemindersSender()
+    reminders_sender_ = reminders_sender.RemindersSender(application.bot, _db_executor, shared_storages=shared_storages)
     reminders_sender_.start()
-
-    logging.info('starting bot')
-    application = telegram.ext.ApplicationBuilder().token(config.bot_token()).build()
-
+    application.bot_data['reminders_sender'] = reminders_sender_
+
+
+async def _start_background_tasks(application: telegram.ext.Application):
+    # data loading and reminders run on the application event loop, blocking work is done by explicit executors
+    data_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix='data_loader')
+    application.bot_data['executors'] = [data_executor, _db_executor]
+
+    logging.info('starting data loader')
+    application.bot_data['data_loader_task'] = asyncio.create_task(matches_data_loader.run_updates(data_executor))
+    _start_reminders_sender(application)
+
+
+async def _stop_background_tasks(application: telegram.ext.Application):
+    # reminders are stopped first: the sender flushes delivery acknowledgements using the db executor
+    if 'reminders_sender' in application.bot_data:
+        await application.bot_data['reminders_sender'].stop()
+    reminders_storage.close()  # pending reminder mutations are written to the db
+
+    if 'data_loader_task' in application.bot_data:
+        matches_data_loader.stop()
+        try:
+            await asyncio.wait_for(application.bot_data['data_loader_task'], config.SHUTDOWN_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            logging.warning('data loader update was interrupted on shutdown')
+
+    for executor in application.bot_data['executors']:
+        executor.shutdown(wait=False, cancel_futures=True)
+    logging.info('background tasks are stopped')
+
+
+async def _run_webhook(application: telegram.ext.Application):
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for stop_signal in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(stop_signal, stop_event.set)
+
+    server = webhook_server.WebhookServer(application, config.webhook_secret_token())
+    async with application:
+        await application.start()
+        await application.post_init(application)
+        await server.start()
+        await application.bot.set_webhook(
+            config.WEBHOOK_URL,
+            secret_token=config.webhook_secret_token(),
+            max_connections=config.WEBHOOK_MAX_CONCURRENT_UPDATES,
+            allowed_updates=telegram.Update.ALL_TYPES)
+        logging.info(f'webhook is set to {config.WEBHOOK_URL}')
+        await stop_event.wait()
+        logging.info('stopping webhook server')
+        await server.stop()
+        await application.stop()
+        await application.post_stop(application)
+
+
+def _add_handlers(application: telegram.ext.Application):
     application.add_handler(telegram.ext.CallbackQueryHandler(callback_query_handle))
     application.add_handler(telegram.ext.CommandHandler(_checked_command('start'), start))
     application.add_handler(telegram.ext.CommandHandler(_checked_command('help'), help_handler))
@@ -328,8 +550,111 @@ def main():
     application.add_handler(telegram.ext.CommandHandler(_checked_command('settings'), settings))
     application.add_handler(telegram.ext.CommandHandler(_checked_command('matches'), matches))
     application.add_handler(telegram.ext.CommandHandler(_checked_command('stats'), stats))
+    application.add_handler(telegram.ext.InlineQueryHandler(inline_query))
 
-    application.run_polling()
+
+def _setup_logging():
+    logging.basicConfig(
+        filename=config.LOG_FILE,
+        format='%(asctime)s - %(levelname)s - %(processName)s - %(name)s - %(message)s',
+        level=logging.INFO
+    )
+
+
+async def _serve_worker(application: telegram.ext.Application, queue, run_sender: bool):
+    async def process_update(payload: str):
+        await application.process_update(telegram.Update.de_json(json.loads(payload), application.bot))
+
+    def on_message(message):
+        data_version, data = message
+        matches_data_loader.set_snapshot(data_version, data)
+
+    async with application:
+        await application.start()
+        application.bot_data['executors'] = [_db_executor]
+        if run_sender:
+            _start_reminders_sender(application, shared_storages=True)
+        await chat_partitioning.serve_queue(queue, process_update, on_message, config.WORKER_MAX_PENDING_UPDATES)
+        await application.stop()
+        await _stop_background_tasks(application)
+
+
+def _worker_main(index: int, queue):
+    # worker process of the supervisor mode. The first worker sends reminders
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # workers are stopped by the supervisor
+    _setup_logging()
+    matches_data_loader.initialize_replica()
+    reminders_storage.initialize(journal_file=f'{config.REMINDERS_JOURNAL_FILE}.{index}')
+
+    application = telegram.ext.ApplicationBuilder().token(config.bot_token()).updater(None).build()
+    _add_handlers(application)
+    asyncio.run(_serve_worker(application, queue, run_sender=index == 0))
+
+
+async def _route_update(update: telegram.Update, context: telegram.ext.ContextTypes.DEFAULT_TYPE):
+    context.bot_data['worker_pool'].route(chat_partitioning.update_chat_key(update), update.to_json())
+
+
+async def _publish_snapshots(pool: chat_partitioning.WorkerPool):
+    published_version = 0
+    while True:
+        data_version, data = matches_data_loader.get_snapshot()
+        if data_version != published_version:
+            pool.broadcast((data_version, data))
+            published_version = data_version
+        await asyncio.sleep(config.WORKER_SNAPSHOT_CHECK_PERIOD_SECONDS)
+
+
+async def _start_supervisor(application: telegram.ext.Application):
+    # the supervisor only receives updates and loads matches data, updates are handled by the workers
+    pool = chat_partitioning.WorkerPool(config.WORKERS, _worker_main)
+    pool.start()
+    application.bot_data['worker_pool'] = pool
+
+    data_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix='data_loader')
+    application.bot_data['executors'] = [data_executor]
+    application.bot_data['data_loader_task'] = asyncio.create_task(matches_data_loader.run_updates(data_executor))
+    application.bot_data['snapshots_task'] = asyncio.create_task(_publish_snapshots(pool))
+
+
+async def _stop_supervisor(application: telegram.ext.Application):
+    application.bot_data['snapshots_task'].cancel()
+    await asyncio.get_running_loop().run_in_executor(
+        None, application.bot_data['worker_pool'].stop, config.SHUTDOWN_TIMEOUT_SECONDS)
+    await _stop_background_tasks(application)
+
+
+def main():
+    _setup_logging()
+
+    if config.WORKERS > 1:
+        logging.info(f'starting supervisor with {config.WORKERS} workers')
+        matches_data_loader.initialize(start_thread=False)
+        application = telegram.ext.ApplicationBuilder() \
+            .token(config.bot_token()) \
+            .post_init(_start_supervisor) \
+            .post_stop(_stop_supervisor) \
+            .build()
+        application.add_handler(telegram.ext.TypeHandler(telegram.Update, _route_update))
+    else:
+        logging.info('initializing data loader')
+        matches_data_loader.initialize(start_thread=False)
+
+        logging.info('initializing reminders storage')
+        reminders_storage.initialize()
+
+        logging.info('starting bot')
+        application = telegram.ext.ApplicationBuilder() \
+            .token(config.bot_token()) \
+            .post_init(_start_background_tasks) \
+            .post_stop(_stop_background_tasks) \
+            .build()
+        _add_handlers(application)
+
+    if config.WEBHOOK_URL is None:
+        application.run_polling()
+    else:
+        asyncio.run(_run_webhook(application))
 
 
 if __name__ == '__main__':
@@ -0,0 +1,311 @@
+import asyncio
+import concurrent.futures
+import datetime
+import hashlib
+import io
+import logging
+import multiprocessing
+import os
+import time
+import typing
+from dataclasses import dataclass
+import telegram
+import localization
+import matches_data_loader
+import telegram_bot.config as config
+
+
+_logger = logging.getLogger('match_cards')
+
+
+CardKey = typing.Tuple[typing.Optional[str], typing.Optional[str], str, int, str]
+
+_CARD_SIZE = (960, 540)
+_ICON_SIZE = 200
+_TOURNAMENT_ICON_SIZE = 64
+_BACKGROUND = (24, 27, 33)
+_TEXT = (236, 239, 244)
+_SECONDARY_TEXT = (160, 168, 180)
+_ICON_PLACEHOLDER = (48, 54, 64)
+
+
+def card_key(match: matches_data_loader.Dota2Match, lang: str) -> CardKey:
+    # langs with the same phrases share a card
+    return (match.team1.liquipedia_page if match.team1 is not None else None,
+            match.team2.liquipedia_page if match.team2 is not None else None,
+            match.tournament.liquipedia_page,
+            int(match.start_time.timestamp()),
+            localization.resolve_locale(lang))
+
+
+def _file_name(key: typing.Any) -> str:
+    return hashlib.sha1(repr(key).encode()).hexdigest()
+
+
+@dataclass(eq=False)
+class CardContent:
+    team1: str
+    team2: str
+    tournament: str
+    start_time: str
+    team1_icon: typing.Optional[bytes]
+    team2_icon: typing.Optional[bytes]
+    tournament_icon: typing.Optional[bytes]
+
+
+def _font(size: int):
+    from PIL import ImageFont
+    try:
+        return ImageFont.truetype(config.MATCH_CARDS_FONT, size)
+    except OSError:
+        return ImageFont.load_default(size)
+
+
+def _paste_icon(card, icon: typing.Optional[bytes], center: typing.Tuple[int, int], size: int):
+    from PIL import Image, ImageDraw, ImageOps
+    box = (center[0] - size // 2, center[1] - size // 2, center[0] + size // 2, center[1] + size // 2)
+    if icon is not None:
+        try:
+            # liquipedia icons are small thumbnails, so they are scaled up as well
+            image = ImageOps.contain(Image.open(io.BytesIO(icon)).convert('RGBA'), (size, size))
+            card.paste(image, (center[0] - image.width // 2, center[1] - image.height // 2), image)
+            return
+        except Exception as e:
+            _logger.warning('failed to decode icon', exc_info=e)
+    ImageDraw.Draw(card).rounded_rectangle(box, radius=size // 8, fill=_ICON_PLACEHOLDER)
+
+
+def _fit_text(draw, text: str, font, width: int) -> str:
+    if draw.textlength(text, font=font) <= width:
+        return text
+    while len(text) > 1 and draw.textlength(text + '…', font=font) > width:
+        text = text[:-1]
+    return text + '…'
+
+
+def render_card(content: CardContent, file: str):
+    """
+    Draws the card to a png file. Runs in a render process, so Pillow is only imported there
+    """
+    from PIL import Image, ImageDraw
+    card = Image.new('RGB', _CARD_SIZE, _BACKGROUND)
+    draw = ImageDraw.Draw(card)
+    width, height = _CARD_SIZE
+    name_font, title_font, vs_font = _font(36), _font(30), _font(56)
+
+    _paste_icon(card, content.tournament_icon, (width // 2, 60), _TOURNAMENT_ICON_SIZE)
+    draw.text((width // 2, 120), _fit_text(draw, content.tournament, title_font, width - 80),
+              font=title_font, fill=_SECONDARY_TEXT, anchor='mt')
+
+    teams_y = 270
+    for name, icon, x in [(content.team1, content.team1_icon, width // 4),
+                          (content.team2, content.team2_icon, width * 3 // 4)]:
+        _paste_icon(card, icon, (x, teams_y), _ICON_SIZE)
+        draw.text((x, teams_y + _ICON_SIZE // 2 + 20), _fit_text(draw, name, name_font, width // 2 - 40),
+                  font=name_font, fill=_TEXT, anchor='mt')
+    draw.text((width // 2, teams_y), 'vs', font=vs_font, fill=_SECONDARY_TEXT, anchor='mm')
+
+    draw.text((width // 2, height - 40), content.start_time, font=title_font, fill=_TEXT, anchor='mb')
+
+    temp_file = file + '.tmp'
+    card.save(temp_file, format='PNG', optimize=True)
+    os.replace(temp_file, file)
+
+
+class MatchCards:
+    def __init__(self, cards_dir: str = config.MATCH_CARDS_DIR,
+                 render_processes: int = config.MATCH_CARDS_RENDER_PROCESSES,
+                 get_icon: typing.Callable[[str], bytes] = matches_data_loader.get_icon,
+                 keep_seconds: float = config.MATCH_CARDS_KEEP_SECONDS):
+        """
+        Match images sent with reminders. Cards are rendered in background by a process pool and cached on disk,
+        telegram file ids of uploaded cards are cached too, so a card is uploaded once for all the chats.
+        Should be used from an event loop
+
+        :param get_icon: blocking icon download, icons are cached on disk as well
+        """
+        self._cards_dir = cards_dir
+        self._icons_dir = os.path.join(cards_dir, 'icons')
+        self._render_processes = render_processes
+        self._get_icon = get_icon
+        self._keep_seconds = keep_seconds
+        self._io_executor: typing.Optional[concurrent.futures.ThreadPoolExecutor] = None
+        self._download_executor: typing.Optional[concurrent.futures.ThreadPoolExecutor] = None
+        self._render_executor: typing.Optional[concurrent.futures.ProcessPoolExecutor] = None
+        self._ready: typing.Set[CardKey] = set()
+        self._preparing: typing.Dict[CardKey, asyncio.Task] = dict()
+        self._file_ids: typing.Dict[CardKey, str] = dict()
+        self._uploads: typing.Dict[CardKey, asyncio.Future] = dict()
+
+    def start(self):
+        os.makedirs(self._icons_dir, exist_ok=True)
+        # card files are read and written apart from icon downloads, which wait for the liquipedia rate limits
+        self._io_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix='match_cards')
+        # icons are downloaded one by one, liquipedia requests are rate limited anyway
+        self._download_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1,
+                                                                        thread_name_prefix='match_cards_download')
+        self._render_executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=self._render_processes, mp_context=multiprocessing.get_context('spawn'))
+
+    async def stop(self):
+        for task in list(self._preparing.values()):
+            task.cancel()
+        if len(self._preparing) != 0:
+            await asyncio.wait(list(self._preparing.values()))
+        self._render_executor.shutdown(wait=True, cancel_futures=True)
+        self._download_executor.shutdown(wait=True, cancel_futures=True)
+        self._io_executor.shutdown(wait=True, cancel_futures=True)
+
+    def prepare(self, match: matches_data_loader.Dota2Match, lang: str):
+        # starts rendering the card in background if it is not ready
+        if match.start_time is None:
+            return
+        key = card_key(match, lang)
+        if key in self._ready or key in self._preparing:
+            return
+        task = asyncio.create_task(self._prepare(key, match))
+        self._preparing[key] = task
+        task.add_done_callback(lambda _: self._preparing.pop(key, None))
+
+    def ready_card(self, match: matches_data_loader.Dota2Match, lang: str) -> typing.Optional[CardKey]:
+        # reminders are not delayed by rendering, a card is prepared for the next ones if it is not ready
+        if match.start_time is None:
+            return None
+        key = card_key(match, lang)
+        if key in self._ready:
+            return key
+        self.prepare(match, lang)
+        return None
+
+    async def send(self, bot: telegram.Bot, chat_id: int, card: CardKey, text: str,
+                   reply_markup: typing.Optional[telegram.InlineKeyboardMarkup]) -> typing.Optional[telegram.Message]:
+        """
+        Sends the card with the text as a caption. None is returned if the card is not available anymore
+        """
+        while True:
+            file_id = self._file_ids.get(card)
+            if file_id is not None:
+                return await self._send_photo(bot, chat_id, file_id, text, reply_markup)
+            upload = self._uploads.get(card)
+            if upload is None:
+                break
+            await asyncio.wait([upload])  # the first upload is waited for, to use its file id
+
+        loop = asyncio.get_running_loop()
+        upload = loop.create_future()
+        self._uploads[card] = upload
+        try:
+            try:
+                photo = await loop.run_in_executor(self._io_executor, self._read_card, card)
+            except FileNotFoundError:
+                self._ready.discard(card)  # removed by cleanup
+                return None
+            sent = await self._send_photo(bot, chat_id, telegram.InputFile(photo, filename='match.png'),
+                                          text, reply_markup)
+            self._file_ids[card] = sent.photo[-1].file_id
+            await loop.run_in_executor(self._io_executor, self._write_file_id, card, self._file_ids[card])
+            return sent
+        finally:
+            del self._uploads[card]
+            upload.set_result(None)
+
+    async def cleanup(self):
+        # cached cards and icons which were not used for keep_seconds are removed
+        removed = await asyncio.get_running_loop().run_in_executor(self._io_executor, self._remove_expired)
+        self._ready = {key for key in self._ready if self._card_file(key) not in removed}
+        self._file_ids = {key: file_id for key, file_id in self._file_ids.items() if key in self._ready}
+        if len(removed) != 0:
+            _logger.info(f'{len(removed)} cached match cards and icons removed')
+
+    def _remove_expired(self) -> typing.Set[str]:
+        expire_time = time.time() - self._keep_seconds
+        removed = set()
+        for directory in [self._cards_dir, self._icons_dir]:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.name.endswith('.file_id') or not entry.is_file():
+                        continue  # file ids are removed with their cards
+                    if entry.stat().st_mtime < expire_time:
+                        os.remove(entry.path)
+                        if os.path.exists(entry.path + '.file_id'):
+                            os.remove(entry.path + '.file_id')
+                        removed.add(entry.path)
+        return removed
+
+    @staticmethod
+    async def _send_photo(bot: telegram.Bot, chat_id: int, photo, text: str,
+                          reply_markup: typing.Optional[telegram.InlineKeyboardMarkup]) -> telegram.Message:
+        return await bot.send_photo(chat_id=chat_id, photo=photo, caption=text, reply_markup=reply_markup,
+                                    parse_mode='MarkdownV2')
+
+    def _card_file(self, key: CardKey) -> str:
+        return os.path.join(self._cards_dir, _file_name(key) + '.png')
+
+    def _read_card(self, key: CardKey) -> bytes:
+        with open(self._card_file(key), 'rb') as f:
+            return f.read()
+
+    def _write_file_id(self, key: CardKey, file_id: str):
+        with open(self._card_file(key) + '.file_id', 'w') as f:
+            f.write(file_id)
+
+    async def _prepare(self, key: CardKey, match: matches_data_loader.Dota2Match):
+        loop = asyncio.get_running_loop()
+        file = self._card_file(key)
+        try:
+            file_id = await loop.run_in_executor(self._io_executor, self._load_cached, file)
+            if file_id is None:
+                content = await loop.run_in_executor(self._download_executor, self._card_content, match, key[-1])
+                await loop.run_in_executor(self._render_executor, render_card, content, file)
+                _logger.info(f'match card {key} rendered')
+            elif file_id != '':
+                self._file_ids[key] = file_id
+            self._ready.add(key)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            _logger.error(f'failed to prepare match card {key}', exc_info=e)
+
+    @staticmethod
+    def _load_cached(file: str) -> typing.Optional[str]:
+        # None if the card is not rendered, its file id otherwise. The file id is empty if it was not uploaded
+        if not os.path.exists(file):
+            return None
+        os.utime(file)  # cleanup removes cards which are not used
+        try:
+            with open(file + '.file_id') as f:
+                return f.read().strip()
+        except FileNotFoundError:
+            return ''
+
+    def _card_content(self, match: matches_data_loader.Dota2Match, lang: str) -> CardContent:
+        def team_name(team: typing.Optional[matches_data_loader.Dota2Team]) -> str:
+            return team.name if team is not None else localization.get('tbd_team', lang)
+
+        start_time = match.start_time.astimezone(datetime.timezone.utc).strftime('%H:%M, %d.%m')
+        return CardContent(team_name(match.team1), team_name(match.team2), match.tournament.name,
+                           localization.get('match_card_start_time', lang, time=start_time),
+                           self._icon(match.team1.icon if match.team1 is not None else None),
+                           self._icon(match.team2.icon if match.team2 is not None else None),
+                           self._icon(match.tournament.icon))
+
+    def _icon(self, icon_path: typing.Optional[str]) -> typing.Optional[bytes]:
+        if not icon_path or not icon_path.startswith('/'):
+            return None
+        file = os.path.join(self._icons_dir, _file_name(icon_path))
+        try:
+            with open(file, 'rb') as f:
+                icon = f.read()
+            os.utime(file)
+            return icon
+        except FileNotFoundError:
+            pass
+        try:
+            icon = self._get_icon(icon_path)
+        except Exception as e:
+            _logger.warning(f'failed to load icon {icon_path}', exc_info=e)
+            return None
+        with open(file + '.tmp', 'wb') as f:
+            f.write(icon)
+        os.replace(file + '.tmp', file)
+        return icon
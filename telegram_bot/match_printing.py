@@ -3,47 +3,39 @@ import matches_data_loader
 import localization
 import typing
 import datetime
+import functools
 import logging
 import re
-import config
+import telegram_bot.config as config
+from dataclasses import dataclass
 
 
 _logger = logging.getLogger('match_printing')
 
 
-def _escape(s: str):
-    # TODO better impl
-    chars = ['_', '*', '[', ']', '(', ')', '~', '`', '>', '#', '+', '-', '=', '|', '{', '}', '.', '!']
-    for c in chars:
-        s = s.replace(c, '\\' + c)
-    return s
+def escape(s: str) -> str:
+    return localization.escape_markdown(s)
 
 
-def _get_tier_text(tournament, lang):
-    if tournament.tier is None:
+_TIER_KEYS = ['tier_1_tournament', 'tier_2_tournament', 'tier_3_tournament', 'tier_4_tournament']
+
+
+@functools.lru_cache(maxsize=1024)
+def _get_tier_text(tier: typing.Optional[str], lang: str) -> str:
+    # there are a few tiers and langs, so a bad tier is logged once
+    if tier is None:
         return ''
-    try:
-        m = re.match(r'Tier (\d+)', tournament.tier)
-        if m is None:
-            raise ValueError()
-        tier = int(m.group(1))
-        if not (1 <= tier <= 4):
-            raise ValueError()
-    except ValueError:
-        _logger.warning(f'bad tournament tier: {tournament.tier}')
+    m = re.match(r'Tier (\d+)', tier)
+    if m is None or not (1 <= int(m.group(1)) <= len(_TIER_KEYS)):
+        _logger.warning(f'bad tournament tier: {tier}')
         return ''
-    tier = [localization.get('tier_1_tournament', lang),
-            localization.get('tier_2_tournament', lang),
-            localization.get('tier_3_tournament', lang),
-            localization.get('tier_4_tournament', lang)][tier - 1]
-
-    return ', ' + tier
+    return ', ' + localization.get(_TIER_KEYS[int(m.group(1)) - 1], lang)
 
 
 def _team_name(team: matches_data_loader.Dota2Team, lang: str):
     if team is None:
         return localization.get('tbd_team', lang)
-    return f'*{_escape(team.name)}*'
+    return f'*{escape(team.name)}*'
 
 
 def _score_str(score: typing.Tuple[int, int]):
@@ -58,45 +50,43 @@ def _team_vs_team_string(match: matches_data_loader.Dota2Match, lang: str) -> st
     return f'{_team_name(match.team1, lang)} {score_or_vs} {_team_name(match.team2, lang)}'
 
 
-def _match_message(lang: str, match: matches_data_loader.Dota2Match) -> str:
-
-    def start_time_str(start_time: typing.Optional[datetime.datetime]):
-        is_live = match.start_time is None
-        if is_live:
-            return localization.get('match_live', lang)
-
-        now = datetime.datetime.now(tz=datetime.timezone.utc)
-        if now > start_time:
-            minutes_after_start = ((now - start_time).seconds // 60)
-            return localization.get('match_live_with_duration', lang, minutes=minutes_after_start)
-        else:
-            minutes_before_start = (start_time - now).seconds // 60
-            if minutes_before_start < 60:
-                return _escape(localization.get('match_starts_soon', lang, minutes=minutes_before_start))
-            else:
-                hours_before_start = minutes_before_start // 60
-                minutes_before_start = minutes_before_start % 60
-                return _escape(localization.get('match_starts_in', lang,
-                                                minutes=minutes_before_start,
-                                                hours=hours_before_start))
-
-    start_time = start_time_str(match.start_time)
-
-    tournament_str = _escape(localization.get('tournament_in_match', lang, name=match.tournament.name))
-    tournament_str += _get_tier_text(match.tournament, lang)
-
-    format_str = (' \\(%s\\)' % _escape(match.format)) if match.format is not None else ''
-
-    team_vs_team = _team_vs_team_string(match, lang) + format_str
-    match_prefix = localization.get('match_prefix', lang) + ' '
-    if len(team_vs_team) <= config.LINE_WIDTH < len(team_vs_team) + len(match_prefix):
-        match_prefix = ''  # don't use prefix if it makes line longer than LINE_WIDTH
+def _start_time_str(start_time: typing.Optional[datetime.datetime], lang: str) -> str:
+    if start_time is None:
+        return localization.get('match_live', lang)
 
-    return f'{match_prefix}{team_vs_team}\n{start_time}\n{tournament_str}'
+    now = datetime.datetime.now(tz=datetime.timezone.utc)
+    if now > start_time:
+        minutes_after_start = ((now - start_time).seconds // 60)
+        return localization.get('match_live_with_duration', lang, minutes=minutes_after_start)
+    minutes_before_start = (start_time - now).seconds // 60
+    if minutes_before_start < 60:
+        return localization.get_markdown('match_starts_soon', lang, minutes=minutes_before_start)
+    return localization.get_markdown('match_starts_in', lang,
+                                     minutes=minutes_before_start % 60,
+                                     hours=minutes_before_start // 60)
 
 
-async def print_match_message(bot: telegram.Bot, chat_id: int, lang: str, match: matches_data_loader.Dota2Match):
-    message = _match_message(lang, match)
+def _match_message(lang: str, match: matches_data_loader.Dota2Match) -> str:
+    team_vs_team = _team_vs_team_string(match, lang)
+    if match.format is not None:
+        team_vs_team = f'{team_vs_team} \\({escape(match.format)}\\)'
+    match_prefix = localization.get('match_prefix', lang)
+    # don't use prefix if it makes line longer than LINE_WIDTH
+    use_prefix = not (len(team_vs_team) <= config.LINE_WIDTH < len(team_vs_team) + len(match_prefix) + 1)
+    tournament = match.tournament
+    return (f'{match_prefix + " " if use_prefix else ""}{team_vs_team}\n'
+            f'{_start_time_str(match.start_time, lang)}\n'
+            f'{localization.get_markdown("tournament_in_match", lang, name=tournament.name)}'
+            f'{_get_tier_text(tournament.tier, lang)}')
+
+
+@dataclass(eq=False)
+class RenderedMessage:
+    text: str
+    reply_markup: typing.Optional[telegram.InlineKeyboardMarkup]
+
+
+def render_match_message(lang: str, match: matches_data_loader.Dota2Match) -> RenderedMessage:
     if len(match.streams) == 0:
         reply_markup = None
     else:
@@ -104,23 +94,49 @@ async def print_match_message(bot: telegram.Bot, chat_id: int, lang: str, match:
             localization.get('show_streams', lang, count=len(match.streams)),
             callback_data=f'{config.CALLBACK_COMMANDS["show_streams"]} {match.id}'
         )]])
-    await bot.send_message(
+    return RenderedMessage(_match_message(lang, match), reply_markup)
+
+
+async def send_match_message(bot: telegram.Bot, chat_id: int, message: RenderedMessage) -> telegram.Message:
+    return await bot.send_message(
+        chat_id=chat_id,
+        text=message.text,
+        reply_markup=message.reply_markup,
+        parse_mode='MarkdownV2')
+
+
+async def edit_match_message(bot: telegram.Bot, chat_id: int, message_id: int, message: RenderedMessage,
+                             caption: bool = False):
+    # messages sent with a match card have the text as a caption
+    if caption:
+        await bot.edit_message_caption(
+            chat_id=chat_id,
+            message_id=message_id,
+            caption=message.text,
+            reply_markup=message.reply_markup,
+            parse_mode='MarkdownV2')
+        return
+    await bot.edit_message_text(
         chat_id=chat_id,
-        text=message,
-        reply_markup=reply_markup,
+        message_id=message_id,
+        text=message.text,
+        reply_markup=message.reply_markup,
         parse_mode='MarkdownV2')
 
 
+async def print_match_message(bot: telegram.Bot, chat_id: int, lang: str,
+                              match: matches_data_loader.Dota2Match) -> telegram.Message:
+    return await send_match_message(bot, chat_id, render_match_message(lang, match))
+
+
 def _get_stream_md_link(stream):
-    return f'[twitch\\.tv/{_escape(stream.channel_name)}](https://www.twitch.tv/{_escape(stream.channel_login)})'
+    return f'[twitch\\.tv/{escape(stream.channel_name)}](https://www.twitch.tv/{escape(stream.channel_login)})'
 
 
 def _streams_str(streams, lang: str):
-    res = ''
     viewers = localization.get('viewers_count_prefix', lang)
-    for stream in sorted(streams, key=lambda x: x.viewers, reverse=True):
-        res += f'\n{_get_stream_md_link(stream)}: {_escape(stream.title)} \\({viewers} {stream.viewers}\\)'
-    return res
+    return ''.join(f'\n{_get_stream_md_link(stream)}: {escape(stream.title)} \\({viewers} {stream.viewers}\\)'
+                   for stream in sorted(streams, key=lambda x: x.viewers, reverse=True))
 
 
 async def print_match_streams(bot: telegram.Bot, chat_id: int, lang: str, match: matches_data_loader.Dota2Match):
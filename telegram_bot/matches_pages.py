@@ -0,0 +1,127 @@
+import collections
+import logging
+import typing
+import telegram
+import localization
+import matches_data_loader
+import match_printing
+import config
+
+
+_logger = logging.getLogger('matches_pages')
+
+
+_PageKey = typing.Tuple[int, str, int, str]  # (data version, lang, page, filter)
+
+_MAX_PAGE_DIGITS = 4
+
+
+def normalize_filter(filter_: str) -> str:
+    # the filter is a part of the page buttons callback data, so it is cut to fit telegram callback data limit
+    filter_ = ' '.join(filter_.lower().split())
+    prefix_length = len(config.CALLBACK_COMMANDS['matches_page'].encode()) + _MAX_PAGE_DIGITS + 2
+    encoded = filter_.encode()[:config.CALLBACK_DATA_MAX_BYTES - prefix_length]
+    return encoded.decode(errors='ignore').strip()
+
+
+def _match_passes_filter(match: matches_data_loader.Dota2Match, filter_: str) -> bool:
+    if filter_ == '':
+        return True
+    names = [match.tournament.name] + [team.name for team in (match.team1, match.team2) if team is not None]
+    return any(filter_ in name.lower() for name in names)
+
+
+def _plain_team_name(team: typing.Optional[matches_data_loader.Dota2Team], lang: str) -> str:
+    return team.name if team is not None else localization.get('tbd_team', lang)
+
+
+def page_callback_data(page: int, filter_: str) -> str:
+    return f'{config.CALLBACK_COMMANDS["matches_page"]} {page} {filter_}'.rstrip()
+
+
+def parse_page_callback_data(data: str) -> typing.Tuple[int, str]:
+    _, page, *filter_ = data.split(' ', 2)
+    return int(page), filter_[0] if len(filter_) != 0 else ''
+
+
+class MatchesPages:
+    def __init__(self, page_size: int = config.MATCHES_PAGE_SIZE, cache_size: int = config.MATCHES_PAGES_CACHE_SIZE):
+        """
+        Renders upcoming matches list as pages of a single message. Rendered pages are cached per
+        (data version, lang, page, filter) and the cache is dropped when a new data version arrives
+
+        :param page_size: matches per page
+        :param cache_size: maximum number of cached pages
+        """
+        self._page_size = page_size
+        self._cache_size = cache_size
+        self._data_version: typing.Optional[int] = None
+        self._pages: typing.OrderedDict[_PageKey, match_printing.RenderedMessage] = collections.OrderedDict()
+        self._filtered: typing.Dict[str, typing.List[matches_data_loader.Dota2Match]] = dict()
+
+    def get(self, lang: str, page: int, filter_: str = '') -> match_printing.RenderedMessage:
+        data_version = matches_data_loader.get_data_version()
+        if data_version != self._data_version:
+            self._data_version = data_version
+            self._pages.clear()
+            self._filtered.clear()
+
+        matches = self._filtered_matches(filter_)
+        page_count = max(1, (len(matches) + self._page_size - 1) // self._page_size)
+        page = min(max(page, 0), page_count - 1)  # pages of an old data version may be out of range
+        key = (data_version, lang, page, filter_)
+        message = self._pages.get(key)
+        if message is not None:
+            self._pages.move_to_end(key)
+            return message
+
+        message = self._render(lang, matches[page * self._page_size:(page + 1) * self._page_size],
+                               page, page_count, filter_)
+        self._pages[key] = message
+        if len(self._pages) > self._cache_size:
+            self._pages.popitem(last=False)
+        return message
+
+    def _filtered_matches(self, filter_: str) -> typing.List[matches_data_loader.Dota2Match]:
+        matches = self._filtered.get(filter_)
+        if matches is None:
+            matches = [match for match in matches_data_loader.get_matches() if _match_passes_filter(match, filter_)]
+            if len(self._filtered) >= self._cache_size:
+                self._filtered.clear()
+            self._filtered[filter_] = matches
+        return matches
+
+    @staticmethod
+    def _render(lang: str, matches: typing.List[matches_data_loader.Dota2Match], page: int, page_count: int,
+                filter_: str) -> match_printing.RenderedMessage:
+        if len(matches) == 0:
+            return match_printing.RenderedMessage(localization.get_markdown('matches_not_found', lang), None)
+
+        header = localization.get_markdown('matches_page', lang, page=page + 1, pages=page_count)
+        text = '\n\n'.join([header] + [match_printing.render_match_message(lang, match).text for match in matches])
+
+        buttons = []
+        for match in matches:
+            if len(match.streams) == 0:
+                continue
+            teams = f'{_plain_team_name(match.team1, lang)} - {_plain_team_name(match.team2, lang)}'
+            buttons.append([telegram.InlineKeyboardButton(
+                f'{teams}: {localization.get("show_streams", lang, count=len(match.streams))}',
+                callback_data=f'{config.CALLBACK_COMMANDS["show_streams"]} {match.id}')])
+
+        navigation = []
+        if page > 0:
+            navigation.append(telegram.InlineKeyboardButton('◀', callback_data=page_callback_data(page - 1, filter_)))
+        if page + 1 < page_count:
+            navigation.append(telegram.InlineKeyboardButton('▶', callback_data=page_callback_data(page + 1, filter_)))
+        if len(navigation) != 0:
+            buttons.append(navigation)
+
+        return match_printing.RenderedMessage(text, telegram.InlineKeyboardMarkup(buttons) if buttons else None)
+
+
+_matches_pages = MatchesPages()
+
+
+def matches_pages() -> MatchesPages:
+    return _matches_pages
@@ -0,0 +1,63 @@
+import heapq
+import itertools
+import typing
+
+
+Key = typing.Hashable
+
+
+class ReminderScheduler:
+    def __init__(self):
+        """
+        Due times of keys (match ids) stored in a heap. Rescheduled and cancelled keys leave stale heap entries,
+        which are skipped when popped, so every operation is O(log n)
+        """
+        self._heap: typing.List[typing.Tuple[float, int, Key]] = []
+        self._due: typing.Dict[Key, typing.Tuple[float, int]] = dict()  # key to its actual heap entry
+        self._sequence = itertools.count()
+
+    def __len__(self):
+        return len(self._due)
+
+    def __contains__(self, key: Key):
+        return key in self._due
+
+    def schedule(self, key: Key, due: float):
+        if key in self._due and self._due[key][0] == due:
+            return
+        entry = (due, next(self._sequence), key)
+        self._due[key] = entry[:2]
+        heapq.heappush(self._heap, entry)
+        if len(self._heap) > 2 * len(self._due) + 16:
+            self._compact()
+
+    def cancel(self, key: Key):
+        self._due.pop(key, None)
+
+    def keys(self) -> typing.KeysView:
+        return self._due.keys()
+
+    def next_due(self) -> typing.Optional[float]:
+        self._drop_stale()
+        return self._heap[0][0] if len(self._heap) != 0 else None
+
+    def pop_due(self, now: float) -> typing.List[Key]:
+        result = []
+        while True:
+            self._drop_stale()
+            if len(self._heap) == 0 or self._heap[0][0] > now:
+                return result
+            _, _, key = heapq.heappop(self._heap)
+            del self._due[key]
+            result.append(key)
+
+    def _is_stale(self, entry) -> bool:
+        return self._due.get(entry[2]) != entry[:2]
+
+    def _drop_stale(self):
+        while len(self._heap) != 0 and self._is_stale(self._heap[0]):
+            heapq.heappop(self._heap)
+
+    def _compact(self):
+        self._heap = [entry for entry in self._heap if not self._is_stale(entry)]
+        heapq.heapify(self._heap)
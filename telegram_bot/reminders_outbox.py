@@ -0,0 +1,164 @@
+import time
+import typing
+import threading
+import logging
+import peewee
+import matches_data_loader
+import telegram_bot.config as config
+
+
+_logger = logging.getLogger('reminders_outbox')
+
+
+_PRAGMAS = {
+    'journal_mode': 'wal',
+    'cache_size': -1 * 16000,
+    'foreign_keys': 1,
+    'ignore_check_constraints': 0,
+    'synchronous': 0}
+
+
+_db = peewee.SqliteDatabase(config.REMINDERS_OUTBOX_FILE, pragmas=_PRAGMAS)
+
+
+# keep queries below sqlite variables limit
+_INSERT_BATCH = 200  # rows per insert statement
+_UPDATE_BATCH = 900  # chats per update statement
+
+_PENDING = 0
+_SENT = 1
+_FAILED = 2
+_EXPIRED = 3
+
+
+class _BaseModel(peewee.Model):
+    class Meta:
+        database = _db
+
+
+class _OutboxEntry(_BaseModel):
+    match_key = peewee.CharField()
+    chat_id = peewee.CharField()
+    lead_time = peewee.IntegerField()
+    status = peewee.SmallIntegerField(default=_PENDING, index=True)
+    updated = peewee.FloatField()
+
+    class Meta:
+        indexes = ((('match_key', 'chat_id', 'lead_time'), True),)
+
+
+def match_key(match: matches_data_loader.Dota2Match) -> str:
+    # match ids are reset on restart, so the outbox identifies matches by liquipedia pages and start time.
+    # The start time tells apart TBD vs TBD playoff matches and rematches of the same teams in a tournament
+    def team_page(team):
+        return team.liquipedia_page if team is not None else 'TBD'
+
+    start_time = int(match.start_time.timestamp()) if match.start_time is not None else 'live'
+    return f'{match.tournament.liquipedia_page}|{team_page(match.team1)}|{team_page(match.team2)}|{match.format}|' \
+           f'{start_time}'
+
+
+class RemindersOutbox:
+    def __init__(self, db_file: str = config.REMINDERS_OUTBOX_FILE,
+                 ack_batch: int = config.REMINDERS_OUTBOX_ACK_BATCH):
+        """
+        Durable log of reminders to be sent. A reminder is identified by (match key, chat, lead time), so adding
+        the same reminder again is a no-op and reminders that were sent before a restart are not sent again.
+        Deliveries are acknowledged in batches; an acknowledgement lost in a crash results in a resend
+
+        :param db_file: sqlite db file
+        :param ack_batch: delivery acknowledgements are committed when this number of them is buffered
+        """
+        _logger.info('connecting db')
+        _db.init(db_file, pragmas=_PRAGMAS)
+        _db.connect(reuse_if_open=True)
+        _db.create_tables([_OutboxEntry])
+        self._lock = threading.Lock()
+        self._ack_batch = ack_batch
+        self._acks: typing.List[typing.Tuple[str, str, int, int]] = []  # (match key, chat, lead time, status)
+        _logger.info(f'there are {_OutboxEntry.select().where(_OutboxEntry.status == _PENDING).count()} '
+                     f'pending reminders in the outbox')
+
+    def add(self, key: str, lead_time_chats: typing.Dict[int, typing.Iterable[str]]) \
+            -> typing.Dict[str, typing.List[int]]:
+        """
+        Adds reminders about a match in a single transaction
+
+        :return: lead times by chat for the reminders, which were not in the outbox before
+        """
+        now = time.time()
+        fields = [_OutboxEntry.match_key, _OutboxEntry.chat_id, _OutboxEntry.lead_time, _OutboxEntry.status,
+                  _OutboxEntry.updated]
+        with self._lock:
+            self._flush_acks()
+            with _db.atomic():
+                existing = set(_OutboxEntry.select(_OutboxEntry.chat_id, _OutboxEntry.lead_time).where(
+                    (_OutboxEntry.match_key == key) &
+                    (_OutboxEntry.lead_time.in_(list(lead_time_chats.keys())))).tuples())
+                new_rows = [(chat_id, lead_time) for lead_time, chat_ids in lead_time_chats.items()
+                            for chat_id in chat_ids if (chat_id, lead_time) not in existing]
+                rows = [(key, chat_id, lead_time, _PENDING, now) for chat_id, lead_time in new_rows]
+                for begin in range(0, len(rows), _INSERT_BATCH):
+                    _OutboxEntry.insert_many(rows[begin:begin + _INSERT_BATCH], fields=fields).execute()
+        return self._group_by_chat(new_rows)
+
+    def pending(self) -> typing.Dict[str, typing.Dict[str, typing.List[int]]]:
+        # match key to pending lead times by chat
+        with self._lock:
+            self._flush_acks()
+            result = dict()
+            q = _OutboxEntry.select(_OutboxEntry.match_key, _OutboxEntry.chat_id, _OutboxEntry.lead_time) \
+                .where(_OutboxEntry.status == _PENDING)
+            for key, chat_id, lead_time in q.tuples():
+                result.setdefault(key, dict()).setdefault(chat_id, []).append(lead_time)
+            return result
+
+    def ack_sent(self, key: str, chat_id: str, lead_times: typing.Iterable[int]):
+        self._ack(key, chat_id, lead_times, _SENT)
+
+    def ack_failed(self, key: str, chat_id: str, lead_times: typing.Iterable[int]):
+        self._ack(key, chat_id, lead_times, _FAILED)
+
+    def expire(self, key: str):
+        with self._lock:
+            _OutboxEntry.update(status=_EXPIRED, updated=time.time()).where(
+                (_OutboxEntry.match_key == key) & (_OutboxEntry.status == _PENDING)).execute()
+
+    def flush(self):
+        with self._lock:
+            self._flush_acks()
+
+    def cleanup(self, older_than: float = config.REMINDERS_OUTBOX_KEEP_SECONDS):
+        with self._lock:
+            removed = _OutboxEntry.delete().where(
+                (_OutboxEntry.status != _PENDING) & (_OutboxEntry.updated < time.time() - older_than)).execute()
+        if removed > 0:
+            _logger.info(f'{removed} processed reminders removed from the outbox')
+
+    def _ack(self, key: str, chat_id: str, lead_times: typing.Iterable[int], status: int):
+        with self._lock:
+            self._acks.extend((key, chat_id, lead_time, status) for lead_time in lead_times)
+            if len(self._acks) >= self._ack_batch:
+                self._flush_acks()
+
+    def _flush_acks(self):
+        if len(self._acks) == 0:
+            return
+        now = time.time()
+        grouped = dict()
+        for key, chat_id, lead_time, status in self._acks:
+            grouped.setdefault((key, lead_time, status), []).append(chat_id)
+        with _db.atomic():
+            for (key, lead_time, status), chat_ids in grouped.items():
+                for begin in range(0, len(chat_ids), _UPDATE_BATCH):
+                    _OutboxEntry.update(status=status, updated=now).where(
+                        (_OutboxEntry.match_key == key) & (_OutboxEntry.lead_time == lead_time) &
+                        (_OutboxEntry.chat_id.in_(chat_ids[begin:begin + _UPDATE_BATCH]))).execute()
+        self._acks = []
+
+    @staticmethod
+    def _group_by_chat(rows: typing.Iterable[typing.Tuple[str, int]]) -> typing.Dict[str, typing.List[int]]:
+        result = dict()
+        for chat_id, lead_time in rows:
+            result.setdefault(chat_id, []).append(lead_time)
+        return result
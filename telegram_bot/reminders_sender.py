@@ -1,6 +1,10 @@
 import telegram
+import functools
+import collections
 import logging
-import threading
+import concurrent.futures
+import time
+import typing
 import config
 import datetime
 import reminders_storage
@@ -8,81 +12,234 @@ import matches_data_loader
 import asyncio
 import match_printing
 import chat_settings
-# import localization TODO
+import delivery_queue
+import reminder_scheduler
+import reminders_outbox
+import live_updates
+import match_cards
+import localization
 
 
 _logger = logging.getLogger('reminders_sender')
 
 
 class RemindersSender:
-    def __init__(self, check_period=config.REMINDERS_CHECK_PERIOD_SECONDS,
-                 reminder_window=config.REMINDERS_WINDOW_SECONDS):
-        self._lock = threading.Lock()
-        self._stop_event = threading.Event()
-        self._check_period: int = check_period
-        self._reminder_window = datetime.timedelta(seconds=reminder_window)
-        self._last_reminded_match_start_time = datetime.datetime.now(tz=datetime.timezone.utc)
-        self._bot = telegram.Bot(config.bot_token())
-        self._check_thread = threading.Thread(target=self._check_loop, daemon=True)
+    def __init__(self, bot: telegram.Bot, db_executor: concurrent.futures.Executor,
+                 lead_times=config.REMINDER_LEAD_TIMES_SECONDS,
+                 data_check_period=config.REMINDERS_DATA_CHECK_PERIOD_SECONDS,
+                 shared_storages: bool = False, match_cards_enabled: bool = config.MATCH_CARDS_ENABLED):
+        """
+        Sends reminders about upcoming matches. Runs as a task on the bot application event loop
+
+        :param bot: the application bot, so reminders share its connection pool
+        :param db_executor: executor for blocking db queries
+        :param shared_storages: reminders and settings are also modified by other processes. The reminders index
+            is reloaded and the settings cache is cleared before due reminders are sent
+        :param match_cards_enabled: reminders are sent with match card images, when the cards are rendered
+        """
+        self._lead_times = lead_times
+        self._shared_storages = shared_storages
+        self._data_check_period = data_check_period
+        self._data_version: typing.Optional[int] = None
+        self._matches: typing.Dict[int, matches_data_loader.Dota2Match] = dict()  # scheduled matches by id
+        # (match id, lead time, start timestamp). A rescheduled match keeps its id and is reminded again
+        self._reminded: typing.Set[typing.Tuple[int, int, int]] = set()
+        # scheduler keys are (match id, lead time) pairs. So every lead time bucket is resolved once per match
+        self._scheduler = reminder_scheduler.ReminderScheduler()
+        self._outbox = reminders_outbox.RemindersOutbox()
+        self._outbox_resumed = False
+        self._bot = bot
+        self._db_executor = db_executor
+        self._delivery_queue = delivery_queue.DeliveryQueue()
+        self._live_updater = live_updates.LiveUpdater(self._bot, self._delivery_queue)
+        self._cards = match_cards.MatchCards() if match_cards_enabled else None
+        self._stop_event: typing.Optional[asyncio.Event] = None
+        self._task: typing.Optional[asyncio.Task] = None
 
     def start(self):
+        # should be called from the application event loop
         _logger.info('starting reminders sender')
-        self._check_thread.start()
+        self._stop_event = asyncio.Event()
+        self._task = asyncio.create_task(self._check_loop_async())
 
-    async def _check_loop_async(self):
-        while True:
-            try:
-                await self._check_reminders()
-            except Exception as e:
-                _logger.error('Unexpected error while checking reminders', exc_info=e)
-            if self._stop_event.wait(self._check_period):
-                break
-
-    def _check_loop(self):
-        asyncio.run(self._check_loop_async())
-
-    def stop_check_loop(self):
-        if self._stop_event.is_set():
+    async def stop(self):
+        if self._task is None:
             return
         _logger.info('Stopping reminders check')
         self._stop_event.set()
-        self._check_thread.join()
+        await self._task
+        self._task = None
 
-    async def _check_reminders(self):
-        _logger.info('checking reminders')
-        matches = matches_data_loader.get_matches()
-        now = datetime.datetime.now(tz=datetime.timezone.utc)
+    def delivery_stats(self) -> delivery_queue.DeliveryStats:
+        return self._delivery_queue.stats()
 
-        matches_to_remind = []
-        for match in matches:
-            if match.start_time is None:
-                continue
-            if not (now <= match.start_time <= self._reminder_window + now):
-                continue
-            # match start time in [now, now + reminder_window]
-            if match.start_time <= self._last_reminded_match_start_time:
-                continue  # skipping already processed matches
-            matches_to_remind.append(match)
+    async def _run_blocking(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._db_executor, function, *args)
 
-        for match in matches_to_remind:
-            self._last_reminded_match_start_time = max(self._last_reminded_match_start_time, match.start_time)
-            await self._remind_about_match(match, now)
+    def _ack_failed(self, key: str, chat_id: str, lead_times: typing.List[int]):
+        # called by the delivery queue from the event loop, the acknowledgement may commit a batch
+        future = asyncio.get_running_loop().run_in_executor(self._db_executor, self._outbox.ack_failed, key, chat_id,
+                                                            lead_times)
+        future.add_done_callback(functools.partial(self._log_ack_error, key, chat_id))
 
-        _logger.info(f'checking reminders finished. {len(matches_to_remind)} new matches processed')
+    @staticmethod
+    def _log_ack_error(key: str, chat_id: str, future: asyncio.Future):
+        # nothing awaits the acknowledgement, so its errors are only logged
+        if not future.cancelled() and future.exception() is not None:
+            _logger.error(f'failed to acknowledge the failed reminder about match {key} for {chat_id}',
+                          exc_info=future.exception())
 
-    async def _remind_about_match(self, match: matches_data_loader.Dota2Match, now: datetime.datetime):
+    async def _check_loop_async(self):
+        self._delivery_queue.start()
+        if self._cards is not None:
+            self._cards.start()
+        while not self._stop_event.is_set():
+            try:
+                new_data = self._sync_schedule()
+                if new_data:
+                    self._live_updater.on_new_data(self._matches)
+                    await self._run_blocking(self._outbox.cleanup)
+                    await self._run_blocking(reminders_storage.storage().restore_cut_names,
+                                             list(matches_data_loader.get_teams()),
+                                             list(matches_data_loader.get_tournaments()))
+                    if self._cards is not None:
+                        self._prepare_cards()
+                    if not self._outbox_resumed and self._data_version != 0:
+                        await self._resume_outbox()
+                await self._send_due_reminders()
+                if new_data and self._cards is not None:
+                    await self._cards.cleanup()  # due reminders don't wait for the disk cache scan
+                await self._run_blocking(self._outbox.flush)  # delivery acknowledgements group commit
+            except Exception as e:
+                _logger.error('Unexpected error while checking reminders', exc_info=e)
+            try:
+                await asyncio.wait_for(self._stop_event.wait(), self._time_to_wake())
+            except asyncio.TimeoutError:
+                pass
+        await self._delivery_queue.stop()
+        await self._run_blocking(self._outbox.flush)
+        if self._cards is not None:
+            await self._cards.stop()
+
+    def _time_to_wake(self) -> float:
+        timeout = self._data_check_period
+        next_due = self._scheduler.next_due()
+        if next_due is not None:
+            timeout = min(timeout, next_due - time.time())
+        return max(timeout, 0.0)
+
+    def _sync_schedule(self) -> bool:
+        # matches are only rescanned when the data loader reports a new version
+        data_version = matches_data_loader.get_data_version()
+        if data_version == self._data_version:
+            return False
+        self._data_version = data_version
+
+        now = datetime.datetime.now(tz=datetime.timezone.utc)
+        matches = {match.id: match for match in matches_data_loader.get_matches()}
+        for key in list(self._scheduler.keys()):
+            if key[0] not in matches:
+                self._scheduler.cancel(key)
+        self._reminded = {key for key in self._reminded if key[0] in matches and
+                          matches[key[0]].start_time is not None and key == self._reminded_key(matches[key[0]], key[1])}
+
+        for match in matches.values():
+            for lead_time in self._lead_times:
+                key = (match.id, lead_time)
+                if match.start_time is None or match.start_time < now:
+                    self._scheduler.cancel(key)  # the match has started before it was reminded
+                    continue
+                if self._reminded_key(match, lead_time) in self._reminded:
+                    continue
+                # overdue lead times of a newly found match are due at once and sent as a single reminder
+                self._scheduler.schedule(key, match.start_time.timestamp() - lead_time)
+        self._matches = matches
+        _logger.info(f'data version {data_version}: {len(self._scheduler)} reminders scheduled')
+        return True
+
+    @staticmethod
+    def _reminded_key(match: matches_data_loader.Dota2Match, lead_time: int) -> typing.Tuple[int, int, int]:
+        # scheduled matches always have a start time
+        return match.id, lead_time, int(match.start_time.timestamp())
+
+    def _prepare_cards(self):
+        # cards are rendered ahead, so they are ready when reminders are due
+        now = datetime.datetime.now(tz=datetime.timezone.utc)
+        for match in self._matches.values():
+            if match.start_time is not None and match.start_time > now:
+                for lang in localization.all_locales():
+                    self._cards.prepare(match, lang)
+
+    async def _resume_outbox(self):
+        # reminders which were added to the outbox, but not delivered before the restart
+        self._outbox_resumed = True
+        pending = await self._run_blocking(self._outbox.pending)
+        matches = {reminders_outbox.match_key(match): match for match in self._matches.values()}
+        for key, chat_lead_times in pending.items():
+            match = matches.get(key)
+            if match is None or match.start_time is None:
+                _logger.info(f'{len(chat_lead_times)} pending reminders about match {key} expired')
+                await self._run_blocking(self._outbox.expire, key)
+                continue
+            _logger.info(f'resuming {len(chat_lead_times)} pending reminders about match {key}')
+            await self._enqueue_reminders(match, key, chat_lead_times)
+
+    async def _send_due_reminders(self):
+        due_lead_times = collections.defaultdict(list)
+        for match_id, lead_time in self._scheduler.pop_due(time.time()):
+            self._reminded.add(self._reminded_key(self._matches[match_id], lead_time))
+            due_lead_times[match_id].append(lead_time)
+        if self._shared_storages and len(due_lead_times) != 0:
+            await self._run_blocking(self._refresh_storages)
+        for match_id, lead_times in due_lead_times.items():
+            await self._remind_about_match(self._matches[match_id], lead_times)
+
+    @staticmethod
+    def _refresh_storages():
+        reminders_storage.storage().reload()
+        chat_settings.storage().clear_cache()
+
+    async def _remind_about_match(self, match: matches_data_loader.Dota2Match, lead_times: typing.List[int]):
         match_descriptor = reminders_storage.MatchDescriptor(
             match.team1.name if match.team1 is not None else None,
             match.team2.name if match.team2 is not None else None,
             match.tournament.name)
 
-        reminders = reminders_storage.storage().get_reminded_chat_ids(match_descriptor)
-
-        _logger.info(f'sending {len(reminders)} reminders about match {match_descriptor}')
-
-        for chat_id in reminders:
-            try:
-                await match_printing.print_match_message(
-                    self._bot, int(chat_id), chat_settings.get_lang_for_known_chat(chat_id), match)
-            except telegram.error.TelegramError as e:
-                _logger.warning('Failed to send reminder to chat %s' % chat_id, exc_info=e)
+        key = reminders_outbox.match_key(match)
+        lead_time_chats = {lead_time: reminders_storage.storage().get_reminded_chat_ids(match_descriptor, lead_time)
+                           for lead_time in lead_times}
+        chat_lead_times = await self._run_blocking(self._outbox.add, key, lead_time_chats)
+
+        _logger.info(f'enqueueing {len(chat_lead_times)} reminders about match {match_descriptor}, '
+                     f'lead times {lead_times}')
+        await self._enqueue_reminders(match, key, chat_lead_times)
+
+    async def _enqueue_reminders(self, match: matches_data_loader.Dota2Match, key: str,
+                                 chat_lead_times: typing.Dict[str, typing.List[int]]):
+        chats_by_lang = collections.defaultdict(list)
+        chat_langs = await self._run_blocking(chat_settings.get_langs_for_known_chats, list(chat_lead_times.keys()))
+        for chat_id, lang in chat_langs.items():
+            chats_by_lang[lang].append(chat_id)
+
+        for lang, chat_ids in chats_by_lang.items():
+            message = match_printing.render_match_message(lang, match)  # rendered once for all the chats
+            card = self._cards.ready_card(match, lang) if self._cards is not None else None
+            for chat_id in chat_ids:
+                lead_times = chat_lead_times[chat_id]
+                self._delivery_queue.enqueue(
+                    int(chat_id),
+                    functools.partial(self._send_reminder, chat_id, lang, match.id, message, card, key, lead_times),
+                    priority=match.start_time.timestamp(),
+                    on_failure=functools.partial(self._ack_failed, key, chat_id, lead_times))
+
+        _logger.info(f'reminders delivery queue depth is {self._delivery_queue.queue_depth()}')
+
+    async def _send_reminder(self, chat_id: str, lang: str, match_id: int, message: match_printing.RenderedMessage,
+                             card: typing.Optional[match_cards.CardKey], key: str, lead_times: typing.List[int]):
+        sent = None
+        if card is not None:
+            sent = await self._cards.send(self._bot, int(chat_id), card, message.text, message.reply_markup)
+        if sent is None:
+            sent = await match_printing.send_match_message(self._bot, int(chat_id), message)
+        await self._run_blocking(self._outbox.ack_sent, key, chat_id, lead_times)
+        live_updates.sent_messages().register(match_id, sent, lang)
@@ -1,22 +1,31 @@
+import os
+import json
+import collections
 import typing
 import threading
 import logging
 import peewee
 import telegram_bot.config as config
+from telegram_bot.db_migrations import apply_migrations
 from dataclasses import dataclass
 
 
 _logger = logging.getLogger('reminders_storage')
 
 
-_db = peewee.SqliteDatabase(
-    config.REMINDERS_STORAGE_FILE,
-    pragmas={
-        'journal_mode': 'wal',
-        'cache_size': -1 * 64000,
-        'foreign_keys': 1,
-        'ignore_check_constraints': 0,
-        'synchronous': 0})
+_INSERT_BATCH = 200  # rows per insert statement
+_CUT_NAME_LENGTH = 50  # team and tournament names were cut to this length before callback data had short ids
+
+
+_PRAGMAS = {
+    'journal_mode': 'wal',
+    'cache_size': -1 * 64000,
+    'foreign_keys': 1,
+    'ignore_check_constraints': 0,
+    'synchronous': 0}
+
+
+_db = peewee.SqliteDatabase(config.REMINDERS_STORAGE_FILE, pragmas=_PRAGMAS)
 
 
 class _BaseModel(peewee.Model):
@@ -34,6 +43,74 @@ class _Reminder(_BaseModel):
     value = peewee.CharField(null=True)
 
 
+class _ChatLeadTime(_BaseModel):
+    chat = peewee.ForeignKeyField(_Chat, backref='lead_times')
+    lead_time = peewee.IntegerField()  # seconds before match start
+
+    class Meta:
+        indexes = ((('chat', 'lead_time'), True),)
+
+
+class _ReminderStats(_BaseModel):
+    # followers count of every followed (type, value) and totals, updated in the transactions changing reminders
+    type = peewee.CharField(max_length=10)  # reminder type or one of _TOTAL_TYPE, _CHATS_TYPE
+    value = peewee.CharField()
+    count = peewee.IntegerField()
+
+    class Meta:
+        indexes = (
+            (('type', 'value'), True),
+            (('type', 'count'), False),  # top followed values
+        )
+
+
+_TOTAL_TYPE = 'total'  # value is a reminder type, count is the number of reminders of the type
+_CHATS_TYPE = 'chats'
+_NO_VALUE = ''  # value of 'all' reminders and of the chats counter
+
+
+def _add_reminder_lookup_index(migrator):
+    # covering index for get_reminded_chat_ids. Chat ids are read from the index without touching the table rows
+    migrator.add_index(_Reminder._meta.table_name, ('type', 'value', 'chat_id')).run()
+
+
+def _fill_reminder_stats(migrator):
+    _ReminderStats.delete().execute()
+    counts = collections.Counter()
+    q = _Reminder.select(_Reminder.type, _Reminder.value, peewee.fn.Count(_Reminder.id)) \
+        .group_by(_Reminder.type, _Reminder.value)
+    for type_, value, count in q.tuples():
+        counts[(type_, value)] += count
+    counts[(_CHATS_TYPE, None)] = _Chat.select().count()
+    _add_stats_deltas(counts)
+
+
+_MIGRATIONS = [
+    _add_reminder_lookup_index,
+    _fill_reminder_stats,
+]
+
+
+def _add_stats_deltas(deltas: typing.Dict[typing.Tuple[str, typing.Optional[str]], int]):
+    # deltas are by (reminder type, value), the totals of the types are derived from them
+    totals = collections.Counter()
+    rows = []
+    for (type_, value), delta in deltas.items():
+        if delta == 0:
+            continue
+        rows.append((type_, _NO_VALUE if value is None else value, delta))
+        if type_ != _CHATS_TYPE:
+            totals[type_] += delta
+    rows.extend((_TOTAL_TYPE, type_, delta) for type_, delta in totals.items() if delta != 0)
+    for begin in range(0, len(rows), _INSERT_BATCH):
+        _ReminderStats.insert_many(rows[begin:begin + _INSERT_BATCH],
+                                   fields=[_ReminderStats.type, _ReminderStats.value, _ReminderStats.count]) \
+            .on_conflict(conflict_target=[_ReminderStats.type, _ReminderStats.value],
+                         update={_ReminderStats.count: _ReminderStats.count + peewee.EXCLUDED.count}).execute()
+    _ReminderStats.delete().where(_ReminderStats.type.in_(['team', 'tournament']) & (_ReminderStats.count <= 0)) \
+        .execute()
+
+
 @dataclass(eq=False)
 class MatchDescriptor:
     team1_id: typing.Optional[str]
@@ -60,137 +137,469 @@ class Stats:
     top_followed_tournaments: typing.List[typing.Tuple[str, int]]  # name to count (top N entries)
 
 
-class RemindersStorage:
+class _RemindersIndex:
+    def __init__(self):
+        self.chats: typing.Set[str] = set()
+        self._team_chats: typing.Dict[str, typing.Set[str]] = dict()
+        self._tournament_chats: typing.Dict[str, typing.Set[str]] = dict()
+        self._all_chats: typing.Set[str] = set()
+        self._chat_reminders: typing.Dict[str, typing.Set[ChatReminder]] = dict()
+        # only chats that changed their lead times are stored, the rest use REMINDER_DEFAULT_LEAD_TIME_SECONDS
+        self._chat_lead_times: typing.Dict[str, typing.FrozenSet[int]] = dict()
+        self._lead_time_chats: typing.Dict[int, typing.Set[str]] = dict()
+
+    def __eq__(self, other):
+        return self.chats == other.chats and self._chat_reminders == other._chat_reminders and \
+            self._chat_lead_times == other._chat_lead_times
+
+    @staticmethod
+    def load() -> '_RemindersIndex':
+        index = _RemindersIndex()
+        for chat_id, in _Chat.select(_Chat.id).tuples():
+            index.chats.add(chat_id)
+        for chat_id, type_, value in _Reminder.select(_Reminder.chat, _Reminder.type, _Reminder.value).tuples():
+            index.add(chat_id, ChatReminder(type_, value))
+        chat_lead_times = dict()
+        for chat_id, lead_time in _ChatLeadTime.select(_ChatLeadTime.chat, _ChatLeadTime.lead_time).tuples():
+            chat_lead_times.setdefault(chat_id, set()).add(lead_time)
+        for chat_id, lead_times in chat_lead_times.items():
+            index.set_lead_times(chat_id, frozenset(lead_times))
+        return index
+
+    def _value_chats(self, reminder: ChatReminder) -> typing.Optional[typing.Set[str]]:
+        if reminder.type_ == 'all':
+            return self._all_chats
+        by_value = self._team_chats if reminder.type_ == 'team' else self._tournament_chats
+        return by_value.get(reminder.value)
+
+    def contains(self, chat_id: str, reminder: ChatReminder) -> bool:
+        return reminder in self._chat_reminders.get(chat_id, ())
+
+    def add(self, chat_id: str, reminder: ChatReminder):
+        self.chats.add(chat_id)
+        self._chat_reminders.setdefault(chat_id, set()).add(reminder)
+        if reminder.type_ == 'all':
+            self._all_chats.add(chat_id)
+        else:
+            by_value = self._team_chats if reminder.type_ == 'team' else self._tournament_chats
+            by_value.setdefault(reminder.value, set()).add(chat_id)
+
+    def remove(self, chat_id: str, reminder: ChatReminder):
+        chat_reminders = self._chat_reminders[chat_id]
+        chat_reminders.remove(reminder)
+        if len(chat_reminders) == 0:
+            del self._chat_reminders[chat_id]
+        chats = self._value_chats(reminder)
+        chats.remove(chat_id)
+        if len(chats) == 0 and reminder.type_ != 'all':
+            by_value = self._team_chats if reminder.type_ == 'team' else self._tournament_chats
+            del by_value[reminder.value]
+
+    def reminders(self, chat_id: str) -> typing.Set[ChatReminder]:
+        return set(self._chat_reminders.get(chat_id, ()))
+
+    def value_chats(self, type_: typing.Literal['team', 'tournament']) -> typing.Dict[str, typing.Set[str]]:
+        return self._team_chats if type_ == 'team' else self._tournament_chats
+
+    def lead_times(self, chat_id: str) -> typing.FrozenSet[int]:
+        return self._chat_lead_times.get(chat_id, frozenset([config.REMINDER_DEFAULT_LEAD_TIME_SECONDS]))
+
+    def set_lead_times(self, chat_id: str, lead_times: typing.FrozenSet[int]):
+        for lead_time in self._chat_lead_times.pop(chat_id, ()):
+            self._lead_time_chats[lead_time].discard(chat_id)
+        self._chat_lead_times[chat_id] = lead_times
+        for lead_time in lead_times:
+            self._lead_time_chats.setdefault(lead_time, set()).add(chat_id)
+
+    def reminded_chat_ids(self, match_descriptor: MatchDescriptor,
+                          lead_time: typing.Optional[int] = None) -> typing.Set[str]:
+        result = set(self._all_chats)
+        for team_id in (match_descriptor.team1_id, match_descriptor.team2_id):
+            if team_id is not None:
+                result |= self._team_chats.get(team_id, set())
+        result |= self._tournament_chats.get(match_descriptor.tournament_id, set())
+        if lead_time is None:
+            return result
+
+        with_lead_time = result & self._lead_time_chats.get(lead_time, set())
+        if lead_time == config.REMINDER_DEFAULT_LEAD_TIME_SECONDS:
+            with_lead_time |= {chat_id for chat_id in result if chat_id not in self._chat_lead_times}
+        return with_lead_time
+
+
+# journaled mutations
+_ADD = 'add'
+_REMOVE = 'remove'
+_REMOVE_ALL = 'remove_all'
+_LEAD_TIMES = 'lead_times'
+
+
+class _ChatMutations:
     def __init__(self):
+        self.created = False
+        self.removed_all = False
+        self.reminders: typing.Dict[typing.Tuple[str, typing.Optional[str]], bool] = dict()  # present after the batch
+        self.lead_times: typing.Optional[typing.List[int]] = None
+
+
+def _apply_mutations(mutations: typing.Iterable[list]):
+    """
+    Writes mutations in a single transaction. Only the final state of every touched reminder is written, so
+    applying mutations, which are already in the db, again is a no-op
+    """
+    chats: typing.Dict[str, _ChatMutations] = dict()
+    for kind, chat_id, *arguments in mutations:
+        chat = chats.setdefault(chat_id, _ChatMutations())
+        if kind == _ADD:
+            chat.created = True
+            chat.reminders[tuple(arguments)] = True
+        elif kind == _REMOVE:
+            chat.reminders[tuple(arguments)] = False
+        elif kind == _REMOVE_ALL:
+            chat.removed_all = True
+            chat.reminders.clear()
+        elif kind == _LEAD_TIMES:
+            chat.created = True
+            chat.lead_times = arguments[0]
+
+    reminder_rows = []
+    lead_time_rows = []
+    stats_deltas = collections.Counter()
+    with _db.atomic():
+        created = [chat_id for chat_id, chat in chats.items() if chat.created]
+        for begin in range(0, len(created), _INSERT_BATCH):
+            chunk = created[begin:begin + _INSERT_BATCH]
+            existing = _Chat.select().where(_Chat.id.in_(chunk)).count()
+            _Chat.insert_many([(chat_id,) for chat_id in chunk], fields=[_Chat.id]).on_conflict_ignore().execute()
+            stats_deltas[(_CHATS_TYPE, None)] += len(chunk) - existing
+        for chat_id, chat in chats.items():
+            if chat.removed_all:
+                q = _Reminder.select(_Reminder.type, _Reminder.value).where(_Reminder.chat == chat_id)
+                for type_, value in q.tuples():
+                    stats_deltas[(type_, value)] -= 1
+                _Reminder.delete().where(_Reminder.chat == chat_id).execute()
+            for (type_, value), present in chat.reminders.items():
+                stats_deltas[(type_, value)] -= _Reminder.delete().where(
+                    (_Reminder.chat == chat_id) & (_Reminder.type == type_) &
+                    (_Reminder.value.is_null() if value is None else _Reminder.value == value)).execute()
+                if present:
+                    reminder_rows.append((chat_id, type_, value))
+                    stats_deltas[(type_, value)] += 1
+            if chat.lead_times is not None:
+                _ChatLeadTime.delete().where(_ChatLeadTime.chat == chat_id).execute()
+                lead_time_rows.extend((chat_id, lead_time) for lead_time in chat.lead_times)
+        for begin in range(0, len(reminder_rows), _INSERT_BATCH):
+            _Reminder.insert_many(reminder_rows[begin:begin + _INSERT_BATCH],
+                                  fields=[_Reminder.chat, _Reminder.type, _Reminder.value]).execute()
+        for begin in range(0, len(lead_time_rows), _INSERT_BATCH):
+            _ChatLeadTime.insert_many(lead_time_rows[begin:begin + _INSERT_BATCH],
+                                      fields=[_ChatLeadTime.chat, _ChatLeadTime.lead_time]).execute()
+        _add_stats_deltas(stats_deltas)
+
+
+class _MutationsJournal:
+    def __init__(self, file: str):
+        """
+        Append only file of mutations, which are not written to the db yet. A mutation is a json line written
+        before it is acknowledged. While a batch is written to the db, its journal is kept as file + '.flushing'
+        """
+        self._file = file
+        self._flushing_file = file + '.flushing'
+        self._stream = open(self._file, 'a', encoding='utf-8')
+
+    def replay(self) -> typing.List[list]:
+        # mutations left by a crash or unclean shutdown
+        mutations = []
+        for file in (self._flushing_file, self._file):
+            if not os.path.exists(file):
+                continue
+            with open(file, encoding='utf-8') as stream:
+                for line in stream:
+                    try:
+                        mutations.append(json.loads(line))
+                    except ValueError:
+                        _logger.warning(f'skipping a partially written mutation in {file}')
+        return mutations
+
+    def append(self, mutation: list):
+        self._stream.write(json.dumps(mutation) + '\n')
+        self._stream.flush()  # survives a process crash, the same as the db with synchronous=0
+
+    def rotate(self):
+        # the current mutations are being written to the db, new ones go to a new journal
+        self._stream.close()
+        if os.path.exists(self._flushing_file):
+            # the previous batch failed to be written and is retried with the current one
+            with open(self._flushing_file, 'a', encoding='utf-8') as flushing, \
+                    open(self._file, encoding='utf-8') as current:
+                flushing.write(current.read())
+            os.remove(self._file)
+        else:
+            os.replace(self._file, self._flushing_file)
+        self._stream = open(self._file, 'a', encoding='utf-8')
+
+    def flushed(self):
+        if os.path.exists(self._flushing_file):
+            os.remove(self._flushing_file)
+
+    def clear(self):
+        self._stream.truncate(0)
+        self.flushed()
+
+    def close(self):
+        self._stream.close()
+
+
+class RemindersStorage:
+    def __init__(self, db_file: str = config.REMINDERS_STORAGE_FILE,
+                 journal_file: str = config.REMINDERS_JOURNAL_FILE,
+                 flush_period: float = config.REMINDERS_JOURNAL_FLUSH_SECONDS,
+                 flush_batch: int = config.REMINDERS_JOURNAL_FLUSH_BATCH):
+        """
+        Reminders of chats. Reads are served by an in-memory index. Mutations update the index and a journal at once
+        and are written to the db in batched transactions by a background thread
+
+        :param journal_file: unflushed mutations, replayed on start. Every process should have its own journal
+        :param flush_period: seconds between db writes
+        :param flush_batch: mutations are written without waiting for the period when this number of them is pending
+        """
         _logger.info('connecting db')
+        _db.init(db_file, pragmas=_PRAGMAS)
         _db.connect()
         _logger.info('creating tables')
-        _db.create_tables([_Chat, _Reminder])
-
-        _logger.info(f'there are {_Chat.select().count()} chats and {_Reminder.select().count()} reminders '
+        _db.create_tables([_Chat, _Reminder, _ChatLeadTime, _ReminderStats])
+        apply_migrations(_db, _MIGRATIONS)
+
+        self._journal = _MutationsJournal(journal_file)
+        replayed = self._journal.replay()
+        if len(replayed) != 0:
+            _logger.info(f'replaying {len(replayed)} journaled mutations')
+            _apply_mutations(replayed)
+        self._journal.clear()
+
+        _logger.info('loading reminders index')
+        self._index = _RemindersIndex.load()
+        _logger.info(f'there are {len(self._index.chats)} chats and {_Reminder.select().count()} reminders '
                      f'stored in the db')
 
-        self._lock = threading.Lock()
-
-    @staticmethod
-    def _get_or_create_chat(chat_id):
-        chat, created = _Chat.get_or_create(id=chat_id)
-        if created:
-            _logger.info(f'new chat {chat_id}')
-        return chat
+        self._lock = threading.RLock()
+        self._flush_lock = threading.Lock()  # batches are written one by one, the journal has one flushing file
+        self._pending: typing.List[list] = []
+        self._flush_batch = flush_batch
+        self._flush_period = flush_period
+        self._stop_event = threading.Event()
+        self._flush_thread = threading.Thread(target=self._flush_loop, daemon=True)
+        self._flush_thread.start()
+
+    def close(self):
+        # pending mutations are written, unflushed ones would be replayed on the next start otherwise
+        self._stop_event.set()
+        self._flush_thread.join()
+        self.flush()
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                mutations = self._take_pending()
+            self._write(mutations)
+
+    def reload(self):
+        # the index is rebuilt from the db, when the db is also modified by other processes
+        with self._flush_lock, self._lock:
+            self._write(self._take_pending())
+            self._index = _RemindersIndex.load()
+
+    def _take_pending(self) -> typing.List[list]:
+        # should be called with the lock held
+        mutations = self._pending
+        if len(mutations) != 0:
+            self._pending = []
+            self._journal.rotate()
+        return mutations
+
+    def _write(self, mutations: typing.List[list]):
+        # should be called with the flush lock held. The lock may be held as well
+        if len(mutations) == 0:
+            return
+        try:
+            _apply_mutations(mutations)
+        except Exception:
+            with self._lock:
+                self._pending = mutations + self._pending  # the journal keeps them in the flushing file
+            raise
+        self._journal.flushed()
+
+    def _flush_loop(self):
+        while not self._stop_event.wait(self._flush_period):
+            try:
+                self.flush()
+            except Exception as e:
+                _logger.error('failed to write reminders mutations, they are kept in the journal', exc_info=e)
+
+    def _mutate(self, mutation: list) -> bool:
+        # should be called with the lock held. Returns if the batch should be flushed
+        self._journal.append(mutation)
+        self._pending.append(mutation)
+        return len(self._pending) >= self._flush_batch
+
+    def _add_reminder(self, chat_id: str, reminder: ChatReminder) -> bool:
+        with self._lock:
+            if self._index.contains(chat_id, reminder):
+                return False
+            flush = self._mutate([_ADD, chat_id, reminder.type_, reminder.value])
+            if chat_id not in self._index.chats:
+                _logger.info(f'new chat {chat_id}')
+            self._index.add(chat_id, reminder)
+        if flush:
+            self.flush()
+        return True
+
+    def _remove_reminder(self, chat_id: str, reminder: ChatReminder) -> bool:
+        with self._lock:
+            if not self._index.contains(chat_id, reminder):
+                return False
+            flush = self._mutate([_REMOVE, chat_id, reminder.type_, reminder.value])
+            self._index.remove(chat_id, reminder)
+        if flush:
+            self.flush()
+        return True
 
     def add_team_reminder(self, chat_id: str, team_id: str):
-        with self._lock:
-            chat = self._get_or_create_chat(chat_id)
-            _, created = _Reminder.get_or_create(chat=chat, type='team', value=team_id)
-            if created:
-                _logger.info(f'new team reminder for {chat_id}, team {team_id}')
+        if self._add_reminder(chat_id, ChatReminder('team', team_id)):
+            _logger.info(f'new team reminder for {chat_id}, team {team_id}')
 
     def remove_team_reminder(self, chat_id: str, team_id: str):
-        with self._lock:
-            chat = self._get_or_create_chat(chat_id)
-            q = _Reminder.delete().where(
-                (_Reminder.chat == chat) & (_Reminder.type == 'team') & (_Reminder.value == team_id))
-            if q.execute() > 0:
-                _logger.info(f'removed team reminder for {chat_id}, team {team_id}')
-            
+        if self._remove_reminder(chat_id, ChatReminder('team', team_id)):
+            _logger.info(f'removed team reminder for {chat_id}, team {team_id}')
+
     def add_tournament_reminder(self, chat_id: str, tournament_id: str):
-        with self._lock:
-            chat = self._get_or_create_chat(chat_id)
-            _, created = _Reminder.get_or_create(chat=chat, type='tournament', value=tournament_id)
-            if created:
-                _logger.info(f'new tournament reminder for {chat_id}, tournament {tournament_id}')
+        if self._add_reminder(chat_id, ChatReminder('tournament', tournament_id)):
+            _logger.info(f'new tournament reminder for {chat_id}, tournament {tournament_id}')
 
     def remove_tournament_reminder(self, chat_id: str, tournament_id: str):
-        with self._lock:
-            chat = self._get_or_create_chat(chat_id)
-            q = _Reminder.delete().where(
-                (_Reminder.chat == chat) & (_Reminder.type == 'tournament') & (_Reminder.value == tournament_id))
-            if q.execute() > 0:
-                _logger.info(f'removed tournament reminder for {chat_id}, tournament {tournament_id}')
+        if self._remove_reminder(chat_id, ChatReminder('tournament', tournament_id)):
+            _logger.info(f'removed tournament reminder for {chat_id}, tournament {tournament_id}')
 
     def add_all_reminder(self, chat_id: str):
-        with self._lock:
-            chat = self._get_or_create_chat(chat_id)
-            _, created = _Reminder.get_or_create(chat=chat, type='all', value=None)
-            if created:
-                _logger.info(f'new all reminder for {chat_id}')
+        if self._add_reminder(chat_id, ChatReminder('all', None)):
+            _logger.info(f'new all reminder for {chat_id}')
 
     def remove_all_reminder(self, chat_id: str):
-        with self._lock:
-            chat = self._get_or_create_chat(chat_id)
-            q = _Reminder.delete().where(
-                (_Reminder.chat == chat) & (_Reminder.type == 'all') & (_Reminder.value.is_null()))
-            if q.execute() > 0:
-                _logger.info(f'removed all reminder for {chat_id}')
+        if self._remove_reminder(chat_id, ChatReminder('all', None)):
+            _logger.info(f'removed all reminder for {chat_id}')
 
     def remove_all_reminders(self, chat_id: str):
         with self._lock:
-            chat = self._get_or_create_chat(chat_id)
-            q = _Reminder.delete().where(_Reminder.chat == chat)
-            removed = q.execute()
-            if removed > 0:
-                _logger.info(f'removed all {removed} reminders for {chat_id}')
-
-    @staticmethod
-    def _get_team_reminded(team_id: typing.Optional[str]):
-        if team_id is None:
-            return set()
-        reminders = _Reminder.select().where((_Reminder.type == 'team') & (_Reminder.value == team_id))
-        return {reminder.chat.id for reminder in reminders}
-
-    @staticmethod
-    def _get_tournament_reminded(tournament_id: str):
-        reminders = _Reminder.select().where((_Reminder.type == 'tournament') & (_Reminder.value == tournament_id))
-        return {reminder.chat.id for reminder in reminders}
+            reminders = self._index.reminders(chat_id)
+            if len(reminders) == 0:
+                return
+            flush = self._mutate([_REMOVE_ALL, chat_id])
+            for reminder in reminders:
+                self._index.remove(chat_id, reminder)
+        _logger.info(f'removed all {len(reminders)} reminders for {chat_id}')
+        if flush:
+            self.flush()
+
+    def restore_cut_names(self, team_names: typing.Iterable[str], tournament_names: typing.Iterable[str]) -> int:
+        """
+        Reminders of cut names never match a match. They are rewritten to the full name, when only one known name
+        starts with the cut one
+
+        :return: number of rewritten reminders
+        """
+        rewritten = 0
+        flush = False
+        with self._lock:
+            for type_, names in (('team', team_names), ('tournament', tournament_names)):
+                names = set(names)
+                full_names: typing.Dict[str, typing.Optional[str]] = dict()
+                for name in names:
+                    if len(name) > _CUT_NAME_LENGTH:
+                        cut = name[:_CUT_NAME_LENGTH]
+                        full_names[cut] = None if cut in full_names else name  # ambiguous ones are kept as is
+                value_chats = self._index.value_chats(type_)
+                cut_values = [value for value in value_chats
+                              if len(value) == _CUT_NAME_LENGTH and value not in names and full_names.get(value)]
+                for value in cut_values:
+                    full_name = full_names[value]
+                    for chat_id in list(value_chats[value]):
+                        old, new = ChatReminder(type_, value), ChatReminder(type_, full_name)
+                        flush |= self._mutate([_REMOVE, chat_id, type_, value])
+                        self._index.remove(chat_id, old)
+                        if not self._index.contains(chat_id, new):
+                            flush |= self._mutate([_ADD, chat_id, type_, full_name])
+                            self._index.add(chat_id, new)
+                        rewritten += 1
+                    _logger.info(f'{type_} reminders of cut name {value} are rewritten to {full_name}')
+        if flush:
+            self.flush()
+        return rewritten
+
+    def get_reminded_chat_ids(self, match_descriptor: MatchDescriptor,
+                              lead_time: typing.Optional[int] = None) -> typing.Set[str]:
+        # lead_time=None means any lead time
+        with self._lock:
+            result = self._index.reminded_chat_ids(match_descriptor, lead_time)
+        _logger.info(f'found {len(result)} users to remind about match {str(match_descriptor)}, '
+                     f'lead time {lead_time}')
+        return result
 
-    @staticmethod
-    def _all_reminded():
-        reminders = _Reminder.select().where((_Reminder.type == 'all') & (_Reminder.value.is_null()))
-        return {reminder.chat.id for reminder in reminders}
+    def get_lead_times(self, chat_id: str) -> typing.FrozenSet[int]:
+        with self._lock:
+            return self._index.lead_times(chat_id)
 
-    def get_reminded_chat_ids(self, match_descriptor: MatchDescriptor) -> typing.Set[str]:
+    def set_lead_times(self, chat_id: str, lead_times: typing.Iterable[int]):
+        lead_times = frozenset(lead_times)
+        assert len(lead_times) != 0  # a chat without lead times would be indistinguishable from the default one
         with self._lock:
-            # TODO direct or request
-            result = self._get_team_reminded(match_descriptor.team1_id) | \
-                     self._get_team_reminded(match_descriptor.team2_id) | \
-                     self._get_tournament_reminded(match_descriptor.tournament_id) | \
-                     self._all_reminded()
-            _logger.info(f'found {len(result)} users to remind about match {str(match_descriptor)}')
-            return result
+            if self._index.lead_times(chat_id) == lead_times:
+                return
+            flush = self._mutate([_LEAD_TIMES, chat_id, sorted(lead_times)])
+            self._index.chats.add(chat_id)
+            self._index.set_lead_times(chat_id, lead_times)
+        _logger.info(f'chat {chat_id} lead times changed to {sorted(lead_times)}')
+        if flush:
+            self.flush()
 
     def get_reminders(self, chat_id: str) -> typing.Set[ChatReminder]:
         with self._lock:
-            chat = self._get_or_create_chat(chat_id)
-            _logger.info(f'reporting {chat.reminders.count()} reminders for chat {chat_id}')
+            result = self._index.reminders(chat_id)
+        _logger.info(f'reporting {len(result)} reminders for chat {chat_id}')
+        return result
 
-            result = set()
-            for reminder in chat.reminders:
-                result.add(ChatReminder(type_=reminder.type, value=reminder.value))
-            return result
+    def check_index_consistency(self) -> bool:
+        with self._flush_lock, self._lock:
+            self._write(self._take_pending())
+            db_index = _RemindersIndex.load()
+            if db_index == self._index:
+                return True
+            _logger.error('in-memory reminders index differs from the db. Reloading the index')
+            self._index = db_index
+            return False
 
     @staticmethod
-    def _get_top(what: typing.Literal['team', 'tournament']):
-        q = _Reminder.select(_Reminder.value, peewee.fn.Count(_Reminder.id).alias('count')) \
-            .where(_Reminder.type == what) \
-            .group_by(_Reminder.value) \
-            .order_by(peewee.fn.Count(_Reminder.id).desc())
-        result = []
-        for r in q:
-            result.append((r.value, r.count))
-        return result
-
-    def get_stats(self) -> Stats:
-        with self._lock:
-            return Stats(
-                unique_chats=_Chat.select().count(),
-                active_all_reminders=_Reminder.select().where(
-                    (_Reminder.type == 'all') & (_Reminder.value.is_null())).count(),
-                active_team_reminders=_Reminder.select().where(_Reminder.type == 'team').count(),
-                active_tournament_reminders=_Reminder.select().where(_Reminder.type == 'tournament').count(),
-                top_followed_teams=self._get_top('team'),
-                top_followed_tournaments=self._get_top('tournament')
-            )
+    def _get_top(what: typing.Literal['team', 'tournament'], size: int) -> typing.List[typing.Tuple[str, int]]:
+        q = _ReminderStats.select(_ReminderStats.value, _ReminderStats.count) \
+            .where(_ReminderStats.type == what) \
+            .order_by(_ReminderStats.count.desc()) \
+            .limit(size)
+        return list(q.tuples())
+
+    def get_stats(self, top_size: int = config.STATS_TOP_SIZE) -> Stats:
+        # reads a few rows of the aggregate table, so the cost doesn't depend on the number of reminders
+        self.flush()
+        counts = {(type_, value): count for type_, value, count in _ReminderStats.select(
+            _ReminderStats.type, _ReminderStats.value, _ReminderStats.count).where(
+            ((_ReminderStats.type == _TOTAL_TYPE) & _ReminderStats.value.in_(['team', 'tournament'])) |
+            (_ReminderStats.type.in_(['all', _CHATS_TYPE]) & (_ReminderStats.value == _NO_VALUE))).tuples()}
+        return Stats(
+            unique_chats=counts.get((_CHATS_TYPE, _NO_VALUE), 0),
+            active_all_reminders=counts.get(('all', _NO_VALUE), 0),
+            active_team_reminders=counts.get((_TOTAL_TYPE, 'team'), 0),
+            active_tournament_reminders=counts.get((_TOTAL_TYPE, 'tournament'), 0),
+            top_followed_teams=self._get_top('team', top_size),
+            top_followed_tournaments=self._get_top('tournament', top_size)
+        )
 
 
 _def_storage: typing.Optional[RemindersStorage] = None
@@ -202,7 +611,13 @@ def storage() -> RemindersStorage:
     return _def_storage
 
 
-def initialize():
+def initialize(db_file: str = config.REMINDERS_STORAGE_FILE, journal_file: str = config.REMINDERS_JOURNAL_FILE):
     global _def_storage
     assert(_def_storage is None)
-    _def_storage = RemindersStorage()
+    _def_storage = RemindersStorage(db_file, journal_file)
+
+
+def close():
+    global _def_storage
+    if _def_storage is not None:
+        _def_storage.close()
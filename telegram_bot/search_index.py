@@ -0,0 +1,102 @@
+import bisect
+import collections
+import heapq
+import math
+import re
+import typing
+
+
+_T = typing.TypeVar('_T')
+
+_NOT_WORD = re.compile(r'[\W_]+')
+
+_SIMILAR_SHARE = 0.6  # share of query trigrams, which a similar name should contain
+
+
+def normalize(text: str) -> str:
+    # case and punctuation are ignored: 'Team.Liquid' is found by 'team liq'
+    return ' '.join(_NOT_WORD.sub(' ', text.casefold()).split())
+
+
+def _trigrams(text: str) -> typing.Set[str]:
+    padded = f' {text} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _prefix_range(sorted_keys: typing.List[str], prefix: str) -> typing.Iterator[int]:
+    for position in range(bisect.bisect_left(sorted_keys, prefix), len(sorted_keys)):
+        if not sorted_keys[position].startswith(prefix):
+            break
+        yield position
+
+
+class SearchIndex(typing.Generic[_T]):
+    def __init__(self, items: typing.Iterable[typing.Tuple[str, _T]]):
+        """
+        Finds items by name. Names starting with the query or having a word starting with it are found with
+        binary searches over sorted names and words, so a short query matching many names is as fast as a long one.
+        Names containing the query or similar to it (e.g. with a typo) are found with a trigram index.
+        Items of the same rank are ordered by name
+
+        :param items: (name, item) pairs
+        """
+        self._items: typing.List[_T] = []
+        self._names: typing.List[str] = []
+        names: typing.List[typing.Tuple[str, int]] = []
+        words: typing.List[typing.Tuple[str, int]] = []
+        trigrams: typing.Dict[str, typing.Set[int]] = collections.defaultdict(set)
+        for name, item in items:
+            index = len(self._items)
+            name = normalize(name)
+            self._items.append(item)
+            self._names.append(name)
+            names.append((name, index))
+            # the first word is a prefix of the name
+            words.extend((word, index) for word in set(name.split(' ')[1:]))
+            for trigram in _trigrams(name):
+                trigrams[trigram].add(index)
+        names.sort()
+        words.sort()
+        self._sorted_names = [name for name, _ in names]
+        self._sorted_name_items = [index for _, index in names]
+        self._sorted_words = [word for word, _ in words]
+        self._sorted_word_items = [index for _, index in words]
+        self._trigrams = {trigram: frozenset(indexes) for trigram, indexes in trigrams.items()}
+
+    def __len__(self):
+        return len(self._items)
+
+    def search(self, query: str, limit: int) -> typing.List[_T]:
+        query = normalize(query)
+        if query == '' or limit <= 0:
+            return []
+        found: typing.Dict[int, None] = dict()  # ordered set of item indexes
+
+        for position in _prefix_range(self._sorted_names, query):
+            found[self._sorted_name_items[position]] = None  # an exact match is the first one
+            if len(found) == limit:
+                return [self._items[index] for index in found]
+        for position in _prefix_range(self._sorted_words, query):
+            found[self._sorted_word_items[position]] = None
+            if len(found) == limit:
+                return [self._items[index] for index in found]
+
+        if len(query) >= 3:
+            # prefix matches are preferred, so the trigram index is only used when there are not enough of them
+            # a similar name has at least min_shared of the query trigrams, so it has one of the rarest
+            # len - min_shared + 1 of them. Candidates are collected from those and checked with the rest
+            postings = sorted((self._trigrams.get(trigram, frozenset()) for trigram in _trigrams(query)), key=len)
+            min_shared = math.ceil(len(postings) * _SIMILAR_SHARE)
+            rare_count = len(postings) - min_shared + 1
+            shared = collections.Counter()
+            for posting in postings[:rare_count]:
+                shared.update(posting)
+            candidates = shared.keys()
+            for posting in postings[rare_count:]:
+                shared.update(posting & candidates)
+            ranked = heapq.nsmallest(limit - len(found), (
+                (query not in self._names[index], -count / len(postings), self._names[index], index)
+                for index, count in shared.items() if count >= min_shared and index not in found))
+            for *_, index in ranked:
+                found[index] = None
+        return [self._items[index] for index in found]
@@ -0,0 +1,209 @@
+import asyncio
+import functools
+import hmac
+import json
+import logging
+import typing
+import telegram
+import telegram.ext
+import telegram_bot.config as config
+from telegram_bot.chat_partitioning import ChatOrderedProcessor, update_chat_key
+from dataclasses import dataclass
+
+
+_logger = logging.getLogger('webhook_server')
+
+
+_SECRET_TOKEN_HEADER = 'x-telegram-bot-api-secret-token'
+_MAX_HEADER_LINES = 100
+_DISCARD_CHUNK_BYTES = 64 * 1024
+_REASONS = {200: 'OK', 400: 'Bad Request', 403: 'Forbidden', 404: 'Not Found', 405: 'Method Not Allowed',
+            408: 'Request Timeout', 413: 'Payload Too Large', 431: 'Request Header Fields Too Large',
+            503: 'Service Unavailable'}
+
+
+@dataclass()
+class WebhookStats:
+    received: int = 0
+    processed: int = 0
+    failed: int = 0
+    rejected: int = 0  # bad secret token, bad payload or full queue
+
+
+class _BadRequest(Exception):
+    def __init__(self, status: int):
+        self.status = status
+
+
+class WebhookServer:
+    def __init__(self, application: telegram.ext.Application, secret_token: str,
+                 listen: str = config.WEBHOOK_LISTEN,
+                 port: int = config.WEBHOOK_PORT,
+                 url_path: str = config.WEBHOOK_URL_PATH,
+                 max_concurrent_updates: int = config.WEBHOOK_MAX_CONCURRENT_UPDATES,
+                 queue_size: int = config.WEBHOOK_QUEUE_SIZE,
+                 max_body_bytes: int = config.WEBHOOK_MAX_BODY_BYTES,
+                 read_timeout: float = config.WEBHOOK_READ_TIMEOUT_SECONDS,
+                 keep_alive_timeout: float = config.WEBHOOK_KEEP_ALIVE_TIMEOUT_SECONDS):
+        """
+        Minimal HTTP/1.1 server receiving telegram webhook updates. Updates are acknowledged as soon as they are
+        queued. Updates of different chats are processed concurrently, updates of a chat one by one in the order they
+        were received. When the queue is full telegram gets 503 and resends the update later
+
+        :param application: updates are passed to application.process_update
+        :param secret_token: expected X-Telegram-Bot-Api-Secret-Token header value
+        :param max_concurrent_updates: number of updates processed concurrently
+        :param queue_size: maximum number of received, but not processed updates
+        :param max_body_bytes: larger requests are rejected
+        :param read_timeout: seconds to receive a request after its first line, slower clients get 408
+        :param keep_alive_timeout: seconds to wait for the next request on a keep-alive connection
+        """
+        self._application = application
+        self._secret_token = secret_token.encode()
+        self._listen = listen
+        self._port = port
+        self._url_path = '/' + url_path.lstrip('/')
+        self._max_body_bytes = max_body_bytes
+        self._read_timeout = read_timeout
+        self._keep_alive_timeout = keep_alive_timeout
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self._server: typing.Optional[asyncio.AbstractServer] = None
+        self._processor = ChatOrderedProcessor(max_concurrent_updates)
+        self._dispatcher: typing.Optional[asyncio.Task] = None
+        self._stats = WebhookStats()
+
+    @property
+    def port(self) -> int:
+        # the actual port, if the server was started with port 0
+        return self._server.sockets[0].getsockname()[1] if self._server is not None else self._port
+
+    def stats(self) -> WebhookStats:
+        return WebhookStats(**vars(self._stats))
+
+    async def start(self):
+        self._dispatcher = asyncio.create_task(self._dispatch())
+        self._server = await asyncio.start_server(self._handle_connection, self._listen, self._port)
+        _logger.info(f'webhook server is listening on {self._listen}:{self.port}{self._url_path}')
+
+    async def stop(self):
+        # received updates are processed before the workers are stopped
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        await self._queue.join()
+        self._dispatcher.cancel()
+        await asyncio.gather(self._dispatcher, return_exceptions=True)
+        self._dispatcher = None
+
+    async def _dispatch(self):
+        while True:
+            update = await self._queue.get()
+            await self._processor.submit(update_chat_key(update), functools.partial(self._process_update, update))
+
+    async def _process_update(self, update: telegram.Update):
+        try:
+            await self._application.process_update(update)
+            self._stats.processed += 1
+        except Exception as e:
+            self._stats.failed += 1
+            _logger.error(f'failed to process update {update.update_id}', exc_info=e)
+        finally:
+            self._queue.task_done()
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            keep_alive = True
+            while keep_alive:
+                try:
+                    keep_alive, status = await self._handle_request(reader)
+                except _BadRequest as e:
+                    keep_alive, status = False, e.status
+                    self._stats.rejected += 1
+                if status is None:
+                    break  # the connection was closed by the client
+                writer.write(f'HTTP/1.1 {status} {_REASONS[status]}\r\nContent-Length: 0\r\n'
+                             f'Connection: {"keep-alive" if keep_alive else "close"}\r\n\r\n'.encode())
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            pass
+        finally:
+            writer.close()
+
+    async def _handle_request(self, reader: asyncio.StreamReader) -> typing.Tuple[bool, typing.Optional[int]]:
+        try:
+            request_line = await asyncio.wait_for(self._readline(reader, 400), self._keep_alive_timeout)
+        except asyncio.TimeoutError:
+            return False, None  # an idle connection is closed
+        if request_line == b'':
+            return False, None
+        try:
+            return await asyncio.wait_for(self._read_request(reader, request_line), self._read_timeout)
+        except asyncio.TimeoutError:
+            raise _BadRequest(408)
+
+    async def _read_request(self, reader: asyncio.StreamReader, request_line: bytes) \
+            -> typing.Tuple[bool, typing.Optional[int]]:
+        try:
+            method, path, version = request_line.decode('latin-1').split()
+        except ValueError:
+            raise _BadRequest(400)
+
+        headers = dict()
+        for _ in range(_MAX_HEADER_LINES):
+            line = await self._readline(reader, 431)
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        else:
+            raise _BadRequest(400)
+
+        content_length = headers.get('content-length', '0')
+        if not (content_length.isascii() and content_length.isdigit()):
+            raise _BadRequest(400)  # negative or not a number
+        content_length = int(content_length)
+        if content_length > self._max_body_bytes:
+            raise _BadRequest(413)
+        keep_alive = headers.get('connection', '').lower() != 'close' and version == 'HTTP/1.1'
+
+        # requests are checked before the body is read, so a body of a rejected request is not kept in memory
+        status = None
+        if path != self._url_path:
+            status = 404
+        elif method != 'POST':
+            status = 405
+        elif not hmac.compare_digest(headers.get(_SECRET_TOKEN_HEADER, '').encode(), self._secret_token):
+            _logger.warning('webhook request with a wrong secret token')
+            status = 403
+        if status is not None:
+            await self._discard(reader, content_length)  # the client sends the body before reading the response
+            raise _BadRequest(status)
+
+        body = await reader.readexactly(content_length)
+        try:
+            update = telegram.Update.de_json(json.loads(body), self._application.bot)
+        except (ValueError, TypeError, KeyError):
+            raise _BadRequest(400)
+
+        self._stats.received += 1
+        try:
+            self._queue.put_nowait(update)
+        except asyncio.QueueFull:
+            self._stats.rejected += 1
+            return keep_alive, 503
+        return keep_alive, 200
+
+    @staticmethod
+    async def _readline(reader: asyncio.StreamReader, too_long_status: int) -> bytes:
+        try:
+            return await reader.readline()
+        except ValueError:
+            raise _BadRequest(too_long_status)  # the line is longer than the reader limit
+
+    @staticmethod
+    async def _discard(reader: asyncio.StreamReader, length: int):
+        while length > 0:
+            chunk = await reader.read(min(length, _DISCARD_CHUNK_BYTES))
+            if chunk == b'':
+                return
+            length -= len(chunk)
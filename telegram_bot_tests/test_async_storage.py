@@ -0,0 +1,56 @@
+import asyncio
+import time
+import telegram_bot.reminders_storage as reminders_storage
+from telegram_bot.async_storage import DbExecutor, AsyncRemindersStorage
+
+_BULK_CHAT = 'test/async/bulk'
+_HANDLER_CHAT = 'test/async/handler'
+
+
+def _storage() -> reminders_storage.RemindersStorage:
+    # test_reminders_storage initializes the storage on import
+    if reminders_storage._def_storage is None:
+        reminders_storage.initialize()
+    return reminders_storage.storage()
+
+
+def test_facade():
+    async def run():
+        with DbExecutor() as executor:
+            rs = AsyncRemindersStorage(_storage, executor)
+            await rs.remove_all_reminders(_HANDLER_CHAT)
+            await rs.add_team_reminder(_HANDLER_CHAT, 'test_team1')
+            await rs.set_lead_times(_HANDLER_CHAT, [600])
+            assert await rs.get_reminders(_HANDLER_CHAT) == {reminders_storage.ChatReminder('team', 'test_team1')}
+            assert await rs.get_lead_times(_HANDLER_CHAT) == frozenset([600])
+            await rs.remove_all_reminders(_HANDLER_CHAT)
+
+    asyncio.run(run())
+
+
+def test_handlers_latency_during_bulk_write():
+    # handlers keep being served while a bulk write runs on the db executor
+    async def run():
+        with DbExecutor() as executor:
+            rs = AsyncRemindersStorage(_storage, executor)
+
+            def bulk_write():
+                storage = _storage()
+                for team in range(2000):
+                    storage.add_team_reminder(_BULK_CHAT, f'test_bulk_team{team}')
+
+            begin = time.perf_counter()
+            bulk = asyncio.ensure_future(executor.run(bulk_write))
+            latencies = []
+            while not bulk.done():
+                handler_begin = time.perf_counter()
+                await rs.get_lead_times(_HANDLER_CHAT)
+                latencies.append(time.perf_counter() - handler_begin)
+            await bulk
+            bulk_seconds = time.perf_counter() - begin
+            await rs.remove_all_reminders(_BULK_CHAT)
+            return bulk_seconds, latencies
+
+    bulk_seconds, latencies = asyncio.run(run())
+    assert len(latencies) >= 10
+    assert max(latencies) < bulk_seconds / 4
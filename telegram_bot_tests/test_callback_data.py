@@ -0,0 +1,78 @@
+import matches_data_loader
+from telegram_bot import callback_data
+from telegram_bot.callback_data import CallbackCodec
+
+
+def _set_data(monkeypatch, data_version, teams, tournaments=()):
+    monkeypatch.setattr(matches_data_loader, 'get_data_version', lambda: data_version)
+    monkeypatch.setattr(matches_data_loader, 'get_teams', lambda: {name: name for name in teams})
+    monkeypatch.setattr(matches_data_loader, 'get_tournaments', lambda: {name: name for name in tournaments})
+
+
+def test_encode_decode(monkeypatch):
+    long_name = 'A team with a very long name, which does not fit callback data limit at all'
+    _set_data(monkeypatch, 1, ['Team Spirit', long_name], ['The International 2023'])
+    codec = CallbackCodec()
+
+    data = codec.encode('follow_team', 'team', long_name)
+    assert len(data.encode()) <= 64
+    command, token = data.split(' ', 1)
+    assert command == 'fte'
+    assert codec.decode(token, 'team') == long_name
+    assert codec.decode(token, 'tournament') is None
+
+    token = codec.token('tournament', 'The International 2023')
+    assert codec.decode(token, 'tournament') == 'The International 2023'
+    # names outside of the data get ids on demand
+    assert codec.decode(codec.token('team', 'Old Team'), 'team') == 'Old Team'
+    assert codec.decode('garbage', 'team') is None
+    assert codec.decode('1zz.0', 'team') is None
+    assert codec.decode(token[:-len(token.split('.')[1])] + 'zz', 'team') is None
+
+
+def test_old_versions_expire(monkeypatch):
+    codec = CallbackCodec(keep_versions=2)
+    _set_data(monkeypatch, 1, ['Team Spirit'])
+    old_token = codec.token('team', 'Team Spirit')
+
+    _set_data(monkeypatch, 2, ['Team Liquid', 'Team Spirit'])
+    assert codec.token('team', 'Team Spirit') != old_token
+    assert codec.decode(old_token, 'team') == 'Team Spirit'
+
+    _set_data(monkeypatch, 3, ['Team Spirit'])
+    codec.registry()
+    assert codec.decode(old_token, 'team') is None
+
+
+def test_tokens_issued_before_restart_are_rejected(monkeypatch):
+    _set_data(monkeypatch, 1, ['Team Spirit', 'Team Liquid'])
+    epochs = iter(['aaaa', 'bbbb'])
+    monkeypatch.setattr(callback_data, '_new_epoch', lambda: next(epochs))
+    codec = CallbackCodec()
+    on_demand_token = codec.token('team', 'Old Team')
+    data_token = codec.token('team', 'Team Spirit')
+
+    # the data version and the short ids are the same in a restarted process
+    restarted = CallbackCodec()
+    restarted.token('team', 'Another Old Team')
+    assert restarted.decode(on_demand_token, 'team') is None
+    assert restarted.decode(data_token, 'team') is None
+    assert restarted.decode(restarted.token('team', 'Team Spirit'), 'team') == 'Team Spirit'
+
+
+def test_stable_tokens(monkeypatch):
+    _set_data(monkeypatch, 1, ['Team Spirit'], ['The International'])
+    data = CallbackCodec(keep_versions=2).encode('follow_team', 'team', 'Team Spirit', stable=True)
+    assert len(data.encode()) <= 64
+    token = data.split(' ', 1)[1]
+
+    # decoded by a restarted process after many data updates, while the team is in the data
+    _set_data(monkeypatch, 100, ['Team Liquid', 'Team Spirit'], ['The International'])
+    codec = CallbackCodec(keep_versions=2)
+    assert codec.decode(token, 'team') == 'Team Spirit'
+    assert codec.decode(token, 'tournament') is None
+    assert codec.decode(codec.stable_token('tournament', 'The International'), 'tournament') == 'The International'
+    assert codec.decode(codec.stable_token('team', 'Old Team'), 'team') is None
+
+    _set_data(monkeypatch, 101, ['Team Liquid'])
+    assert codec.decode(token, 'team') is None
@@ -0,0 +1,60 @@
+import asyncio
+import types
+from telegram_bot.callback_router import CallbackRouter
+
+
+def _update(data: str):
+    return types.SimpleNamespace(callback_query=types.SimpleNamespace(data=data, id=1),
+                                 effective_chat=types.SimpleNamespace(id=42))
+
+
+def test_dispatch():
+    lang_calls = []
+
+    async def get_lang(update):
+        lang_calls.append(update)
+        return 'en'
+
+    router = CallbackRouter(get_lang)
+    handled = []
+
+    @router.route('fte')
+    async def follow_team(ctx):
+        handled.append(('fte', ctx.arguments, await ctx.lang(), await ctx.lang(), ctx.chat_id))
+
+    @router.route('s tl')
+    async def settings_language(ctx):
+        handled.append(('s tl', ctx.arguments))
+
+    @router.route('s cl')
+    async def settings_change_lang(ctx):
+        handled.append(('s cl', ctx.arguments))
+
+    async def run():
+        for data in ['fte', 'fte 12.a', 's tl', 's cl ru', 'unknown', 's unknown']:
+            assert await router.dispatch(_update(data), None) == (data not in ('unknown', 's unknown'))
+
+    asyncio.run(run())
+    assert handled == [('fte', '', 'en', 'en', '42'), ('fte', '12.a', 'en', 'en', '42'), ('s tl', ''),
+                       ('s cl', 'ru')]
+    assert len(lang_calls) == 2  # once per update
+    assert router.stats()['fte'].calls == 2
+    assert router.stats()['s cl'].calls == 1
+
+
+def test_errors_are_counted():
+    async def get_lang(update):
+        return 'en'
+
+    router = CallbackRouter(get_lang)
+
+    @router.route('x')
+    async def fail(ctx):
+        raise ValueError()
+
+    try:
+        asyncio.run(router.dispatch(_update('x 1'), None))
+        assert False
+    except ValueError:
+        pass
+    assert (router.stats()['x'].calls, router.stats()['x'].errors) == (1, 1)
@@ -0,0 +1,42 @@
+import asyncio
+import types
+from telegram_bot.chat_partitioning import ChatOrderedProcessor, update_chat_key, worker_index
+
+
+def test_update_chat_key():
+    user = types.SimpleNamespace(id=7)
+    assert update_chat_key(types.SimpleNamespace(effective_chat=types.SimpleNamespace(id=-100), effective_user=user)) \
+        == -100
+    assert update_chat_key(types.SimpleNamespace(effective_chat=None, effective_user=user)) == 7
+    assert update_chat_key(types.SimpleNamespace(effective_chat=None, effective_user=None)) == 0
+    assert {worker_index(chat_key, 4) for chat_key in range(-10, 10)} == {0, 1, 2, 3}
+
+
+def test_chat_updates_are_ordered():
+    processed = []
+    running = set()
+    max_running = []
+
+    def update(chat_key: int, number: int, delay: float, fail: bool = False):
+        async def process():
+            running.add((chat_key, number))
+            max_running.append(len(running))
+            await asyncio.sleep(delay)
+            running.discard((chat_key, number))
+            processed.append((chat_key, number))
+            if fail:
+                raise ValueError()
+        return process
+
+    async def run():
+        processor = ChatOrderedProcessor(max_pending=10)
+        await processor.submit(1, update(1, 0, 0.05, fail=True))
+        await processor.submit(1, update(1, 1, 0.0))
+        await processor.submit(2, update(2, 0, 0.01))
+        await processor.submit(1, update(1, 2, 0.01))
+        await processor.join()
+
+    asyncio.run(run())
+    assert [number for chat_key, number in processed if chat_key == 1] == [0, 1, 2]  # a failure doesn't stop the chat
+    assert processed[0] == (2, 0)  # other chats are not blocked by a slow update
+    assert max(max_running) == 2
@@ -0,0 +1,31 @@
+import telegram_bot.chat_settings as chat_settings
+
+_CHAT_1 = 'test/chat/1/id'
+_CHAT_2 = 'test/chat/2/id'
+_CHAT_3 = 'test/chat/3/id'
+_KEY = 'test_key'
+
+
+def test_set_get():
+    s = chat_settings.storage()
+    s.set(_CHAT_1, _KEY, 'value1')
+    s.set(_CHAT_1, _KEY, 'value2')
+    s.set(_CHAT_2, _KEY, 'value3')
+    assert s.get(_CHAT_1, _KEY) == 'value2'
+    assert s.get(_CHAT_2, _KEY) == 'value3'
+    assert s.get(_CHAT_3, _KEY, 'default') == 'default'
+    assert s.get_many([_CHAT_1, _CHAT_2, _CHAT_3], _KEY) == {_CHAT_1: 'value2', _CHAT_2: 'value3'}
+
+    rows = chat_settings._ChatSetting.select().where(
+        (chat_settings._ChatSetting.chat_id == _CHAT_1) & (chat_settings._ChatSetting.setting_key == _KEY))
+    assert [row.setting_value for row in rows] == ['value2']
+
+
+def test_set_does_not_change_other_chats():
+    s = chat_settings.storage()
+    s.set(_CHAT_1, _KEY, 'value1')
+    s.set(_CHAT_2, _KEY, 'value2')
+    s.set(_CHAT_2, _KEY, 'value3')
+    s._cache.clear()
+    assert s.get(_CHAT_1, _KEY) == 'value1'
+    assert s.get(_CHAT_2, _KEY) == 'value3'
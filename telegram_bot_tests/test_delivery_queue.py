@@ -0,0 +1,87 @@
+import asyncio
+import time
+import telegram
+from telegram_bot.delivery_queue import DeliveryQueue
+
+
+def _run(queue: DeliveryQueue, fill):
+    async def run():
+        queue.start()
+        fill()
+        await queue.join()
+        await queue.stop()
+    asyncio.run(run())
+
+
+def test_priority_order():
+    queue = DeliveryQueue(concurrency=1, global_rate=1000, chat_interval=0, group_interval=0)
+    sent = []
+
+    def send(chat_id):
+        async def impl():
+            sent.append(chat_id)
+        return impl
+
+    def fill():
+        for chat_id, priority in [(1, 30.0), (2, 10.0), (3, 20.0)]:
+            queue.enqueue(chat_id, send(chat_id), priority)
+
+    _run(queue, fill)
+    assert sent == [2, 3, 1]
+    assert queue.stats().sent == 3
+
+
+def test_enqueue_before_start():
+    queue = DeliveryQueue(concurrency=2, global_rate=1000, chat_interval=0, group_interval=0)
+    sent = []
+
+    async def send():
+        sent.append(1)
+
+    queue.enqueue(1, send)
+    assert queue.queue_depth() == 1
+    _run(queue, lambda: None)
+    assert sent == [1]
+
+
+def test_retry_after_is_honoured():
+    queue = DeliveryQueue(concurrency=4, global_rate=1000, chat_interval=0, group_interval=0)
+    attempts = []
+
+    async def send():
+        attempts.append(time.monotonic())
+        if len(attempts) == 1:
+            raise telegram.error.RetryAfter(1)
+
+    _run(queue, lambda: queue.enqueue(1, send))
+    assert len(attempts) == 2
+    assert attempts[1] - attempts[0] >= 0.9
+    stats = queue.stats()
+    assert (stats.sent, stats.retried, stats.failed, stats.queue_depth) == (1, 1, 0, 0)
+
+
+def test_per_chat_interval():
+    queue = DeliveryQueue(concurrency=4, global_rate=1000, chat_interval=0.3, group_interval=0.3)
+    sent = []
+
+    async def send():
+        sent.append(time.monotonic())
+
+    def fill():
+        for _ in range(3):
+            queue.enqueue(1, send)
+
+    _run(queue, fill)
+    assert len(sent) == 3
+    assert sent[2] - sent[0] >= 0.55
+
+
+def test_bad_request_is_not_retried():
+    queue = DeliveryQueue(concurrency=1, global_rate=1000, chat_interval=0, group_interval=0)
+
+    async def send():
+        raise telegram.error.BadRequest('chat not found')
+
+    _run(queue, lambda: queue.enqueue(1, send))
+    stats = queue.stats()
+    assert (stats.sent, stats.retried, stats.failed) == (0, 0, 1)
@@ -0,0 +1,110 @@
+import asyncio
+import dataclasses
+import datetime
+import io
+import threading
+import types
+from PIL import Image
+import matches_data_loader
+from telegram_bot import match_cards
+
+
+def _icon(color) -> bytes:
+    output = io.BytesIO()
+    Image.new('RGBA', (300, 150), color).save(output, format='PNG')
+    return output.getvalue()
+
+
+def _match() -> matches_data_loader.Dota2Match:
+    start_time = datetime.datetime.now(tz=datetime.timezone.utc) + datetime.timedelta(hours=1)
+    return matches_data_loader.Dota2Match(
+        matches_data_loader.Dota2Team('Team Spirit', None, '/dota2/Team_Spirit', '/icons/spirit.png'),
+        None,
+        matches_data_loader.TournamentInfo('The International', '/dota2/TI', 'Tier 1', None, None, None, None,
+                                           '/icons/ti.png'),
+        [], None, 'Bo3', start_time, 1)
+
+
+def test_render_card(tmp_path):
+    file = str(tmp_path / 'card.png')
+    match_cards.render_card(match_cards.CardContent('Team Spirit', 'TBD', 'The International ' * 10,
+                                                    'starts at 18:00, 21.10 UTC', _icon('red'), None, b'not an image'),
+                            file)
+    with Image.open(file) as card:
+        assert card.size == match_cards._CARD_SIZE
+
+
+class _Bot:
+    def __init__(self):
+        self.uploads = 0
+        self.sent = []
+
+    async def send_photo(self, chat_id, photo, caption, reply_markup, parse_mode):
+        if not isinstance(photo, str):
+            self.uploads += 1
+            await asyncio.sleep(0.05)
+        self.sent.append((chat_id, caption))
+        return types.SimpleNamespace(photo=[types.SimpleNamespace(file_id='small'),
+                                            types.SimpleNamespace(file_id='file_id')])
+
+
+def test_card_is_rendered_and_uploaded_once(tmp_path):
+    icons = []
+
+    def get_icon(icon_path: str) -> bytes:
+        icons.append(icon_path)
+        return _icon('blue')
+
+    async def run():
+        cards = match_cards.MatchCards(cards_dir=str(tmp_path), get_icon=get_icon)
+        cards.start()
+        match = _match()
+        assert cards.ready_card(match, 'en') is None  # rendering is started
+        cards.prepare(match, 'ru')
+        while len(cards._preparing) != 0:
+            await asyncio.sleep(0.05)
+        card = cards.ready_card(match, 'en')
+        assert card is not None and card == cards.ready_card(match, 'de')  # the same phrases as en
+
+        bot = _Bot()
+        await asyncio.gather(*[cards.send(bot, chat_id, card, 'text', None) for chat_id in range(10)])
+        await cards.stop()
+        return bot
+
+    bot = asyncio.run(run())
+    assert sorted(icons) == ['/icons/spirit.png', '/icons/ti.png']  # icons are cached between cards
+    assert bot.uploads == 1
+    assert sorted(chat_id for chat_id, _ in bot.sent) == list(range(10))
+    with open(next(tmp_path.glob('*.file_id'))) as f:
+        assert f.read() == 'file_id'
+
+
+def test_sending_does_not_wait_for_icon_downloads(tmp_path):
+    downloads_released = threading.Event()
+
+    def get_icon(icon_path: str) -> bytes:
+        if icon_path == '/icons/slow.png':
+            downloads_released.wait()  # a download waiting for the liquipedia rate limit
+        return _icon('blue')
+
+    async def run():
+        cards = match_cards.MatchCards(cards_dir=str(tmp_path), get_icon=get_icon)
+        cards.start()
+        match = _match()
+        cards.prepare(match, 'en')
+        while len(cards._preparing) != 0:
+            await asyncio.sleep(0.05)
+        slow_match = dataclasses.replace(match, team2=dataclasses.replace(match.team1, icon='/icons/slow.png'))
+        cards.prepare(slow_match, 'en')
+        await asyncio.sleep(0.05)
+
+        bot = _Bot()
+        try:
+            sent = await asyncio.wait_for(cards.send(bot, 1, cards.ready_card(match, 'en'), 'text', None), 5)
+            await asyncio.wait_for(cards.cleanup(), 5)
+        finally:
+            downloads_released.set()
+        await cards.stop()
+        return sent
+
+    assert asyncio.run(run()) is not None
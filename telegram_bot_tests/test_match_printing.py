@@ -0,0 +1,21 @@
+import matches_data_loader
+from telegram_bot import match_printing
+
+
+def test_escape():
+    s = 'a_b*c[d]e(f)g~h`i>j#k+l-m=n|o{p}q.r!s\\t'
+    expected = s
+    for c in '_*[]()~`>#+-=|{}.!':
+        expected = expected.replace(c, '\\' + c)
+    assert match_printing.escape(s) == expected
+
+
+def test_match_message():
+    tournament = matches_data_loader.TournamentInfo('PGL Wallachia - Season 2', '/dota2/PGL', 'Tier 1',
+                                                    None, None, None, None)
+    match = matches_data_loader.Dota2Match(matches_data_loader.Dota2Team('Team.Liquid', None, '/dota2/Liquid', ''),
+                                           None, tournament, [], (1, 0), 'Bo3', None, 1)
+    assert match_printing._match_message('en', match) == \
+        'Match *Team\\.Liquid* ||1:0|| TBD \\(Bo3\\)\n🔴 match is live\nTournament: "PGL Wallachia \\- Season 2", tier 1 🥇'
+    tournament.tier = 'Qualifier'
+    assert match_printing._match_message('en', match).endswith('"PGL Wallachia \\- Season 2"')
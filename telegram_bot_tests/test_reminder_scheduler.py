@@ -0,0 +1,39 @@
+from telegram_bot.reminder_scheduler import ReminderScheduler
+
+
+def test_pop_due_order():
+    scheduler = ReminderScheduler()
+    scheduler.schedule(1, 30.0)
+    scheduler.schedule(2, 10.0)
+    scheduler.schedule(3, 20.0)
+    assert scheduler.next_due() == 10.0
+    assert scheduler.pop_due(5.0) == []
+    assert scheduler.pop_due(25.0) == [2, 3]
+    assert scheduler.pop_due(100.0) == [1]
+    assert scheduler.next_due() is None
+    assert len(scheduler) == 0
+
+
+def test_reschedule_and_cancel():
+    scheduler = ReminderScheduler()
+    scheduler.schedule(1, 30.0)
+    scheduler.schedule(2, 20.0)
+    scheduler.schedule(1, 10.0)  # match start time moved earlier
+    scheduler.schedule(2, 40.0)
+    scheduler.schedule(2, 20.0)
+    assert scheduler.next_due() == 10.0
+    assert scheduler.pop_due(15.0) == [1]
+    assert scheduler.pop_due(35.0) == [2]
+
+    scheduler.schedule(3, 50.0)
+    scheduler.cancel(3)
+    assert 3 not in scheduler
+    assert scheduler.pop_due(100.0) == []
+
+
+def test_stale_entries_are_compacted():
+    scheduler = ReminderScheduler()
+    for due in range(1000):
+        scheduler.schedule(1, float(due))
+    assert len(scheduler._heap) < 100
+    assert scheduler.pop_due(1000.0) == [1]
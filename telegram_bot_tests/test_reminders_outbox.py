@@ -0,0 +1,56 @@
+import os
+import datetime
+import tempfile
+import matches_data_loader
+import telegram_bot.reminders_outbox as reminders_outbox
+
+_KEY_1 = '/dota2/Tournament|/dota2/Team1|/dota2/Team2|Bo3|1792000000'
+_KEY_2 = '/dota2/Tournament|/dota2/Team3|TBD|Bo1|1792003600'
+
+
+def test_outbox():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        outbox = reminders_outbox.RemindersOutbox(os.path.join(tmp_dir, 'outbox.db'), ack_batch=2)
+        assert outbox.add(_KEY_1, {600: ['1', '2'], 3600: ['2']}) == {'1': [600], '2': [600, 3600]}
+        assert outbox.add(_KEY_1, {600: ['1', '3']}) == {'3': [600]}  # adding a reminder again is a no-op
+        assert outbox.add(_KEY_2, {0: ['1']}) == {'1': [0]}
+
+        outbox.ack_sent(_KEY_1, '1', [600])
+        outbox.ack_failed(_KEY_1, '2', [600, 3600])
+        outbox.flush()
+        assert outbox.pending() == {_KEY_1: {'3': [600]}, _KEY_2: {'1': [0]}}
+
+        outbox.expire(_KEY_2)
+        assert outbox.pending() == {_KEY_1: {'3': [600]}}
+        assert outbox.add(_KEY_2, {0: ['1']}) == {}
+
+        outbox.cleanup(older_than=0)
+        assert outbox.pending() == {_KEY_1: {'3': [600]}}
+
+
+def test_outbox_many_reminders():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        outbox = reminders_outbox.RemindersOutbox(os.path.join(tmp_dir, 'outbox.db'))
+        chats = [str(chat_id) for chat_id in range(20000)]
+        assert len(outbox.add(_KEY_1, {600: chats})) == len(chats)
+        for chat_id in chats:
+            outbox.ack_sent(_KEY_1, chat_id, [600])
+        outbox.flush()
+        assert outbox.pending() == {}
+
+
+def test_tbd_matches_have_different_keys():
+    tournament = matches_data_loader.TournamentInfo('Tournament', '/dota2/Tournament', 'Tier 1', None, None, None, None)
+    start_time = datetime.datetime(2026, 10, 20, 12, tzinfo=datetime.timezone.utc)
+    playoff = [matches_data_loader.Dota2Match(None, None, tournament, [], None, 'Bo3',
+                                              start_time + datetime.timedelta(hours=hours), match_id)
+               for match_id, hours in enumerate([0, 3])]
+    keys = [reminders_outbox.match_key(match) for match in playoff]
+    assert keys[0] != keys[1]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        outbox = reminders_outbox.RemindersOutbox(os.path.join(tmp_dir, 'outbox.db'))
+        assert outbox.add(keys[0], {600: ['1']}) == {'1': [600]}
+        outbox.ack_sent(keys[0], '1', [600])
+        outbox.flush()
+        assert outbox.add(keys[1], {600: ['1']}) == {'1': [600]}  # the second match is reminded about too
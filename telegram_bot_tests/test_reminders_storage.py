@@ -1,5 +1,4 @@
 import telegram_bot.reminders_storage as reminders_storage
-import pytest
 
 reminders_storage.initialize()
 
@@ -13,7 +12,6 @@ _MATCH_3 = reminders_storage.MatchDescriptor('test_team1', 'test_team2', 'test_t
 _MATCH_4 = reminders_storage.MatchDescriptor(None, 'test_team2', 'test_tournament1')
 
 
-@pytest.mark.skip('TODO rewrite for db storage')
 def test_reminders_storage():
     rs = reminders_storage.storage()
     rs.remove_all_reminders(_USER_1)
@@ -74,3 +72,152 @@ def test_reminders_storage():
     assert ((rs.get_reminded_chat_ids(_MATCH_2)) == set())
     assert ((rs.get_reminded_chat_ids(_MATCH_3)) == set())
     assert ((rs.get_reminded_chat_ids(_MATCH_4)) == set())
+
+
+def test_reminders_index_consistency():
+    rs = reminders_storage.storage()
+    rs.remove_all_reminders(_USER_3)
+    rs.add_team_reminder(_USER_3, 'test_team3')
+    assert rs.check_index_consistency()
+
+    reminders_storage._Reminder.delete().where(reminders_storage._Reminder.chat == _USER_3).execute()
+    assert not rs.check_index_consistency()
+    assert rs.get_reminders(_USER_3) == set()
+    assert rs.check_index_consistency()
+
+
+def test_lead_times():
+    rs = reminders_storage.storage()
+    default_lead_time = reminders_storage.config.REMINDER_DEFAULT_LEAD_TIME_SECONDS
+    rs.remove_all_reminders(_USER_1)
+    rs.remove_all_reminders(_USER_2)
+    rs.set_lead_times(_USER_1, [default_lead_time])
+    rs.set_lead_times(_USER_2, [default_lead_time])
+    rs.add_tournament_reminder(_USER_1, 'test_tournament1')
+    rs.add_tournament_reminder(_USER_2, 'test_tournament1')
+    assert rs.get_lead_times(_USER_1) == {default_lead_time}
+
+    rs.set_lead_times(_USER_2, [0, 3600])
+    assert rs.get_lead_times(_USER_2) == {0, 3600}
+    assert rs.get_reminded_chat_ids(_MATCH_1, default_lead_time) == {_USER_1}
+    assert rs.get_reminded_chat_ids(_MATCH_1, 3600) == {_USER_2}
+    assert rs.get_reminded_chat_ids(_MATCH_1, 0) == {_USER_2}
+    assert rs.get_reminded_chat_ids(_MATCH_1, 900) == set()
+    assert rs.get_reminded_chat_ids(_MATCH_1) == {_USER_1, _USER_2}
+    assert rs.check_index_consistency()
+
+    rs.set_lead_times(_USER_2, [default_lead_time])
+    rs.remove_all_reminders(_USER_1)
+    rs.remove_all_reminders(_USER_2)
+
+
+def _db_reminders(chat_id: str):
+    q = reminders_storage._Reminder.select(reminders_storage._Reminder.type, reminders_storage._Reminder.value)
+    return set(q.where(reminders_storage._Reminder.chat == chat_id).tuples())
+
+
+def test_mutations_are_written_in_batches():
+    rs = reminders_storage.storage()
+    rs.remove_all_reminders(_USER_3)
+    rs.flush()
+    rs.add_team_reminder(_USER_3, 'test_team1')
+    rs.add_team_reminder(_USER_3, 'test_team2')
+    rs.remove_team_reminder(_USER_3, 'test_team1')
+    assert rs.get_reminders(_USER_3) == {reminders_storage.ChatReminder('team', 'test_team2')}  # acknowledged at once
+    rs.flush()
+    assert _db_reminders(_USER_3) == {('team', 'test_team2')}
+    rs.remove_all_reminders(_USER_3)
+    rs.flush()
+    assert _db_reminders(_USER_3) == set()
+
+
+def test_journal_replay(tmp_path):
+    # mutations, which were journaled, but not written to the db before a crash
+    journal = reminders_storage._MutationsJournal(str(tmp_path / 'reminders.journal'))
+    journal.append(['add', _USER_3, 'team', 'test_team1'])
+    journal.append(['add', _USER_3, 'tournament', 'test_tournament1'])
+    journal.rotate()  # the crash happened while the batch was written
+    journal.append(['remove', _USER_3, 'team', 'test_team1'])
+    journal.append(['lead_times', _USER_3, [0, 600]])
+    journal.close()
+    with open(tmp_path / 'reminders.journal', 'a') as stream:
+        stream.write('["add", "partially written')
+
+    replayed = reminders_storage._MutationsJournal(str(tmp_path / 'reminders.journal')).replay()
+    assert len(replayed) == 4
+    for _ in range(2):  # a batch may have been written before the crash
+        reminders_storage._apply_mutations(replayed)
+        assert _db_reminders(_USER_3) == {('tournament', 'test_tournament1')}
+
+    rs = reminders_storage.storage()
+    rs.reload()
+    assert rs.get_reminders(_USER_3) == {reminders_storage.ChatReminder('tournament', 'test_tournament1')}
+    assert rs.get_lead_times(_USER_3) == {0, 600}
+    rs.remove_all_reminders(_USER_3)
+    rs.set_lead_times(_USER_3, [reminders_storage.config.REMINDER_DEFAULT_LEAD_TIME_SECONDS])
+    rs.flush()
+
+
+def test_stats_are_maintained():
+    rs = reminders_storage.storage()
+    for user in (_USER_1, _USER_2, _USER_3):
+        rs.remove_all_reminders(user)
+    before = rs.get_stats()
+
+    rs.add_team_reminder(_USER_1, 'test_stats_team1')
+    rs.add_team_reminder(_USER_2, 'test_stats_team1')
+    rs.add_team_reminder(_USER_2, 'test_stats_team2')
+    rs.add_tournament_reminder(_USER_3, 'test_stats_tournament')
+    rs.add_all_reminder(_USER_3)
+    stats = rs.get_stats(top_size=1000)
+    assert stats.active_team_reminders == before.active_team_reminders + 3
+    assert stats.active_tournament_reminders == before.active_tournament_reminders + 1
+    assert stats.active_all_reminders == before.active_all_reminders + 1
+    assert ('test_stats_team1', 2) in stats.top_followed_teams
+    assert ('test_stats_team2', 1) in stats.top_followed_teams
+    assert len(rs.get_stats(top_size=1).top_followed_teams) == 1
+
+    rs.remove_team_reminder(_USER_2, 'test_stats_team1')
+    rs.remove_all_reminders(_USER_3)
+    stats = rs.get_stats(top_size=1000)
+    assert ('test_stats_team1', 1) in stats.top_followed_teams
+    assert stats.active_tournament_reminders == before.active_tournament_reminders
+    assert stats.active_all_reminders == before.active_all_reminders
+    assert stats.unique_chats == reminders_storage._Chat.select().count()
+
+    rs.remove_all_reminders(_USER_1)
+    rs.remove_all_reminders(_USER_2)
+    stats = rs.get_stats(top_size=1000)
+    assert all(name not in ('test_stats_team1', 'test_stats_team2') for name, _ in stats.top_followed_teams)
+    assert stats.active_team_reminders == before.active_team_reminders
+
+
+def test_cut_names_are_restored():
+    rs = reminders_storage.storage()
+    for user in (_USER_1, _USER_2):
+        rs.remove_all_reminders(user)
+    rs.flush()
+    team = 'Test Team With A Very Long Name, Longer Than Fifty Characters'
+    tournament = 'Test Tournament With A Very Long Name, Longer Than Fifty Characters'
+    ambiguous = ['Test Ambiguous Tournament With A Very Long Name 2025',
+                 'Test Ambiguous Tournament With A Very Long Name 2026']
+    # reminders stored before names stopped being cut
+    reminders_storage._apply_mutations([['add', _USER_1, 'team', team[:50]], ['add', _USER_2, 'team', team[:50]],
+                                        ['add', _USER_2, 'team', team],
+                                        ['add', _USER_1, 'tournament', tournament[:50]],
+                                        ['add', _USER_2, 'tournament', ambiguous[0][:50]]])
+    rs.reload()
+    match = reminders_storage.MatchDescriptor(team, None, tournament)
+    assert rs.get_reminded_chat_ids(match) == {_USER_2}
+
+    assert rs.restore_cut_names(['test_team1', team], [tournament] + ambiguous) == 3
+    assert rs.get_reminded_chat_ids(match) == {_USER_1, _USER_2}
+    rs.flush()
+    assert _db_reminders(_USER_1) == {('team', team), ('tournament', tournament)}
+    assert _db_reminders(_USER_2) == {('team', team), ('tournament', ambiguous[0][:50])}
+    assert rs.check_index_consistency()
+    assert rs.restore_cut_names(['test_team1', team], [tournament] + ambiguous) == 0
+
+    for user in (_USER_1, _USER_2):
+        rs.remove_all_reminders(user)
+    rs.flush()
@@ -0,0 +1,30 @@
+from telegram_bot.search_index import SearchIndex, normalize
+
+
+_NAMES = ['Team Spirit', 'Team Liquid', 'Team.Liquid Academy', 'Spirit', 'Natus Vincere', 'Gaimin Gladiators',
+          'The International 2024', 'PGL Wallachia Season 2']
+
+
+def _index() -> SearchIndex[str]:
+    return SearchIndex((name, name) for name in _NAMES)
+
+
+def test_normalize():
+    assert normalize('  Team.Liquid_Academy!! ') == 'team liquid academy'
+    assert normalize('ÉCLAIR') == 'éclair'
+
+
+def test_prefixes_are_found_first():
+    index = _index()
+    assert index.search('spirit', 10) == ['Spirit', 'Team Spirit']  # the exact name, then a word prefix
+    assert index.search('Team LIQ', 10) == ['Team Liquid', 'Team.Liquid Academy']
+    assert index.search('team', 2) == ['Team Liquid', 'Team.Liquid Academy']  # ordered by name
+    assert index.search('wallachia', 10) == ['PGL Wallachia Season 2']
+    assert index.search('', 10) == []
+
+
+def test_substrings_and_typos_are_found():
+    index = _index()
+    assert index.search('ternation', 10) == ['The International 2024']
+    assert index.search('gladiatrs', 10) == ['Gaimin Gladiators']
+    assert index.search('xyz', 10) == []
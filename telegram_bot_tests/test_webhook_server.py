@@ -0,0 +1,153 @@
+import asyncio
+import json
+import httpx
+import telegram
+from telegram_bot.webhook_server import WebhookServer
+
+
+_SECRET = 'secret'
+
+# recorded update of /matches command
+_MATCHES_UPDATE = {
+    'update_id': 10001,
+    'message': {
+        'message_id': 17,
+        'from': {'id': 42, 'is_bot': False, 'first_name': 'User', 'language_code': 'en'},
+        'chat': {'id': 42, 'first_name': 'User', 'type': 'private'},
+        'date': 1700000000,
+        'text': '/matches',
+        'entities': [{'offset': 0, 'length': 8, 'type': 'bot_command'}]
+    }
+}
+
+
+class _Application:
+    def __init__(self):
+        self.bot = telegram.Bot('123:TOKEN')
+        self.updates = []
+
+    async def process_update(self, update: telegram.Update):
+        await asyncio.sleep(0.01)
+        self.updates.append(update)
+
+
+def _run(check, **server_kwargs):
+    async def run():
+        application = _Application()
+        server = WebhookServer(application, _SECRET, listen='127.0.0.1', port=0, url_path='/telegram',
+                               **server_kwargs)
+        await server.start()
+        try:
+            async with httpx.AsyncClient(base_url=f'http://127.0.0.1:{server.port}') as client:
+                await check(client)
+        finally:
+            await server.stop()
+        return application, server
+
+    return asyncio.run(run())
+
+
+def test_updates_are_processed():
+    async def check(client):
+        for update_id in range(5):
+            payload = dict(_MATCHES_UPDATE, update_id=update_id)
+            response = await client.post('/telegram', content=json.dumps(payload),
+                                         headers={'X-Telegram-Bot-Api-Secret-Token': _SECRET})
+            assert response.status_code == 200
+
+    application, server = _run(check)
+    assert sorted(update.update_id for update in application.updates) == list(range(5))
+    assert application.updates[0].message.text == '/matches'
+    assert server.stats().processed == 5
+
+
+def test_updates_of_a_chat_are_processed_in_order():
+    class Application(_Application):
+        async def process_update(self, update: telegram.Update):
+            await asyncio.sleep(0.2 if update.update_id == 0 else 0.01)  # the first update is the slowest
+            self.updates.append(update)
+
+    async def run():
+        application = Application()
+        server = WebhookServer(application, _SECRET, listen='127.0.0.1', port=0, url_path='/telegram')
+        await server.start()
+        async with httpx.AsyncClient(base_url=f'http://127.0.0.1:{server.port}') as client:
+            for update_id, chat_id in enumerate([42, 42, 42, 43]):
+                message = dict(_MATCHES_UPDATE['message'], chat=dict(_MATCHES_UPDATE['message']['chat'], id=chat_id))
+                payload = dict(_MATCHES_UPDATE, update_id=update_id, message=message)
+                await client.post('/telegram', content=json.dumps(payload),
+                                  headers={'X-Telegram-Bot-Api-Secret-Token': _SECRET})
+        await server.stop()
+        return application
+
+    application = asyncio.run(run())
+    # the other chat is not waiting for the slow update
+    assert [update.update_id for update in application.updates] == [3, 0, 1, 2]
+
+
+def test_bad_requests_are_rejected():
+    async def check(client):
+        body = json.dumps(_MATCHES_UPDATE)
+        response = await client.post('/telegram', content=body, headers={'X-Telegram-Bot-Api-Secret-Token': 'x'})
+        assert response.status_code == 403
+        response = await client.post('/telegram', content=body)
+        assert response.status_code == 403
+        response = await client.post('/other', content=body, headers={'X-Telegram-Bot-Api-Secret-Token': _SECRET})
+        assert response.status_code == 404
+        response = await client.post('/telegram', content='{', headers={'X-Telegram-Bot-Api-Secret-Token': _SECRET})
+        assert response.status_code == 400
+
+    application, server = _run(check)
+    assert len(application.updates) == 0
+    assert server.stats().rejected == 4
+
+
+def test_full_queue():
+    async def check(client):
+        statuses = []
+        for update_id in range(10):
+            response = await client.post('/telegram', content=json.dumps(dict(_MATCHES_UPDATE, update_id=update_id)),
+                                         headers={'X-Telegram-Bot-Api-Secret-Token': _SECRET})
+            statuses.append(response.status_code)
+        assert 503 in statuses
+
+    application, server = _run(check, max_concurrent_updates=1, queue_size=2)
+    assert len(application.updates) == server.stats().received - server.stats().rejected
+
+
+async def _raw_request(port: int, request: bytes) -> bytes:
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(request)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    return response
+
+
+def test_malformed_and_slow_requests_are_rejected():
+    async def run():
+        server = WebhookServer(_Application(), _SECRET, listen='127.0.0.1', port=0, url_path='/telegram',
+                               read_timeout=0.2, keep_alive_timeout=0.2)
+        await server.start()
+        try:
+            headers = f'POST /telegram HTTP/1.1\r\nX-Telegram-Bot-Api-Secret-Token: {_SECRET}\r\n'
+            for content_length in ['-5', 'abc', '\xb2']:  # a superscript two is a digit, but not a number
+                request = f'{headers}Content-Length: {content_length}\r\n\r\n'
+                response = await _raw_request(server.port, request.encode('latin-1'))
+                assert response.startswith(b'HTTP/1.1 400 ')
+            # lines longer than the stream reader limit
+            response = await _raw_request(server.port, f'POST /{"a" * 70000} HTTP/1.1\r\n\r\n'.encode())
+            assert response.startswith(b'HTTP/1.1 400 ')
+            response = await _raw_request(server.port, f'{headers}X-Padding: {"a" * 70000}\r\n\r\n'.encode())
+            assert response.startswith(b'HTTP/1.1 431 ')
+            # the body is never sent
+            response = await _raw_request(server.port, f'{headers}Content-Length: 100\r\n\r\n'.encode())
+            assert response.startswith(b'HTTP/1.1 408 ')
+            # an idle connection is closed without a response
+            assert await _raw_request(server.port, b'') == b''
+        finally:
+            await server.stop()
+        return server
+
+    server = asyncio.run(run())
+    assert server.stats().rejected == 6